@@ -0,0 +1,143 @@
+"""
+Async HTTP API for the RAG chain, independent of the Streamlit page.
+
+Run behind a worker pool, e.g.:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Several workers need a Qdrant server; the embedded stores (VECTOR_BACKEND=mmap,
+QDRANT_PATH) can only be opened by one process.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from src.database import list_matters
+from src.async_rag import aanswer, astream_answer, get_async_engine, get_query_executor
+from src.audit import audit_document
+from src.engine import get_engine
+from src.matters import DEFAULT_MATTER
+from src.utils.metrics import get_stage_metrics
+
+
+class ChatMessage(BaseModel):
+    role: str = Field(description="user or assistant")
+    content: str
+
+
+class SearchFilters(BaseModel):
+    """Metadata slice to search; unset fields don't narrow the search."""
+
+    model_config = {"extra": "forbid"}
+
+    company: Optional[str] = None
+    filling_type: Optional[str] = Field(default=None, description="e.g. 10-K")
+    source_filename: Optional[str] = None
+    date_from: Optional[str] = Field(default=None, description="ISO date, inclusive")
+    date_to: Optional[str] = Field(default=None, description="ISO date, exclusive")
+
+
+class QuestionRequest(BaseModel):
+    question: str
+    chat_history: List[ChatMessage] = []
+    history_summary: str = Field(default="", description="summary of older turns, if any")
+    matters: Optional[List[str]] = Field(
+        default=None, description="matters to search (default: the default matter)"
+    )
+    filters: Optional[SearchFilters] = None
+
+    def search_filters(self):
+        return self.filters.model_dump(exclude_none=True) if self.filters else None
+
+
+class AuditRequest(BaseModel):
+    source_filename: str
+    question: str = Field(description='exhaustive question, e.g. "list every termination clause"')
+    matter: str = DEFAULT_MATTER
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the models in parallel before the first request instead of during it
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, get_engine().wait)
+    await loop.run_in_executor(get_query_executor(), get_async_engine)
+    yield
+
+
+app = FastAPI(title="Legal RAG API", lifespan=lifespan)
+
+
+async def _check_matters(matters):
+    """404 for unknown matters, before a response (or a stream) starts."""
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            get_query_executor(), get_async_engine, matters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/ask")
+async def ask(request: QuestionRequest):
+    await _check_matters(request.matters)
+    history = [message.model_dump() for message in request.chat_history]
+    return {
+        "answer": await aanswer(
+            request.question,
+            history,
+            request.history_summary,
+            request.matters,
+            request.search_filters(),
+        )
+    }
+
+
+@app.post("/ask/stream")
+async def ask_stream(request: QuestionRequest):
+    await _check_matters(request.matters)
+    history = [message.model_dump() for message in request.chat_history]
+    return StreamingResponse(
+        astream_answer(
+            request.question,
+            history,
+            request.history_summary,
+            request.matters,
+            request.search_filters(),
+        ),
+        media_type="text/plain",
+    )
+
+
+@app.post("/audit")
+async def audit(request: AuditRequest):
+    """Whole-document audit; many LLM calls, so it runs in a worker thread."""
+    try:
+        response, stats = await asyncio.get_running_loop().run_in_executor(
+            None,
+            partial(
+                audit_document,
+                get_engine().get("qdrant"),
+                request.source_filename,
+                request.question,
+                matter=request.matter,
+            ),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {**response.model_dump(), "stats": stats}
+
+
+@app.get("/matters")
+async def matters():
+    return {"matters": await asyncio.get_running_loop().run_in_executor(None, list_matters)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-stage latency histograms in the Prometheus text format."""
+    stage_metrics = get_stage_metrics()
+    return stage_metrics.to_prometheus() if stage_metrics is not None else ""
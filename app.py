@@ -1,12 +1,9 @@
+import os
 import streamlit as st
-from src.database import get_vector_store
-from src.retriever import get_legal_retriever
-from src.prompts.legal_templates import get_rag_chain
-from src.ingestion import process_pdf_to_documents
-from src.text_handler.splitter import get_recursive_text_splitter
-from src.utils.db_utils import is_file_indexed
-from src.utils.chat_utils import convert_to_langchain_messages
-from uuid import uuid4
+from src.engine import get_engine
+from src.matters import DEFAULT_MATTER, matter_collection, normalize_matter
+from src.utils.chat_history import ChatHistoryManager
+from src.utils.metrics import get_stage_metrics
 
 # --- 1. PAGE CONFIG & ENGINE CACHING ---
 st.set_page_config(layout="wide", page_title="Legal AI Auditor", page_icon="⚖️")
@@ -14,49 +11,257 @@ st.set_page_config(layout="wide", page_title="Legal AI Auditor", page_icon="⚖
 
 @st.cache_resource
 def load_engine():
-    """Initializes the heavy components only once."""
-    vector_store = get_vector_store()
-    retriever = get_legal_retriever()
-    chain = get_rag_chain()
-    splitter = get_recursive_text_splitter(chunk_size=2000, chunk_overlap=400)
-    return vector_store, retriever, chain, splitter
+    """
+    Starts loading the heavy components (embedder, reranker, Qdrant, LLM) in
+    background threads and returns at once, so the page renders immediately.
+    """
+    return get_engine()
 
 
-vector_store, retriever, chain, splitter = load_engine()
+engine = load_engine()
+
+
+@st.cache_resource(max_entries=32)
+def load_chain(collections, _matters):
+    """
+    The RAG chain over a set of matter collections (`matter_collections`), built
+    once per set; metadata filters are passed with each question instead.
+    """
+    # Already imported by the engine; retrievers are cached per matter
+    from src.prompts.legal_templates import get_rag_chain
+    from src.retriever import get_legal_retriever
+
+    return get_rag_chain(get_legal_retriever(_matters))
+
+
+STATE_ICONS = {"pending": "⏸️", "loading": "⏳", "ready": "✅", "failed": "❌"}
+
+
+def render_engine_status(polling):
+    rows = engine.status()
+    done = sum(row["state"] in ("ready", "failed") for row in rows)
+    if done < len(rows):
+        st.progress(done / len(rows), text=f"Warming up the engine ({done}/{len(rows)})...")
+        for row in rows:
+            st.caption(f"{STATE_ICONS[row['state']]} {row['component']} {row['seconds']:.1f}s")
+        return
+
+    if engine.ready:
+        st.success(f"Engine ready in {engine.elapsed():.1f}s")
+    else:
+        st.error("Some components failed to load; see the logs.")
+    with st.expander("🚀 Startup breakdown"):
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    if polling:
+        st.rerun()  # Redraw the whole page now that everything is loaded
+
 
 # --- 2. SESSION STATE ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_manager" not in st.session_state:
+    # Recent turns verbatim, older ones folded into a summary once (CHAT_HISTORY_TOKENS);
+    # the summarizer is attached once the engine has loaded it
+    st.session_state.history_manager = ChatHistoryManager(
+        max_recent_tokens=int(os.getenv("CHAT_HISTORY_TOKENS", "2000")),
+    )
 
 # --- 3. SIDEBAR: DOCUMENT INGESTION ---
-# --- 3. SIDEBAR: DOCUMENT INGESTION ---
-if "indexed_files" not in st.session_state:
-    st.session_state.indexed_files = set()
+@st.cache_resource
+def load_ingest_queue():
+    """
+    Starts the background indexing workers (INGEST_WORKERS). Jobs left
+    unfinished by a previous run are resumed without waiting for an upload.
+    """
+    from src.ingest_queue import get_ingest_queue
+
+    ingest_queue = get_ingest_queue()
+    ingest_queue.start_workers(engine, workers=int(os.getenv("INGEST_WORKERS", "2")))
+    return ingest_queue
+
+
+ingest_queue = load_ingest_queue()
+
+if "ingest_jobs" not in st.session_state:
+    # (file_id, matter) -> job ID; file_id changes whenever a revised copy is uploaded
+    st.session_state.ingest_jobs = {}
+
+
+def render_ingest_jobs(polling):
+    jobs = ingest_queue.jobs(st.session_state.ingest_jobs.values())
+    for job in jobs:
+        progress = job["progress"]
+        if job["status"] == "queued":
+            retry = f" for another attempt ({job['error']})" if job["error"] else ""
+            st.caption(f"⏸️ {job['filename']} queued{retry}")
+        elif job["status"] == "running":
+            pages_total = job["pages_total"] or 1
+            st.progress(
+                min(progress.get("pages", 0) / pages_total, 1.0),
+                text=(
+                    f"⏳ {job['filename']}: {progress.get('chunks', 0)} chunks, "
+                    f"page {progress.get('pages', 0)}/{job['pages_total'] or '?'}"
+                ),
+            )
+        elif job["status"] == "done":
+            st.write(
+                f"✅ {job['filename']} indexed "
+                f"({progress.get('added', 0) + progress.get('copied', 0)} new chunks, "
+                f"{progress.get('deleted', 0)} removed)"
+            )
+        else:
+            st.error(f"❌ {job['filename']}: {job['error']}")
+
+    active = any(job["status"] in ("queued", "running") for job in jobs)
+    if polling and not active:
+        st.rerun()  # Stop polling once every job has finished
+
 
-# MOVE THIS OUT OF THE IF BLOCK
 with st.sidebar:
+    # Polls once a second until every component has loaded
+    polling = engine.finished_at is None
+    st.fragment(render_engine_status, run_every=1.0 if polling else None)(polling)
+
     st.title("📂 Document Center")
+
+    # Each matter is a separate collection; questions only search the selected ones
+    matter_options = [DEFAULT_MATTER]
+    if engine.is_ready("qdrant"):
+        from src.database import list_matters
+
+        matter_options = list_matters(engine.get("qdrant")) or matter_options
+    if "search_matters" not in st.session_state:
+        st.session_state.search_matters = [matter_options[0]]
+    st.session_state.search_matters = [
+        m for m in st.session_state.search_matters if m in matter_options
+    ]
+    search_matters = st.multiselect("Search matters", matter_options, key="search_matters")
+
+    # Optional metadata slice: questions only search the matching documents
+    search_filters = {}
+    if engine.is_ready("qdrant"):
+        from src.retriever import get_filter_vocabulary  # Already imported by the engine
+        from src.utils.db_utils import list_indexed_files
+
+        client = engine.get("qdrant")
+        collections = [matter_collection(m) for m in search_matters or [DEFAULT_MATTER]]
+        vocabulary = [get_filter_vocabulary(client, c) for c in collections]
+        with st.expander("🔎 Narrow the search"):
+            search_filters["company"] = st.selectbox(
+                "Company",
+                sorted({v for vocab in vocabulary for v in vocab.get("company", [])}),
+                index=None,
+                placeholder="Any company",
+            )
+            search_filters["filling_type"] = st.selectbox(
+                "Filing type",
+                sorted({v for vocab in vocabulary for v in vocab.get("filling_type", [])}),
+                index=None,
+                placeholder="Any filing type",
+            )
+            search_filters["source_filename"] = st.selectbox(
+                "Document",
+                # Only the documents left by the choices above
+                sorted(
+                    {f for c in collections for f in list_indexed_files(client, c, search_filters)}
+                ),
+                index=None,
+                placeholder="Any document",
+            )
+        search_filters = {field: value for field, value in search_filters.items() if value}
+
+    upload_matter = st.text_input(
+        "Upload into matter", value=DEFAULT_MATTER, help="A new name creates the matter."
+    )
     uploaded_files = st.file_uploader("Upload PDFs", accept_multiple_files=True)
 
     if uploaded_files:
+        from src.ingestion import file_digest, read_file_bytes  # Deferred: pulls in pypdf
+
+        try:
+            matter = normalize_matter(upload_matter)
+        except ValueError as e:
+            st.error(str(e))
+            uploaded_files = []
+
+        # Indexing runs in the background; already indexed files finish at once
         for file in uploaded_files:
-            if file.name in st.session_state.indexed_files:
-                st.write(f"✔️ {file.name} ready")
-                continue
+            job_key = (file.file_id, matter)
+            if job_key not in st.session_state.ingest_jobs:
+                st.session_state.ingest_jobs[job_key] = ingest_queue.submit(
+                    file.name, read_file_bytes(file), file_digest(file), matter
+                )
+
+    # Polls once a second while any job is queued or running
+    ingesting = bool(ingest_queue.jobs(active=True))
+    st.fragment(render_ingest_jobs, run_every=1.0 if ingesting else None)(ingesting)
+
+    closable = [m for m in matter_options if m != DEFAULT_MATTER]
+    if closable:
+        with st.expander("🗄️ Close a matter"):
+            closing = st.selectbox("Matter", closable)
+            archive, drop = st.columns(2)
+            if archive.button("Archive", help="Snapshot the matter, then remove it"):
+                from src.database import archive_matter
+
+                try:
+                    st.toast(f"Archived {closing} as {archive_matter(closing)}")
+                except Exception as e:
+                    st.error(f"Couldn't archive {closing}: {e}")
+                else:
+                    load_chain.clear()  # Chains over the dropped collection are stale
+                    st.rerun()
+            # Dropping can't be undone: ask first
+            confirm_drop = st.checkbox(
+                f"Delete {closing} and its documents for good", key=f"confirm_drop_{closing}"
+            )
+            if drop.button(
+                "Drop", help="Delete the matter and its documents", disabled=not confirm_drop
+            ):
+                from src.database import drop_matter
+
+                drop_matter(closing)
+                load_chain.clear()
+                st.rerun()
+
+    # Exhaustive questions ("list every ...") read every chunk of one file
+    audit_request = None
+    if engine.is_ready("qdrant"):
+        from src.utils.db_utils import list_indexed_files
+
+        with st.expander("📋 Whole-document audit"):
+            audit_matter = st.selectbox("Matter", matter_options, key="audit_matter")
+            audit_file = st.selectbox(
+                "Document",
+                list_indexed_files(engine.get("qdrant"), matter_collection(audit_matter)),
+            )
+            audit_question = st.text_area(
+                "Audit question",
+                placeholder="List every indemnification and termination clause",
+            )
+            if st.button("Run audit", disabled=not (audit_file and audit_question)):
+                audit_request = (audit_matter, audit_file, audit_question)
 
-            if is_file_indexed(vector_store.client, "legal-rag", file.name):
-                st.session_state.indexed_files.add(file.name)
-                st.write(f"✔️ {file.name} ready")
-                continue
+    # Repeated boilerplate clauses are served from the embedding cache
+    embedding_cache = None
+    if engine.is_ready("embedder"):
+        embedding_cache = getattr(engine.get("embedder"), "cache", None)
+    if embedding_cache is not None:
+        cache_stats = embedding_cache.stats()
+        st.caption(
+            f"Embedding cache: {cache_stats['hits']} hits / "
+            f"{cache_stats['misses']} misses"
+        )
 
-            # Perform indexing if new
-            with st.status(f"Processing {file.name}...", expanded=False) as status:
-                docs = process_pdf_to_documents(file, splitter)
-                # Generate unique IDs to prevent Qdrant metadata collisions
-                ids = [str(uuid4()) for _ in docs]
-                vector_store.add_documents(docs, ids=ids)
-                st.session_state.indexed_files.add(file.name)
-                status.update(label=f"✅ {file.name} indexed", state="complete")
+    # Where the time went: ingest, retrieval and LLM stages (RAG_METRICS=0 disables)
+    stage_metrics = get_stage_metrics()
+    if stage_metrics is not None:
+        with st.expander("⏱️ Stage timings"):
+            rows = stage_metrics.summary()
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+            else:
+                st.caption("No timings recorded yet.")
 
 
 # --- 4. CHAT INTERFACE ---
@@ -68,6 +273,60 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
+AUDIT_STAGES = {"map": "Reading chunks", "reduce": "Merging findings", "final": "Writing up"}
+
+if audit_request is not None:
+    audit_matter, audit_file, audit_question = audit_request
+    prompt = f"📋 Audit of {audit_file}: {audit_question}"
+    st.session_state.messages.append({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.markdown(prompt)
+
+    with st.chat_message("assistant"):
+        from src.audit import audit_document
+
+        with st.spinner("Waiting for the LLM to load..."):
+            engine.get("llm")
+        with st.status(f"Auditing {audit_file}...", expanded=True) as audit_status:
+            audit_progress = st.progress(0.0)
+
+            def show_audit_progress(p):
+                audit_progress.progress(
+                    p["done"] / p["total"],
+                    text=(
+                        f"{AUDIT_STAGES[p['stage']]} {p['done']}/{p['total']} "
+                        f"({p['relevant_chunks']} of {p['chunks']} chunks relevant)"
+                    ),
+                )
+
+            try:
+                audit, audit_stats = audit_document(
+                    engine.get("qdrant"),
+                    audit_file,
+                    audit_question,
+                    matter=audit_matter,
+                    progress=show_audit_progress,
+                )
+            except Exception as e:
+                audit_status.update(label=f"Audit failed: {e}", state="error")
+                full_response = f"The audit of {audit_file} failed: {e}"
+            else:
+                audit_status.update(
+                    label=(
+                        f"Audited {audit_stats['relevant_chunks']} of {audit_stats['chunks']} "
+                        f"chunks in {audit_stats['seconds']:.1f}s"
+                    ),
+                    state="complete",
+                    expanded=False,
+                )
+                full_response = (
+                    f"**Risk level: {audit.risk_level}**\n\n{audit.answer}\n\n"
+                    f"*Sources: {', '.join(audit.citations)}*"
+                )
+        st.markdown(full_response)
+
+    st.session_state.messages.append({"role": "assistant", "content": full_response})
+
 # User Input
 if prompt := st.chat_input("Ask a legal question..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -76,22 +335,38 @@ if prompt := st.chat_input("Ask a legal question..."):
 
     # Response Generation
     with st.chat_message("assistant"):
+        with st.spinner("Waiting for the models to load..."):
+            chain = engine.get("chain")
+            response_cache = engine.get("response_cache")
+            st.session_state.history_manager.summarizer = engine.get("summarizer")
+        # Cheap now: the engine has imported everything these modules depend on
+        from src.async_rag import matter_collections
+        from src.database import get_collection_generation
+        from src.utils.db_utils import metadata_filter_key
+
+        # "Acme" and "acme", or the same matters in another order, share a chain
+        collections = matter_collections(search_matters)
+        if collections != matter_collections():
+            chain = load_chain(collections, search_matters)
+
         # We pass the question and converted chat history to the chain
         # The chain handles the retrieval and formatting internally!
-        history = convert_to_langchain_messages(st.session_state.messages[:-1])
-
-        response_stream = chain.stream({"question": prompt, "chat_history": history})
+        history, history_summary = st.session_state.history_manager.update(
+            st.session_state.messages[:-1]
+        )
 
-        def stream_parser():
-            for chunk in response_stream:
-                # Extracts 'content' if it's a message chunk, or 'answer' if it's a RAG dict
-                yield (
-                    chunk.content
-                    if hasattr(chunk, "content")
-                    else chunk.get("answer", "")
-                )
+        # Repeated questions about unchanged documents are answered from the cache
+        # (for the same matters and filters)
+        response_stream = response_cache.stream(
+            chain,
+            prompt,
+            history,
+            (get_collection_generation(), collections, metadata_filter_key(search_filters)),
+            history_summary,
+            filters=search_filters,
+        )
 
         # 3. Pass the generator to write_stream
-        full_response = st.write_stream(stream_parser())
+        full_response = st.write_stream(response_stream)
 
     st.session_state.messages.append({"role": "assistant", "content": full_response})
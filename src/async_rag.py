@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from src.database import get_async_qdrant_client, get_collection_generation
+from src.matters import DEFAULT_MATTER, matter_collection
+from src.prompts.legal_templates import get_rag_chain
+from src.retriever import MatterRouter, get_legal_retriever
+from src.utils.chat_history import ChatHistoryManager
+from src.utils.db_utils import metadata_filter_key
+from src.utils.response_cache import get_response_cache
+
+_executor_instance = None
+_async_engine_instances = {}
+
+
+def get_query_executor():
+    """Thread pool for the CPU-bound query steps (embedding, BM25, reranking)."""
+    global _executor_instance
+
+    if _executor_instance is None:
+        _executor_instance = ThreadPoolExecutor(
+            max_workers=int(os.getenv("QUERY_WORKERS", "8")),
+            thread_name_prefix="rag-query",
+        )
+
+    return _executor_instance
+
+
+def _with_async_search(retriever):
+    """Copy of a retriever (or of each routed matter's) that searches asynchronously."""
+    if isinstance(retriever, MatterRouter):
+        return retriever.model_copy(
+            update={"retrievers": [_with_async_search(r) for r in retriever.retrievers]}
+        )
+    return retriever.model_copy(
+        update={"async_client": get_async_qdrant_client(), "executor": get_query_executor()}
+    )
+
+
+def get_async_engine(matters=None):
+    """
+    Returns (chain, response_cache) for the async query path over `matters`
+    (the default matter when omitted).
+
+    The chain shares the reranker, score cache and lexical index with the
+    synchronous retriever, but searches through the async Qdrant client and
+    offloads CPU work to the query executor.
+    """
+    key = matter_collections(matters)
+    if key not in _async_engine_instances:
+        retriever = _with_async_search(get_legal_retriever(matters))
+        _async_engine_instances[key] = (get_rag_chain(retriever), get_response_cache())
+
+    return _async_engine_instances[key]
+
+
+def matter_collections(matters=None) -> tuple:
+    """Sorted, de-duplicated collections of `matters`, so "Acme" and "acme" share engines."""
+    return tuple(sorted({matter_collection(matter) for matter in matters or [DEFAULT_MATTER]}))
+
+
+def drop_async_engines(collection_name: str):
+    """Forgets the engines that search a dropped collection (and its lexical index)."""
+    for key in [key for key in _async_engine_instances if collection_name in key]:
+        _async_engine_instances.pop(key, None)
+
+
+async def astream_answer(
+    question: str, chat_history=(), history_summary="", matters=None, filters=None
+):
+    """
+    Streams the answer text for `question`, searching only `matters` and,
+    with `filters` (see `build_metadata_filter`), only the matching slice.
+
+    `chat_history` is a list of {"role", "content"} dicts or LangChain
+    messages. Requests are stateless, so only the most recent
+    CHAT_HISTORY_TOKENS worth of it is used; `history_summary` can carry a
+    summary of older turns kept by the client.
+    """
+    chain, response_cache = get_async_engine(matters)
+    recent_history = ChatHistoryManager(
+        max_recent_tokens=int(os.getenv("CHAT_HISTORY_TOKENS", "2000"))
+    )
+    history, _ = recent_history.update(list(chat_history))
+    async for text in response_cache.astream(
+        chain,
+        question,
+        history,
+        # Answers are only reused for the same matters and filters
+        (get_collection_generation(), matter_collections(matters), metadata_filter_key(filters)),
+        executor=get_query_executor(),
+        history_summary=history_summary,
+        filters=filters,
+    ):
+        yield text
+
+
+async def aanswer(
+    question: str, chat_history=(), history_summary="", matters=None, filters=None
+) -> str:
+    """Returns the complete answer for `question`."""
+    return "".join(
+        [
+            text
+            async for text in astream_answer(
+                question, chat_history, history_summary, matters, filters
+            )
+        ]
+    )
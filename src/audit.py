@@ -0,0 +1,238 @@
+"""
+Whole-document audit: answers exhaustive questions ("list every
+indemnification and termination clause") from every chunk of one file
+instead of the top retrieved ones.
+
+    python -m src.audit Acme_20210101_10-K_EX-10.1_123_1_License.pdf \\
+        "List every indemnification and termination clause" --matter acme --concurrency 4
+
+The file's chunks are scrolled in reading order and a lexical prefilter
+drops those sharing no terms with the question. The LLM extracts findings
+from the rest in parallel (map), and the findings are merged a few at a
+time until one `LegalAuditResponse` remains (reduce).
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from langchain_core.documents import Document
+from langchain_core.exceptions import OutputParserException
+from src.lexical_index import tokenize
+from src.matters import DEFAULT_MATTER, matter_collection
+from src.utils.metrics import observe
+from src.utils.rate_limit import call_with_backoff, estimate_tokens, get_gemini_rate_limiter
+
+# Words that say how to answer rather than what to look for
+AUDIT_STOPWORDS = {
+    "a", "about", "agreement", "all", "an", "and", "any", "are", "as", "by", "clause", "clauses",
+    "contract", "describe", "document", "does", "each", "every", "find", "for", "from",
+    "how", "in", "is", "it", "list", "of", "on", "or", "provision", "provisions",
+    "the", "their", "there", "this", "to", "what", "which", "with",
+}
+# Crude stemming: "indemnification", "indemnify" and "indemnified" all share "indemn"
+STEM_CHARS = 6
+NO_FINDINGS = "NONE"
+
+
+def _stems(text: str) -> set:
+    return {token[:STEM_CHARS] for token in tokenize(text) if token not in AUDIT_STOPWORDS}
+
+
+def load_document_chunks(client, collection_name: str, source_filename: str):
+    """
+    Every stored chunk of one file as Documents, in reading order (parents, not children).
+
+    Scrolling returns points in ID order, so the whole file is held in one list
+    to sort it: memory grows with the file's text and payloads (a few MB for a
+    long contract), not with the collection.
+    """
+    from src.parent_store import expand_to_parents
+    from src.utils.db_utils import scroll_file_points
+
+    points = scroll_file_points(client, collection_name, source_filename=source_filename)
+    docs = [
+        Document(page_content=point.payload["page_content"], metadata=point.payload["metadata"])
+        for point in points
+    ]
+    docs.sort(key=lambda d: (d.metadata.get("chunk_index", 0), d.metadata.get("child_index", 0)))
+    return expand_to_parents(docs, collection_name=collection_name)
+
+
+def prefilter_chunks(docs, question: str):
+    """
+    Keeps the chunks sharing at least one (stemmed) term with the question.
+    A question made only of generic words ("summarize this agreement") keeps all.
+    """
+    terms = _stems(question)
+    if not terms:
+        return list(docs)
+    return [doc for doc in docs if terms & _stems(doc.page_content)]
+
+
+def group_chunks(docs, token_budget: int):
+    """Packs consecutive chunks into groups of about `token_budget` tokens, one map call each."""
+    groups, group, used = [], [], 0
+    for doc in docs:
+        cost = estimate_tokens(doc.page_content)
+        if group and used + cost > token_budget:
+            groups.append(group)
+            group, used = [], 0
+        group.append(doc)
+        used += cost
+    if group:
+        groups.append(group)
+    return groups
+
+
+def audit_document(
+    client,
+    source_filename: str,
+    question: str,
+    matter=DEFAULT_MATTER,
+    chains=None,
+    limiter=None,
+    concurrency=None,
+    map_tokens=None,
+    fan_in=8,
+    prefilter=True,
+    max_retries=6,
+    base_delay=2.0,
+    progress=None,
+):
+    """
+    Audits every chunk of `source_filename` for `question`. `chains` is
+    what `get_audit_chains` returns (built with the shared LLM by default).
+
+    Map calls (one per group of about `map_tokens` tokens of consecutive
+    chunks) run with at most `concurrency` in flight, paced by `limiter`.
+    Findings are merged `fan_in` at a time until a single final call can
+    write the `LegalAuditResponse`. `progress(dict)` is called from this
+    thread with the stage ("map", "reduce" or "final"), "done" and "total".
+    Returns (response, stats).
+    """
+    from src.prompts.context_packer import pack_context
+    from src.prompts.legal_templates import LegalAuditResponse, get_audit_chains
+
+    chains, parser = chains or get_audit_chains()
+    limiter = limiter or get_gemini_rate_limiter()
+    concurrency = concurrency or int(os.getenv("AUDIT_CONCURRENCY", "4"))
+    map_tokens = map_tokens or int(os.getenv("AUDIT_MAP_TOKENS", "3000"))
+    started = time.perf_counter()
+
+    collection_name = matter_collection(matter)
+    if not client.collection_exists(collection_name):
+        raise ValueError(f"Unknown matter: {matter}")
+    docs = load_document_chunks(client, collection_name, source_filename)
+    if not docs:
+        raise ValueError(f"{source_filename} is not indexed in matter {matter}")
+    relevant = prefilter_chunks(docs, question) if prefilter else docs
+    stats = {"chunks": len(docs), "relevant_chunks": len(relevant), "llm_calls": 0}
+
+    def call(chain, inputs):
+        tokens = sum(estimate_tokens(str(value)) for value in inputs.values()) + 512
+
+        def attempt():
+            limiter.acquire(tokens)
+            return chain.invoke(inputs)
+
+        return call_with_backoff(attempt, max_retries=max_retries, base_delay=base_delay)
+
+    def fan_out(executor, stage, chain, inputs_list):
+        """Runs one stage's calls in parallel, reporting each as it completes."""
+        futures = {executor.submit(call, chain, inputs): i for i, inputs in enumerate(inputs_list)}
+        results = [None] * len(inputs_list)
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress is not None:
+                progress({"stage": stage, "done": done, "total": len(inputs_list), **stats})
+        stats["llm_calls"] += len(inputs_list)
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Map: findings per group of consecutive chunks, stitched with page locators
+        map_inputs = []
+        for group in group_chunks(relevant, map_tokens):
+            budget = sum(estimate_tokens(doc.page_content) for doc in group) + 100
+            map_inputs.append({"context": pack_context(group, budget)[0], "question": question})
+        map_started = time.perf_counter()
+        partials = fan_out(executor, "map", chains["map"], map_inputs)
+        observe("audit.map", time.perf_counter() - map_started, len(map_inputs))
+        findings = [
+            text.strip()
+            for text in partials
+            if text.strip() and not text.strip().upper().startswith(NO_FINDINGS)
+        ]
+        stats["findings"] = len(findings)
+
+        # Reduce: merge fan_in findings at a time until one final call can take them all
+        reduce_started = time.perf_counter()
+        while len(findings) > fan_in:
+            groups = [findings[i : i + fan_in] for i in range(0, len(findings), fan_in)]
+            findings = fan_out(
+                executor,
+                "reduce",
+                chains["reduce"],
+                [
+                    {"filename": source_filename, "findings": "\n".join(group), "question": question}
+                    for group in groups
+                ],
+            )
+        observe("audit.reduce", time.perf_counter() - reduce_started)
+
+    if not findings:
+        response = LegalAuditResponse(
+            answer=f"{source_filename} contains no provisions relevant to: {question}",
+            citations=[source_filename],
+            risk_level="Low",
+        )
+    else:
+        text = call(
+            chains["final"],
+            {"filename": source_filename, "findings": "\n".join(findings), "question": question},
+        )
+        stats["llm_calls"] += 1
+        try:
+            response = parser.parse(text)
+        except OutputParserException:
+            print(f"Audit of {source_filename}: unstructured final answer, kept as text")
+            response = LegalAuditResponse(answer=text, citations=[], risk_level="Unknown")
+        response.citations = response.citations or [source_filename]
+        if progress is not None:
+            progress({"stage": "final", "done": 1, "total": 1, **stats})
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    observe("audit.document", stats["seconds"], len(docs))
+    return response, stats
+
+
+def main(argv=None):
+    from src.database import get_qdrant_client
+    from src.utils.rate_limit import TokenBucketLimiter
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("source_filename", help="indexed file to audit")
+    parser.add_argument("question", help="what to look for in every chunk")
+    parser.add_argument("--matter", default=DEFAULT_MATTER)
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--rpm", type=float, help="requests per minute (default: GEMINI_RPM)")
+    parser.add_argument("--no-prefilter", action="store_true", help="send every chunk to the LLM")
+    args = parser.parse_args(argv)
+
+    limiter = TokenBucketLimiter(requests_per_minute=args.rpm) if args.rpm else None
+    response, stats = audit_document(
+        get_qdrant_client(),
+        args.source_filename,
+        args.question,
+        matter=args.matter,
+        limiter=limiter,
+        concurrency=args.concurrency,
+        prefilter=not args.no_prefilter,
+        progress=lambda p: print(f"{p['stage']}: {p['done']}/{p['total']}"),
+    )
+    print(json.dumps({**response.model_dump(), "stats": stats}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Runs a file of questions through the RAG chain without the Streamlit page.
+
+    python -m src.batch_runner questions.txt --output answers.jsonl --rpm 15 --tpm 1000000
+
+Questions come from a .txt (one per line), .jsonl ({"question", "id"?,
+"chat_history"?}) or .csv (a "question" or "user_input" column) file.
+Results are appended to the output JSONL as they complete; rerunning the
+same command skips every question that already has an answer.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.utils.rate_limit import (
+    TokenBucketLimiter,
+    call_with_backoff,
+    estimate_tokens,
+    get_gemini_rate_limiter,
+)
+
+
+def question_id(question: str) -> str:
+    return hashlib.sha1(question.strip().encode("utf-8")).hexdigest()[:12]
+
+
+def load_questions(path: str):
+    """Reads questions as dicts with "id", "question" and "chat_history"."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    elif path.endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = [
+                {"question": row.get("question") or row.get("user_input", "")}
+                for row in csv.DictReader(f)
+            ]
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [{"question": line.strip()} for line in f if line.strip()]
+
+    questions = {}
+    for row in rows:
+        if row.get("question"):
+            item_id = str(row.get("id") or question_id(row["question"]))
+            questions.setdefault(
+                item_id,
+                {
+                    "id": item_id,
+                    "question": row["question"],
+                    "chat_history": row.get("chat_history", []),
+                },
+            )
+    return list(questions.values())
+
+
+def load_checkpoint(output_path: str) -> set:
+    """IDs of questions already answered in a previous run."""
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn last line from an interrupted run
+                if record.get("status") == "ok":
+                    done.add(record["id"])
+    return done
+
+
+def _end_torn_line(output_path: str):
+    """Terminates a line cut short by an interrupted run, so the next record starts clean."""
+    if not os.path.exists(output_path) or not os.path.getsize(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def run_batch(
+    questions,
+    output_path,
+    chain=None,
+    limiter=None,
+    concurrency=4,
+    max_retries=6,
+    base_delay=2.0,
+    context_tokens=2500,
+    output_tokens=512,
+):
+    """
+    Answers `questions` with at most `concurrency` in flight, paced by the
+    token-bucket `limiter`. Each request is budgeted as the question and
+    history tokens plus `context_tokens` of retrieved chunks and
+    `output_tokens` of answer. Returns a summary with latency percentiles.
+    """
+    if chain is None:
+        from src.prompts.legal_templates import get_rag_chain
+
+        chain = get_rag_chain()
+    limiter = limiter or get_gemini_rate_limiter()
+
+    done = load_checkpoint(output_path)
+    pending = [item for item in questions if item["id"] not in done]
+    _end_torn_line(output_path)
+    print(f"{len(pending)} questions to answer ({len(questions) - len(pending)} already done)")
+
+    write_lock = threading.Lock()
+    latencies = []
+    summary = {"answered": 0, "failed": 0, "skipped": len(questions) - len(pending)}
+
+    def answer(item):
+        history_text = " ".join(str(m.get("content", "")) for m in item["chat_history"])
+        tokens = estimate_tokens(item["question"] + history_text) + context_tokens + output_tokens
+        waited = 0.0
+        attempts = 0
+
+        def attempt():
+            nonlocal waited, attempts
+            attempts += 1
+            waited += limiter.acquire(tokens)
+            return chain.invoke(
+                {"question": item["question"], "chat_history": item["chat_history"]}
+            )
+
+        start = time.perf_counter()
+        record = {"id": item["id"], "question": item["question"]}
+        try:
+            output = call_with_backoff(
+                attempt,
+                max_retries=max_retries,
+                base_delay=base_delay,
+                on_retry=lambda n, delay, e: print(
+                    f"  {item['id']}: retry {n} in {delay:.1f}s ({str(e)[:80]})"
+                ),
+            )
+            record["status"] = "ok"
+            record["answer"] = output["answer"]
+            record["sources"] = sorted(
+                {str(d.metadata.get("source_filename")) for d in output["retrieved_docs"]}
+            )
+            record["context_tokens_saved"] = output.get("context_stats", {}).get("tokens_saved")
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+        record["latency_seconds"] = round(time.perf_counter() - start, 3)
+        record["rate_limit_wait_seconds"] = round(waited, 3)
+        record["attempts"] = attempts
+
+        with write_lock:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            if record["status"] == "ok":
+                summary["answered"] += 1
+                latencies.append(record["latency_seconds"])
+            else:
+                summary["failed"] += 1
+            print(
+                f"[{summary['answered'] + summary['failed']}/{len(pending)}] "
+                f"{record['status']} {item['id']} {record['latency_seconds']:.2f}s "
+                f"(waited {waited:.2f}s, {attempts} attempts)"
+            )
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(answer, pending))
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    if latencies:
+        for p in (50, 95):
+            summary[f"p{p}_latency_seconds"] = round(float(np.percentile(latencies, p)), 3)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("questions", help=".txt, .jsonl or .csv file of questions")
+    parser.add_argument("--output", help="results JSONL (default: <questions>.answers.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, help="requests per minute (default: GEMINI_RPM)")
+    parser.add_argument("--tpm", type=float, help="tokens per minute (default: GEMINI_TPM)")
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--base-delay", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    limiter = None
+    if args.rpm or args.tpm:
+        limiter = TokenBucketLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    output_path = args.output or os.path.splitext(args.questions)[0] + ".answers.jsonl"
+
+    summary = run_batch(
+        load_questions(args.questions),
+        output_path,
+        limiter=limiter,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        base_delay=args.base_delay,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from qdrant_client import models
+from src.database import is_local_client
+from src.utils.metrics import observe
+
+_DONE = object()
+
+
+def bulk_upsert(
+    vector_store,
+    batches,
+    batch_size=64,
+    parallelism=2,
+    wait=False,
+    queue_size=4,
+    write_lock=None,
+) -> dict:
+    """
+    Embeds and upserts `(docs, ids)` batches with embedding and writes overlapped.
+
+    The calling thread embeds batches of `batch_size` documents and puts the
+    resulting points on a bounded queue; `parallelism` writer threads drain it
+    with `upsert` calls. `wait=False` lets Qdrant acknowledge writes before they
+    are applied; the last batch is then written with `wait=True` once the others
+    are acknowledged, so the call only returns after every point is applied (and
+    raises if one could not be). Pass the `write_lock` other writes to the same
+    local-mode client hold. Returns throughput stats including docs/sec.
+    """
+    client = vector_store.client
+    collection_name = vector_store.collection_name
+    embeddings = vector_store.embeddings
+    work = queue.Queue(maxsize=queue_size)
+    errors = []
+    if write_lock is None:
+        write_lock = new_write_lock(client)
+    stats = {"points": 0, "embed_seconds": 0.0, "upsert_seconds": 0.0}
+    stats_lock = threading.Lock()
+
+    def write(points, wait):
+        start = time.perf_counter()
+        with write_lock:
+            client.upsert(collection_name=collection_name, points=points, wait=wait)
+        elapsed = time.perf_counter() - start
+        observe("ingest.upsert", elapsed, len(points))
+        with stats_lock:
+            stats["upsert_seconds"] += elapsed
+            stats["points"] += len(points)
+
+    def writer():
+        while True:
+            points = work.get()
+            if points is _DONE:
+                return
+            if errors:
+                continue  # Drain the queue so the producer never blocks
+            try:
+                write(points, wait)
+            except Exception as e:
+                errors.append(e)
+
+    writers = [threading.Thread(target=writer, daemon=True) for _ in range(parallelism)]
+    for thread in writers:
+        thread.start()
+
+    started = time.perf_counter()
+    last_points = None
+    try:
+        for docs, ids in _rebatch(batches, batch_size):
+            if errors:
+                break
+            start = time.perf_counter()
+            vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+            elapsed = time.perf_counter() - start
+            observe("ingest.embed", elapsed, len(docs))
+            stats["embed_seconds"] += elapsed
+
+            if last_points is not None:
+                work.put(last_points)
+            last_points = [
+                models.PointStruct(
+                    id=point_id,
+                    vector={vector_store.vector_name: vector},
+                    payload={
+                        vector_store.content_payload_key: doc.page_content,
+                        vector_store.metadata_payload_key: doc.metadata,
+                    },
+                )
+                for doc, point_id, vector in zip(docs, ids, vectors)
+            ]
+    finally:
+        for _ in writers:
+            work.put(_DONE)
+        for thread in writers:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    if last_points is not None:
+        # Qdrant applies a collection's updates in order: waiting for the
+        # last one confirms the unacknowledged batches before it as well
+        write(last_points, wait=True)
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["docs_per_sec"] = stats["points"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def new_write_lock(client):
+    """A lock for clients that are not safe for concurrent writes (local mode), else a no-op."""
+    return threading.Lock() if is_local_client(client) else nullcontext()
+
+
+def _rebatch(batches, batch_size):
+    """Regroups an iterable of (docs, ids) pairs into batches of `batch_size`."""
+    docs, ids = [], []
+    for batch_docs, batch_ids in batches:
+        docs.extend(batch_docs)
+        ids.extend(batch_ids)
+        while len(docs) >= batch_size:
+            yield docs[:batch_size], ids[:batch_size]
+            docs, ids = docs[batch_size:], ids[batch_size:]
+    if docs:
+        yield docs, ids
@@ -1,14 +1,66 @@
 import os
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import Distance, PayloadSchemaType, VectorParams
+from qdrant_client.local.qdrant_local import QdrantLocal
 from src.llm_model.embeddings import get_embedding_model
+from src.matters import COLLECTION_NAME, DEFAULT_MATTER, collection_matter, matter_collection
+from src.mmap_store import MmapVectorClient
+from src.utils.file_lock import file_lock
 
 load_dotenv()
 
 _client_instance = None
-_vector_store_instance = None
+_async_client_instance = None
+_vector_store_instances = {}
+
+# Metadata fields we filter on; indexed so filtered counts/searches scan only a slice
+PAYLOAD_INDEXES = {
+    "metadata.source_filename": PayloadSchemaType.KEYWORD,
+    "metadata.file_digest": PayloadSchemaType.KEYWORD,
+    "metadata.company": PayloadSchemaType.KEYWORD,
+    "metadata.filling_type": PayloadSchemaType.KEYWORD,
+    "metadata.date": PayloadSchemaType.DATETIME,
+    "metadata.index_complete": PayloadSchemaType.BOOL,
+}
+
+
+def is_local_client(client) -> bool:
+    """True for embedded clients (":memory:", a path or the mmap store) rather than a server."""
+    return isinstance(client, MmapVectorClient) or isinstance(
+        getattr(client, "_client", None), QdrantLocal
+    )
+
+
+def is_embedded_backend() -> bool:
+    """True when the process owns the vector storage itself (no server to talk to)."""
+    return bool(os.getenv("QDRANT_PATH")) or os.getenv("VECTOR_BACKEND") == "mmap"
+
+
+def ensure_payload_indexes(client, collection_name: str):
+    """Creates any payload index missing from the collection (a no-op when migrated)."""
+    if is_local_client(client):
+        return  # Local mode scans payloads directly and ignores indexes
+
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name not in existing:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True,
+            )
+
+
+def ensure_collection(client, collection_name: str):
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=768, distance=Distance.COSINE),
+        )
+    ensure_payload_indexes(client, collection_name)
 
 
 def get_qdrant_client():
@@ -16,34 +68,140 @@ def get_qdrant_client():
     global _client_instance
 
     if _client_instance is None:
-        _client_instance = QdrantClient(
-            url=os.getenv("QDRANT_URL"),
-            api_key=os.getenv("QDRANT_API_KEY"),
-        )
-
-        # Ensure collection exists
-        collection_name = "legal-rag"
-        if not _client_instance.collection_exists(collection_name):
-            _client_instance.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(size=768, distance=Distance.COSINE),
+        qdrant_path = os.getenv("QDRANT_PATH")
+        if os.getenv("VECTOR_BACKEND") == "mmap":
+            # Embedded int8/float16 memory-mapped store, same client interface
+            _client_instance = MmapVectorClient(
+                os.getenv("MMAP_STORE_PATH", "data/vectors"),
+                dtype=os.getenv("MMAP_STORE_DTYPE", "int8"),
+                rescore=os.getenv("MMAP_STORE_RESCORE", "1") == "1",
+            )
+        elif qdrant_path:
+            # Embedded local mode (":memory:" or a directory), no server needed
+            _client_instance = (
+                QdrantClient(location=qdrant_path)
+                if qdrant_path == ":memory:"
+                else QdrantClient(path=qdrant_path)
             )
+        else:
+            _client_instance = QdrantClient(
+                url=os.getenv("QDRANT_URL"),
+                api_key=os.getenv("QDRANT_API_KEY"),
+            )
+
+        ensure_collection(_client_instance, COLLECTION_NAME)
 
     return _client_instance
 
 
-def get_vector_store():
-    """Returns a single, persistent LangChain VectorStore instance."""
-    global _vector_store_instance
+def get_async_qdrant_client():
+    """
+    Returns a single AsyncQdrantClient for the query path, or None for the
+    embedded backends, where the storage is owned by the synchronous client.
+    """
+    global _async_client_instance
 
-    if _vector_store_instance is None:
+    if _async_client_instance is None and not is_embedded_backend():
+        get_qdrant_client()  # Makes sure the collection exists
+        _async_client_instance = AsyncQdrantClient(
+            url=os.getenv("QDRANT_URL"),
+            api_key=os.getenv("QDRANT_API_KEY"),
+        )
+
+    return _async_client_instance
+
+
+def get_vector_store(matter=None, create=False):
+    """
+    Returns the persistent LangChain VectorStore of a matter (the default
+    matter when omitted). Only ingestion passes `create=True` to open a new
+    matter; searching one that doesn't exist raises ValueError.
+    """
+    collection_name = matter_collection(matter)
+    if collection_name not in _vector_store_instances:
         client = get_qdrant_client()
+        if create:
+            ensure_collection(client, collection_name)
+        elif not client.collection_exists(collection_name):
+            raise ValueError(f"Unknown matter: {matter}")
         embedding_model = get_embedding_model()
 
-        _vector_store_instance = QdrantVectorStore(
+        _vector_store_instances[collection_name] = QdrantVectorStore(
             client=client,
-            collection_name="legal-rag",
+            collection_name=collection_name,
             embedding=embedding_model,
         )
 
-    return _vector_store_instance
+    return _vector_store_instances[collection_name]
+
+
+def list_matters(client=None):
+    """IDs of every matter with a collection, the default matter first."""
+    client = client or get_qdrant_client()
+    matters = [collection_matter(c.name) for c in client.get_collections().collections]
+    return sorted(filter(None, matters), key=lambda matter: (matter != DEFAULT_MATTER, matter))
+
+
+def drop_matter(matter, client=None):
+    """Deletes a matter's collection, lexical index and parent chunks in one operation."""
+    from src.async_rag import drop_async_engines
+    from src.lexical_index import drop_lexical_index
+    from src.parent_store import drop_parent_store
+
+    collection_name = matter_collection(matter)
+    if collection_name == COLLECTION_NAME:
+        raise ValueError("The default matter can't be dropped")
+    client = client or get_qdrant_client()
+    client.delete_collection(collection_name)
+    _vector_store_instances.pop(collection_name, None)
+    drop_lexical_index(collection_name)
+    drop_parent_store(collection_name)
+    drop_async_engines(collection_name)
+    bump_collection_generation()
+
+
+def archive_matter(matter, client=None):
+    """
+    Snapshots a closed matter's collection, then drops it. Returns the
+    snapshot name; restore it with Qdrant's snapshot recovery. Parent chunks
+    (small-to-big mode) are copied under the same name. Local-mode Qdrant
+    (QDRANT_PATH) has no snapshots.
+    """
+    from src.parent_store import archive_parent_store
+
+    collection_name = matter_collection(matter)
+    if collection_name == COLLECTION_NAME:
+        raise ValueError("The default matter can't be archived")
+    client = client or get_qdrant_client()
+    snapshot = client.create_snapshot(collection_name=collection_name, wait=True)
+    archive_parent_store(collection_name, snapshot.name)
+    drop_matter(matter, client)
+    return snapshot.name
+
+
+def _generation_path() -> str:
+    return os.getenv("COLLECTION_GENERATION_PATH", "data/collection_generation")
+
+
+def get_collection_generation() -> int:
+    """
+    Counter that changes whenever ingestion modifies a collection. It is kept
+    on disk, so a re-index or ingest CLI run also invalidates the app's caches.
+    """
+    try:
+        with open(_generation_path()) as f:
+            return int(f.read())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_collection_generation():
+    """Invalidates cached answers that were computed against older documents."""
+    path = _generation_path()
+    with file_lock(path + ".lock"):
+        generation = get_collection_generation() + 1
+        # Write-then-rename: readers don't lock and never see a partial value
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, path)
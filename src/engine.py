@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+from src.utils.metrics import observe
+
+_engine_instance = None
+
+
+# Each loader imports its own dependencies, so importing this module is cheap
+# and the heavy libraries (torch, FlashRank, qdrant_client) load off the main thread.
+def _load_qdrant():
+    from src.database import get_qdrant_client
+
+    return get_qdrant_client()  # Connects and makes sure the collection exists
+
+
+def _load_embedder():
+    from src.llm_model.embeddings import get_embedding_model
+
+    return get_embedding_model()
+
+
+def _load_reranker():
+    from src.retriever import get_reranker
+
+    return get_reranker()
+
+
+def _load_llm():
+    from src.llm_model.llm import get_gemini_llm
+
+    return get_gemini_llm()
+
+
+def _load_splitter():
+    from src.text_handler.splitter import get_legal_text_splitter, get_recursive_text_splitter
+
+    # TEXT_SPLITTER=recursive restores the generic character splitter. After changing
+    # CHUNK_SIZE or CHUNK_OVERLAP, rebuild stored files with `python -m src.reindex`.
+    chunk_size = int(os.getenv("CHUNK_SIZE", "2000"))
+    chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "400"))
+    if os.getenv("TEXT_SPLITTER", "legal") == "recursive":
+        return get_recursive_text_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return get_legal_text_splitter(chunk_size=chunk_size, max_overlap=chunk_overlap)
+
+
+def _load_vector_store():
+    from src.database import get_vector_store
+
+    return get_vector_store()
+
+
+def _load_retriever():
+    from src.retriever import get_legal_retriever
+
+    return get_legal_retriever()  # Also backfills the lexical index on first run
+
+
+def _load_chain():
+    from src.prompts.legal_templates import get_rag_chain
+    from src.retriever import get_legal_retriever
+
+    return get_rag_chain(get_legal_retriever())
+
+
+def _load_summarizer():
+    from src.prompts.legal_templates import get_history_summarizer
+
+    return get_history_summarizer()
+
+
+def _load_response_cache():
+    from src.utils.response_cache import get_response_cache
+
+    return get_response_cache()
+
+
+# name -> (components it needs first, loader). Independent components load in parallel.
+COMPONENTS = {
+    "qdrant": ((), _load_qdrant),
+    "embedder": ((), _load_embedder),
+    "reranker": ((), _load_reranker),
+    "llm": ((), _load_llm),
+    "splitter": ((), _load_splitter),
+    "vector_store": (("qdrant", "embedder"), _load_vector_store),
+    "retriever": (("vector_store", "reranker"), _load_retriever),
+    "chain": (("retriever", "llm"), _load_chain),
+    "summarizer": (("llm",), _load_summarizer),
+    "response_cache": (("embedder",), _load_response_cache),
+}
+
+
+class Engine:
+    """
+    Loads the RAG components in background threads.
+
+    `start()` returns immediately; each component loads as soon as the ones
+    it depends on are ready. `get(name)` blocks until that component is
+    available, `status()` reports per-component progress and load times,
+    and every load time is recorded as a `startup.<name>` stage.
+    """
+
+    def __init__(self, components=None):
+        self.components = components or COMPONENTS
+        self.started_at = None
+        self.finished_at = None
+        self._events = {name: threading.Event() for name in self.components}
+        self._values = {}
+        self._errors = {}
+        self._states = {name: "pending" for name in self.components}
+        self._seconds = {}
+        self._loading_since = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.started_at is not None:
+                return self
+            self.started_at = time.perf_counter()
+
+        for name in self.components:
+            threading.Thread(
+                target=self._load, args=(name,), name=f"engine-{name}", daemon=True
+            ).start()
+        return self
+
+    def _load(self, name):
+        depends_on, loader = self.components[name]
+        for dependency in depends_on:
+            self._events[dependency].wait()
+            if dependency in self._errors:
+                self._finish(name, error=RuntimeError(f"{dependency} failed to load"))
+                return
+
+        self._loading_since[name] = time.perf_counter()
+        self._states[name] = "loading"
+        try:
+            value = loader()
+        except Exception as e:
+            self._finish(name, error=e)
+            return
+        self._values[name] = value
+        self._finish(name)
+
+    def _finish(self, name, error=None):
+        started = self._loading_since.get(name)
+        seconds = time.perf_counter() - started if started is not None else 0.0
+        self._seconds[name] = seconds
+        if error is None:
+            self._states[name] = "ready"
+            observe(f"startup.{name}", seconds)
+        else:
+            self._errors[name] = error
+            self._states[name] = "failed"
+            print(f"Engine: {name} failed to load: {error}")
+        self._events[name].set()
+
+        with self._lock:
+            if self.finished_at is None and all(e.is_set() for e in self._events.values()):
+                self.finished_at = time.perf_counter()
+                observe("startup.total", self.finished_at - self.started_at)
+                print(f"Engine {self.report()}")
+
+    @property
+    def ready(self) -> bool:
+        return all(state == "ready" for state in self._states.values())
+
+    def is_ready(self, name) -> bool:
+        return self._states[name] == "ready"
+
+    def get(self, name, timeout=None):
+        """Returns the loaded component, waiting for it if necessary."""
+        self.start()
+        if not self._events[name].wait(timeout):
+            raise TimeoutError(f"{name} is still loading")
+        if name in self._errors:
+            raise RuntimeError(f"{name} failed to load") from self._errors[name]
+        return self._values[name]
+
+    def wait(self, timeout=None) -> bool:
+        """Blocks until every component has loaded or failed."""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event in self._events.values():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not event.wait(remaining):
+                return False
+        return True
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def status(self):
+        """One row per component: name, state, load seconds (so far) and error."""
+        now = time.perf_counter()
+        rows = []
+        for name in self.components:
+            state = self._states[name]
+            if state == "loading":
+                seconds = now - self._loading_since[name]
+            else:
+                seconds = self._seconds.get(name, 0.0)
+            error = self._errors.get(name)
+            rows.append(
+                {
+                    "component": name,
+                    "state": state,
+                    "seconds": round(seconds, 2),
+                    "error": str(error) if error else "",
+                }
+            )
+        return rows
+
+    def report(self) -> str:
+        """Timed breakdown, slowest component first."""
+        rows = sorted(self.status(), key=lambda row: row["seconds"], reverse=True)
+        parts = ", ".join(f"{row['component']} {row['seconds']:.2f}s" for row in rows)
+        done = "ready" if self.ready else "finished with errors"
+        return f"{done} in {self.elapsed():.2f}s ({parts})"
+
+
+def get_engine():
+    """Returns the shared engine, starting its background warm-up on first use."""
+    global _engine_instance
+
+    if _engine_instance is None:
+        _engine_instance = Engine().start()
+
+    return _engine_instance
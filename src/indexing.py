@@ -0,0 +1,365 @@
+import hashlib
+from uuid import NAMESPACE_URL, uuid5
+from langchain_core.documents import Document
+from qdrant_client import models
+from src.bulk_upsert import bulk_upsert, new_write_lock
+from src.database import bump_collection_generation
+from src.lexical_index import get_lexical_index
+from src.ingestion import (
+    context_prefix,
+    extract_legal_metadata,
+    file_digest,
+    iter_page_documents,
+    iter_pdf_documents,
+)
+from src.page_store import get_page_store
+from src.parent_store import get_parent_store
+from src.text_handler.splitter import get_child_text_splitter
+from src.utils.db_utils import (
+    find_filename_by_digest,
+    is_file_indexed,
+    mark_file_indexed,
+    scroll_file_points,
+)
+
+CHUNK_ID_NAMESPACE = uuid5(NAMESPACE_URL, "legal-rag/chunk")
+
+
+def chunk_point_id(source_filename: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """
+    Deterministic Qdrant point ID for a chunk.
+
+    Keyed by filename and chunk content (not position), so chunks that survive
+    a revision keep their ID and their vector. `occurrence` separates identical
+    chunks repeated within the same file.
+    """
+    return str(uuid5(CHUNK_ID_NAMESPACE, f"{source_filename}\0{chunk_hash}\0{occurrence}"))
+
+
+def child_point_id(parent_id: str, child_index: int, text: str) -> str:
+    """
+    Point ID of a small-to-big child passage. Keyed by its text too, so a new
+    CHILD_CHUNK_SIZE re-embeds the passages even where the parent is unchanged.
+    """
+    child_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return str(uuid5(CHUNK_ID_NAMESPACE, f"{parent_id}\0child\0{child_index}\0{child_hash}"))
+
+
+def _split_children(docs, ids, child_splitter):
+    """
+    Small-to-big mode: splits annotated chunks into the short passages that
+    get embedded. Children are prefixed like any chunk and carry their
+    parent's metadata plus `parent_id` and `child_index`.
+    """
+    children, child_ids = [], []
+    for doc, parent_id in zip(docs, ids):
+        prefix = context_prefix(doc.metadata)
+        raw_chunk = doc.page_content[len(prefix) :]
+        for child_index, text in enumerate(child_splitter.split_text(raw_chunk) or [raw_chunk]):
+            children.append(
+                Document(
+                    page_content=prefix + text,
+                    metadata=dict(doc.metadata, parent_id=parent_id, child_index=child_index),
+                )
+            )
+            child_ids.append(child_point_id(parent_id, child_index, text))
+    return children, child_ids
+
+
+class _ChunkAnnotator:
+    """Adds per-chunk provenance and a stable ID to streamed Documents."""
+
+    def __init__(self, digest: str):
+        self.digest = digest
+        self.chunk_index = 0
+        self.occurrences = {}
+
+    def annotate(self, docs):
+        ids = []
+        for doc in docs:
+            meta = dict(doc.metadata)
+            raw_chunk = doc.page_content[len(context_prefix(meta)) :]
+            chunk_hash = hashlib.sha1(raw_chunk.encode("utf-8")).hexdigest()
+            occurrence = self.occurrences.get(chunk_hash, 0)
+            self.occurrences[chunk_hash] = occurrence + 1
+
+            meta.update(
+                file_digest=self.digest,
+                chunk_index=self.chunk_index,
+                chunk_hash=chunk_hash,
+            )
+            self.chunk_index += 1
+            doc.metadata = meta
+            ids.append(chunk_point_id(meta["source_filename"], chunk_hash, occurrence))
+        return ids
+
+
+def _copy_indexed_file(client, collection_name, source_filename, uploaded_file, digest):
+    """
+    Re-labels the points of an identical, already indexed file under a new name.
+    Vectors are copied as-is, so a renamed copy costs no parsing or embedding.
+    """
+    meta = extract_legal_metadata(uploaded_file.name)
+    if not meta:
+        raise ValueError(f"Invalid filename format: {uploaded_file.name}")
+
+    points = sorted(
+        scroll_file_points(
+            client,
+            collection_name,
+            with_vectors=True,
+            source_filename=source_filename,
+            file_digest=digest,
+        ),
+        key=lambda p: (
+            p.payload["metadata"]["chunk_index"],
+            p.payload["metadata"].get("child_index", 0),
+        ),
+    )
+
+    occurrences = {}
+    new_points = []
+    parent_ids = {}  # Small-to-big mode: old parent ID -> new
+    for point in points:
+        old_meta = point.payload["metadata"]
+        raw_chunk = point.payload["page_content"][len(context_prefix(old_meta)) :]
+        chunk_hash = old_meta["chunk_hash"]
+        # Children share their parent's hash: count each parent once per child slot
+        key = (chunk_hash, old_meta.get("child_index"))
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        point_id = chunk_point_id(meta["source_filename"], chunk_hash, occurrence)
+
+        # Page range and section carry over; only the file-level fields change
+        new_meta = {k: v for k, v in old_meta.items() if k != "index_complete"}
+        new_meta.update(meta, file_digest=digest)
+        if "parent_id" in old_meta:
+            parent_ids[old_meta["parent_id"]] = point_id
+            new_meta["parent_id"] = point_id
+            point_id = child_point_id(point_id, old_meta["child_index"], raw_chunk)
+        new_points.append(
+            models.PointStruct(
+                id=point_id,
+                vector=point.vector,
+                payload={
+                    "page_content": context_prefix(meta) + raw_chunk,
+                    "metadata": new_meta,
+                },
+            )
+        )
+
+    if parent_ids:
+        # Parents first, so no copied child is ever searchable without one
+        parent_store = get_parent_store(collection_name)
+        parent_store.put_many(
+            (
+                parent_ids[old_id],
+                Document(
+                    page_content=context_prefix(meta)
+                    + parent.page_content[len(context_prefix(parent.metadata)) :],
+                    metadata=dict(parent.metadata, **meta, file_digest=digest),
+                ),
+            )
+            for old_id, parent in parent_store.get_many(parent_ids).items()
+        )
+
+    if new_points:
+        client.upsert(collection_name=collection_name, points=new_points)
+        mark_file_indexed(client, collection_name, new_points[-1].id)
+        lexical_index = get_lexical_index(collection_name)
+        lexical_index.add(
+            [p.id for p in new_points], [p.payload["page_content"] for p in new_points]
+        )
+        lexical_index.save()
+    return len(new_points)
+
+
+def index_file(vector_store, uploaded_file, splitter, progress=None, **upsert_options) -> dict:
+    """
+    Incrementally indexes one PDF and returns a summary of what changed.
+
+    - Same name and contents as before: nothing to do.
+    - Identical contents already indexed under another name: points are copied.
+    - Otherwise only new chunks are embedded, moved chunks get their payload
+      updated in place, and chunks that disappeared are deleted.
+
+    The lexical (BM25) index is kept in step with the same delta. The file's
+    last chunk is marked complete only once everything is written, so an
+    interrupted run is resumed by calling this again: chunks already stored
+    are skipped rather than re-embedded.
+
+    `progress`, if given, is called after every batch with the running
+    summary plus "batches", "chunks" and "pages" (the last page reached).
+    `upsert_options` are passed to `bulk_upsert` (batch_size, parallelism, wait).
+    """
+    client = vector_store.client
+    collection_name = vector_store.collection_name
+    digest = file_digest(uploaded_file)
+    summary = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "copied": 0}
+
+    if is_file_indexed(client, collection_name, uploaded_file.name, file_digest=digest):
+        return summary
+
+    existing = _stored_metadata(client, collection_name, uploaded_file.name)
+    if not existing:
+        source_filename = find_filename_by_digest(client, collection_name, digest)
+        if source_filename is not None:
+            summary["copied"] = _copy_indexed_file(
+                client, collection_name, source_filename, uploaded_file, digest
+            )
+            bump_collection_generation()
+            return summary
+
+    return _apply_changes(
+        vector_store,
+        iter_pdf_documents(uploaded_file, splitter),
+        digest,
+        existing,
+        summary,
+        progress=progress,
+        **upsert_options,
+    )
+
+
+def reindex_stored_file(
+    vector_store, source_filename: str, digest: str, splitter, progress=None, **upsert_options
+) -> dict:
+    """
+    Rebuilds one indexed file's chunks and vectors from the page store,
+    without the PDF: after a change to the splitter or the metadata prefix.
+
+    Every chunk is re-embedded (the embedding cache serves unchanged texts)
+    and upserted; chunks the new split no longer produces are deleted.
+    Raises KeyError if the file's pages were never stored.
+    """
+    page_store = get_page_store()
+    if page_store is None or digest not in page_store:
+        raise KeyError(f"No stored pages for {source_filename}")
+
+    summary = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "copied": 0}
+    return _apply_changes(
+        vector_store,
+        iter_page_documents(source_filename, page_store.iter_pages(digest), splitter),
+        digest,
+        _stored_metadata(vector_store.client, vector_store.collection_name, source_filename),
+        summary,
+        progress=progress,
+        rebuild=True,
+        **upsert_options,
+    )
+
+
+def _stored_metadata(client, collection_name, source_filename) -> dict:
+    """Point ID -> metadata of every chunk currently stored for a file."""
+    return {
+        str(point.id): point.payload.get("metadata") or {}
+        for point in scroll_file_points(client, collection_name, source_filename=source_filename)
+    }
+
+
+def _apply_changes(
+    vector_store, batches, digest, existing, summary, progress=None, rebuild=False, **upsert_options
+) -> dict:
+    """
+    Writes a file's Document batches against the points it already has:
+    new chunks are embedded (every chunk when `rebuild`), moved ones get
+    their payload updated and missing ones are deleted. In small-to-big
+    mode the points are each chunk's child passages, and the chunks
+    themselves go to the collection's parent store.
+    """
+    client = vector_store.client
+    collection_name = vector_store.collection_name
+    annotator = _ChunkAnnotator(digest)
+    lexical_index = get_lexical_index(collection_name)
+    # Payload updates here and the upsert writers share the client
+    write_lock = new_write_lock(client)
+    # Small-to-big mode (CHILD_CHUNK_SIZE): embed short passages, keep chunks as parents
+    child_splitter = get_child_text_splitter()
+    seen_ids = set()
+    seen_parents = set()
+    position = {"batches": 0, "chunks": 0, "pages": 0, "added": 0, "last_id": None}
+
+    def changed_batches():
+        for docs in batches:
+            ids = annotator.annotate(docs)
+            if child_splitter is not None:
+                # Parents are stored before their children become searchable
+                get_parent_store(collection_name).put_many(zip(ids, docs))
+                seen_parents.update(ids)
+                docs, ids = _split_children(docs, ids, child_splitter)
+            seen_ids.update(ids)
+
+            new_docs, new_ids, payload_updates, unindexed = [], [], [], []
+            for doc, point_id in zip(docs, ids):
+                if rebuild or point_id not in existing:
+                    new_docs.append(doc)
+                    new_ids.append(point_id)
+                    continue
+                if point_id not in lexical_index:
+                    # Stored by an interrupted run that never saved the lexical index
+                    unindexed.append((point_id, doc.page_content))
+                if existing[point_id] != doc.metadata:
+                    # Same text, new position or revision: no need to re-embed
+                    payload_updates.append(
+                        models.SetPayloadOperation(
+                            set_payload=models.SetPayload(
+                                payload={"metadata": doc.metadata}, points=[point_id]
+                            )
+                        )
+                    )
+                else:
+                    summary["unchanged"] += 1
+
+            if payload_updates:
+                with write_lock:
+                    client.batch_update_points(
+                        collection_name=collection_name, update_operations=payload_updates
+                    )
+                summary["updated"] += len(payload_updates)
+            if unindexed:
+                lexical_index.add(*zip(*unindexed))
+            if new_docs:
+                lexical_index.add(new_ids, [doc.page_content for doc in new_docs])
+                yield new_docs, new_ids
+
+            position["batches"] += 1
+            position["chunks"] += len(docs)
+            position["added"] += len(new_docs)
+            position["pages"] = docs[-1].metadata.get("page_end", position["pages"])
+            position["last_id"] = ids[-1]
+            if progress is not None:
+                progress(
+                    dict(
+                        summary,
+                        added=position["added"],
+                        batches=position["batches"],
+                        chunks=position["chunks"],
+                        pages=position["pages"],
+                    )
+                )
+
+    # Embedding of the next batch overlaps with the upsert of the previous one
+    upsert_stats = bulk_upsert(
+        vector_store, changed_batches(), write_lock=write_lock, **upsert_options
+    )
+    summary["added"] = upsert_stats["points"]
+    summary["docs_per_sec"] = upsert_stats["docs_per_sec"]
+
+    stale_ids = [point_id for point_id in existing if point_id not in seen_ids]
+    if stale_ids:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=stale_ids),
+        )
+        summary["deleted"] = len(stale_ids)
+    lexical_index.remove(stale_ids)
+    lexical_index.save()
+    stale_parents = {meta.get("parent_id") for meta in existing.values()} - seen_parents - {None}
+    if stale_parents:
+        get_parent_store(collection_name).delete(stale_parents)
+    if position["last_id"] is not None:
+        mark_file_indexed(client, collection_name, position["last_id"])
+
+    if summary["added"] or summary["updated"] or summary["deleted"]:
+        bump_collection_generation()
+    return summary
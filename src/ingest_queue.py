@@ -0,0 +1,363 @@
+"""
+Persistent ingestion queue: uploads are saved to disk and indexed by background
+worker threads, so the page never blocks on a large PDF.
+
+Jobs live in SQLite and report progress after every batch. A job whose worker
+died (the app was restarted or crashed mid-file) is picked up again once its
+lease expires; `index_file` then skips the chunks that were already stored.
+A failed job is retried up to INGEST_MAX_ATTEMPTS times in all before its
+upload is removed.
+
+Drain the queue without the Streamlit page (e.g. after a crash):
+    python -m src.ingest_queue --workers 2
+
+Against a Qdrant server this can run next to the app. The embedded stores
+(VECTOR_BACKEND=mmap, QDRANT_PATH) belong to one process, so stop the app first.
+"""
+
+import argparse
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+from src.matters import DEFAULT_MATTER, normalize_matter
+from src.utils.file_lock import file_lock
+from src.utils.metrics import observe
+
+_ingest_queue_instance = None
+
+# A running job whose worker hasn't checked in for this long is requeued
+LEASE_SECONDS = 60
+# A failed job waits this long before it is claimed again
+RETRY_SECONDS = 10
+ACTIVE_STATES = ("queued", "running")
+
+
+class IngestQueue:
+    """
+    SQLite-backed job queue for `index_file`.
+
+    `submit` stores the upload under `upload_dir` and queues a job (or returns
+    the pending job for the same file and revision). `start_workers` runs jobs
+    in threads, at most one per filename at a time; while they run, a
+    heartbeat renews their lease. A failed job is requeued until it has run
+    `max_attempts` times. `jobs` reports state and progress.
+    """
+
+    def __init__(self, path="data/ingest_queue.sqlite", upload_dir="data/uploads", max_attempts=3):
+        self.path = path
+        self.upload_dir = upload_dir
+        self.max_attempts = max_attempts
+        # Held while checking whether an upload is still needed and writing or removing it
+        self._upload_lock_path = os.path.join(upload_dir, ".lock")
+        self.owner = uuid4().hex  # Identifies this process's leases
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        os.makedirs(upload_dir, exist_ok=True)
+
+        # Autocommit mode with explicit IMMEDIATE transactions where we claim jobs,
+        # so several processes can share the file safely
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, "
+            "path TEXT NOT NULL, digest TEXT NOT NULL, matter TEXT NOT NULL DEFAULT 'default', "
+            "status TEXT NOT NULL, "
+            "owner TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "pages_total INTEGER NOT NULL DEFAULT 0, progress TEXT NOT NULL DEFAULT '{}', "
+            "error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "matter" not in columns:  # Queues created before matters existed
+            self._db.execute("ALTER TABLE jobs ADD COLUMN matter TEXT NOT NULL DEFAULT 'default'")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._workers = []
+
+    # --- jobs ---
+
+    def submit(self, filename: str, data: bytes, digest: str, matter=DEFAULT_MATTER) -> int:
+        """Queues a file for indexing into `matter` and returns its job ID."""
+        matter = normalize_matter(matter)
+        with self._lock, file_lock(self._upload_lock_path):
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE filename = ? AND digest = ? AND matter = ? "
+                "AND status IN (?, ?)",
+                (filename, digest, matter, *ACTIVE_STATES),
+            ).fetchone()
+            if row is not None:
+                return row["id"]
+
+            # Content-addressed, written then renamed so a worker never reads a partial
+            # file; a copy kept for another job (or matter) is reused as it is
+            path = os.path.join(self.upload_dir, f"{digest}.pdf")
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{self.owner}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+
+            now = time.time()
+            cursor = self._db.execute(
+                "INSERT INTO jobs (filename, path, digest, matter, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (filename, path, digest, matter, now, now),
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def claim(self):
+        """
+        Marks the oldest runnable job as running under this process and returns
+        it, or None. Jobs whose lease expired are requeued first, or failed
+        once they have used up their attempts.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                expired = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'running' AND updated_at < ?",
+                    (now - LEASE_SECONDS,),
+                ).fetchall()
+                self._db.execute(
+                    "UPDATE jobs SET owner = NULL, "
+                    "status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                    "error = CASE WHEN attempts < ? THEN error ELSE 'Worker stopped' END "
+                    "WHERE status = 'running' AND updated_at < ?",
+                    (self.max_attempts, self.max_attempts, now - LEASE_SECONDS),
+                )
+                # Two revisions of one file must not be indexed concurrently; a failed
+                # attempt (error set) waits before it is retried
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND filename NOT IN "
+                    "(SELECT filename FROM jobs WHERE status = 'running') "
+                    "AND (error IS NULL OR updated_at < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now - RETRY_SECONDS,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', owner = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (self.owner, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        for job in expired:
+            if job["attempts"] >= self.max_attempts:
+                self._remove_upload(job)
+        if row is None:
+            return None
+        job = self._job(row)
+        job.update(status="running", owner=self.owner, attempts=job["attempts"] + 1)
+        return job
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ? AND owner = ?",
+                (*fields.values(), job_id, self.owner),
+            )
+
+    def checkpoint(self, job_id, progress: dict):
+        """Records a job's progress after a batch (and renews its lease)."""
+        self._update(job_id, progress=json.dumps(progress))
+
+    def finish(self, job_id, summary: dict):
+        self._update(job_id, status="done", progress=json.dumps(summary), error=None)
+
+    def fail(self, job, error):
+        """
+        Requeues a job that still has attempts left; otherwise marks it failed
+        and removes its upload.
+        """
+        retry = job["attempts"] < self.max_attempts
+        self._update(
+            job["id"],
+            status="queued" if retry else "failed",
+            owner=None,
+            error=str(error) or type(error).__name__,
+        )
+        if not retry:
+            self._remove_upload(job)
+
+    def heartbeat(self):
+        """Renews the lease of every job this process is running."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET updated_at = ? WHERE status = 'running' AND owner = ?",
+                (time.time(), self.owner),
+            )
+
+    def jobs(self, ids=(), active=True):
+        """Jobs with the given IDs, plus every queued or running job when `active`."""
+        ids = list(ids)
+        conditions = []
+        if ids:
+            conditions.append(f"id IN ({', '.join('?' * len(ids))})")
+        if active:
+            conditions.append("status IN (?, ?)")
+            ids += ACTIVE_STATES
+        if not conditions:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs WHERE {' OR '.join(conditions)} ORDER BY id", ids
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATES
+            ).fetchone()[0]
+
+    @staticmethod
+    def _job(row) -> dict:
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        return job
+
+    # --- workers ---
+
+    def run(self, job, vector_store, splitter):
+        """Indexes one claimed job; failures are recorded on the job, not raised."""
+        from pypdf import PdfReader
+        from src.indexing import index_file
+
+        started = time.perf_counter()
+        try:
+            with open(job["path"], "rb") as f:
+                upload = io.BytesIO(f.read())
+            upload.name = job["filename"]  # index_file parses metadata from the name
+            self._update(job["id"], pages_total=len(PdfReader(upload).pages))
+
+            summary = index_file(
+                vector_store,
+                upload,
+                splitter,
+                progress=lambda progress: self.checkpoint(job["id"], progress),
+            )
+        except Exception as e:
+            print(
+                f"Ingest job {job['id']} ({job['filename']}) failed "
+                f"(attempt {job['attempts']}/{self.max_attempts}): {e}"
+            )
+            self.fail(job, e)
+            return
+        self.finish(job["id"], summary)
+        observe("ingest.job", time.perf_counter() - started)
+        self._remove_upload(job)
+
+    def _remove_upload(self, job):
+        # Under both locks, so no submit (in this or another process) can queue a job
+        # for the same upload between the check and the removal
+        with self._lock, file_lock(self._upload_lock_path):
+            still_needed = self._db.execute(
+                "SELECT 1 FROM jobs WHERE path = ? AND status IN (?, ?)",
+                (job["path"], *ACTIVE_STATES),
+            ).fetchone()
+            if still_needed is None and os.path.exists(job["path"]):
+                os.remove(job["path"])
+
+    def _work(self, engine, stop_when_idle, poll_seconds):
+        from src.database import get_vector_store
+
+        while True:
+            job = self.claim()
+            if job is None:
+                # Draining also waits out jobs still leased by another worker
+                if stop_when_idle and not self.pending():
+                    return
+                self._wakeup.wait(poll_seconds)
+                self._wakeup.clear()
+                continue
+            try:
+                engine.get("vector_store")  # The client and embedder are loaded
+                vector_store = get_vector_store(job["matter"], create=True)
+                splitter = engine.get("splitter")
+            except Exception as e:
+                self.fail(job, e)
+                continue
+            self.run(job, vector_store, splitter)
+
+    def _beat(self):
+        while any(thread.is_alive() for thread in self._workers):
+            self.heartbeat()
+            time.sleep(LEASE_SECONDS / 4)
+
+    def start_workers(self, engine, workers=2, stop_when_idle=False, poll_seconds=1.0):
+        """
+        Starts `workers` threads that index queued jobs with the engine's
+        vector store and splitter. Returns the threads.
+        """
+        if os.getenv("QDRANT_PATH"):
+            workers = 1  # Qdrant local mode is not safe for concurrent writers
+        self._workers = [
+            threading.Thread(
+                target=self._work,
+                args=(engine, stop_when_idle, poll_seconds),
+                name=f"ingest-{i}",
+                daemon=True,
+            )
+            for i in range(workers)
+        ]
+        for thread in self._workers:
+            thread.start()
+        threading.Thread(target=self._beat, name="ingest-heartbeat", daemon=True).start()
+        return self._workers
+
+
+def get_ingest_queue():
+    """Returns the shared ingestion queue (INGEST_QUEUE_PATH, UPLOAD_DIR, INGEST_MAX_ATTEMPTS)."""
+    global _ingest_queue_instance
+
+    if _ingest_queue_instance is None:
+        _ingest_queue_instance = IngestQueue(
+            path=os.getenv("INGEST_QUEUE_PATH", "data/ingest_queue.sqlite"),
+            upload_dir=os.getenv("UPLOAD_DIR", "data/uploads"),
+            max_attempts=int(os.getenv("INGEST_MAX_ATTEMPTS", "3")),
+        )
+
+    return _ingest_queue_instance
+
+
+def main(argv=None):
+    from src.engine import COMPONENTS, Engine
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "2")))
+    args = parser.parse_args(argv)
+
+    # Only what indexing needs: no reranker or LLM
+    engine = Engine(
+        {name: COMPONENTS[name] for name in ("qdrant", "embedder", "splitter", "vector_store")}
+    ).start()
+    try:
+        engine.get("qdrant")
+    except RuntimeError as e:
+        # An embedded store (VECTOR_BACKEND=mmap, QDRANT_PATH) has one owner process
+        parser.error(f"{e}: {e.__cause__}")
+    ingest_queue = get_ingest_queue()
+    print(f"Draining {ingest_queue.pending()} pending ingest jobs...")
+    for thread in ingest_queue.start_workers(engine, args.workers, stop_when_idle=True):
+        thread.join()
+    print("Ingest queue drained.")
+
+
+if __name__ == "__main__":
+    main()
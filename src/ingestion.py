@@ -1,14 +1,25 @@
+import hashlib
+import io
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from uuid import uuid4
 from pypdf import PdfReader
 from langchain_core.documents import Document
+from src.page_store import get_page_store
+from src.utils.metrics import observe, span
+
+# Pages handed to a worker process per task, and how many characters of
+# normalized text we buffer before splitting in streaming mode.
+PAGES_PER_TASK = 8
+STREAM_WINDOW_CHARS = 50_000
 
 def extract_legal_metadata(file_name: str):
     """Parses legal metadata from structured filenames."""
     clean_name, _ = os.path.splitext(file_name)
     parts = clean_name.split("_")
-    
+
     if len(parts) < 7:
         return None
 
@@ -25,36 +36,276 @@ def extract_legal_metadata(file_name: str):
         "source_filename": file_name,
     }
 
+def context_prefix(meta: dict) -> str:
+    """The metadata header prepended to every chunk of a file."""
+    return f"Doc: {meta['doc_title']} | Company: {meta['company']} | Content: "
+
+def _contextualize(chunk: str, meta: dict) -> Document:
+    """Prepends metadata to the chunk text so the embedding 'knows' the context."""
+    return Document(page_content=context_prefix(meta) + chunk, metadata=meta)
+
+def read_file_bytes(uploaded_file) -> bytes:
+    """Returns the raw bytes of an uploaded file or binary file object."""
+    if hasattr(uploaded_file, "getvalue"):
+        return uploaded_file.getvalue()
+    uploaded_file.seek(0)
+    return uploaded_file.read()
+
+def file_digest(uploaded_file) -> str:
+    """SHA-256 of the file contents, used to detect revisions and renamed copies."""
+    return hashlib.sha256(read_file_bytes(uploaded_file)).hexdigest()
+
+def is_page_aware(splitter) -> bool:
+    """Splitters with `split_pages` (see `LegalTextSplitter`) take raw pages and keep provenance."""
+    return hasattr(splitter, "split_pages")
+
+
 def process_pdf_to_documents(uploaded_file, splitter):
     """Extracts text from PDF, cleans it, and returns a list of Document objects."""
-    # 1. Extract
-    pdf_reader = PdfReader(uploaded_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() or ""
+    # 1. Extract (or read back the pages stored on a previous ingest)
+    with span("ingest.extract") as s:
+        page_texts = list(iter_cached_page_texts(read_file_bytes(uploaded_file), max_workers=1))
+        s.items = len(page_texts)
 
-    # 2. Clean (Senior trick: normalize whitespace once)
-    text = " ".join(text.replace("\n", " ").split()).lower().strip()
-    
-    # 3. Chunk
-    chunks = splitter.split_text(text)
-    
-    # 4. Metadata
     meta = extract_legal_metadata(uploaded_file.name)
     if not meta:
         raise ValueError(f"Invalid filename format: {uploaded_file.name}")
 
-    # 5. Contextualize Chunks
-    new_docs = []
-    for chunk in chunks:
-        # We prepend metadata to the chunk text so the embedding 'knows' the context
-        contextualized_text = (
-            f"Doc: {meta['doc_title']} | "
-            f"Company: {meta['company']} | "
-            f"Content: {chunk}"
-        )
-        new_docs.append(
-            Document(page_content=contextualized_text, metadata=meta)
-        )
-    
-    return new_docs
\ No newline at end of file
+    if is_page_aware(splitter):
+        # Headings need the original lines and case; chunks carry their page range
+        with span("ingest.split") as s:
+            chunks = list(splitter.split_pages(page_texts))
+            s.items = len(chunks)
+        with span("ingest.contextualize"):
+            return [_contextualize(chunk.text, {**meta, **chunk.metadata}) for chunk in chunks]
+
+    text = "".join(page_texts)
+
+    # 2. Clean (Senior trick: normalize whitespace once)
+    with span("ingest.clean"):
+        text = " ".join(text.replace("\n", " ").split()).lower().strip()
+
+    # 3. Chunk
+    with span("ingest.split") as s:
+        chunks = splitter.split_text(text)
+        s.items = len(chunks)
+
+    # 4. Contextualize Chunks
+    with span("ingest.contextualize"):
+        return [_contextualize(chunk, meta) for chunk in chunks]
+
+
+# --- Streaming ingestion ---
+
+_worker_reader = None
+
+
+def _init_pdf_worker(pdf_bytes: bytes):
+    """Opens the PDF once per worker process."""
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(pdf_bytes))
+
+
+def _extract_page_range(page_range):
+    start, stop = page_range
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _iter_page_texts(pdf_bytes: bytes, max_workers=None):
+    """Yields raw page texts in order, extracting them across a process pool."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    num_pages = len(reader.pages)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers <= 1 or num_pages <= PAGES_PER_TASK:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    ranges = [
+        (start, min(start + PAGES_PER_TASK, num_pages))
+        for start in range(0, num_pages, PAGES_PER_TASK)
+    ]
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_pdf_worker,
+        initargs=(pdf_bytes,),
+    ) as pool:
+        # Keep only a bounded number of page ranges in flight so extracted
+        # text never piles up faster than the splitter consumes it.
+        pending = deque()
+        ranges = iter(ranges)
+        for page_range in ranges:
+            pending.append(pool.submit(_extract_page_range, page_range))
+            if len(pending) >= 2 * max_workers:
+                break
+        while pending:
+            yield from pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(_extract_page_range, next_range))
+
+
+def iter_cached_page_texts(pdf_bytes: bytes, max_workers=None):
+    """
+    Yields raw page texts from the page store, extracting (and storing) them
+    on the first ingest of these exact bytes.
+    """
+    page_store = get_page_store()
+    if page_store is None:
+        yield from _iter_page_texts(pdf_bytes, max_workers=max_workers)
+        return
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    if digest in page_store:
+        yield from page_store.iter_pages(digest)
+    else:
+        yield from page_store.record(digest, _iter_page_texts(pdf_bytes, max_workers=max_workers))
+
+
+def _iter_normalized_tokens(page_texts):
+    """Streaming equivalent of `" ".join(text.split()).lower()` over concatenated pages."""
+    tail = ""
+    for page_text in page_texts:
+        text = tail + page_text
+        if not text:
+            continue
+        tokens = text.split()
+        # A page that doesn't end in whitespace may continue its last word on the next page
+        tail = "" if text[-1].isspace() or not tokens else tokens.pop()
+        for token in tokens:
+            yield token.lower()
+    if tail:
+        yield tail.lower()
+
+
+def _split_stable_prefix(splitter, buffer: str):
+    """
+    Splits the buffer and returns (final_chunks, remainder).
+
+    Only the last chunk can still change once more text arrives, so it is held
+    back. It always ends at the end of the buffer, which gives its exact start;
+    when that start is a word boundary, re-splitting from there reproduces the
+    chunks the splitter would have produced over the whole document.
+    """
+    chunks = splitter.split_text(buffer)
+    if len(chunks) < 2:
+        return [], buffer
+
+    start = len(buffer) - len(chunks[-1])
+    if buffer[start - 1] != " " or not buffer.endswith(chunks[-1]):
+        # The tail is part of an oversized token; wait for more text
+        return [], buffer
+    return chunks[:-1], buffer[start - 1 :]
+
+
+def iter_pdf_documents(
+    uploaded_file,
+    splitter,
+    batch_size=64,
+    max_workers=None,
+    window_chars=STREAM_WINDOW_CHARS,
+):
+    """
+    Streaming variant of `process_pdf_to_documents`.
+
+    Pages are extracted in a process pool (or read from the page store) and
+    split through a bounded text window (page-aware splitters consume them
+    one by one), so memory stays flat regardless of page count. Yields lists
+    of at most `batch_size` Documents, identical to the non-streaming output.
+    """
+    pdf_bytes = read_file_bytes(uploaded_file)
+    yield from iter_page_documents(
+        uploaded_file.name,
+        iter_cached_page_texts(pdf_bytes, max_workers=max_workers),
+        splitter,
+        batch_size=batch_size,
+        window_chars=window_chars,
+    )
+
+
+def iter_page_documents(
+    file_name: str,
+    page_texts,
+    splitter,
+    batch_size=64,
+    window_chars=STREAM_WINDOW_CHARS,
+):
+    """
+    Chunks an iterable of page texts (e.g. from the page store) into batches
+    of Documents for `file_name`, exactly as `iter_pdf_documents` does.
+    """
+    meta = extract_legal_metadata(file_name)
+    if not meta:
+        raise ValueError(f"Invalid filename format: {file_name}")
+
+    batch = []
+
+    def flush(chunks, chunk_meta=None):
+        for chunk in chunks:
+            batch.append(_contextualize(chunk, {**meta, **chunk_meta} if chunk_meta else meta))
+            if len(batch) >= batch_size:
+                yield batch[:]
+                batch.clear()
+
+    # Stages interleave in this generator, so their time is summed and
+    # recorded once the file is done
+    timings = {"extract": 0.0, "split": 0.0, "pages": 0, "chunks": 0}
+
+    def timed_pages():
+        pages = iter(page_texts)
+        while True:
+            start = time.perf_counter()
+            page_text = next(pages, None)
+            timings["extract"] += time.perf_counter() - start
+            if page_text is None:
+                return
+            timings["pages"] += 1
+            yield page_text
+
+    def split(text, final=False):
+        start = time.perf_counter()
+        if final:
+            chunks, remainder = splitter.split_text(text), ""
+        else:
+            chunks, remainder = _split_stable_prefix(splitter, text)
+        timings["split"] += time.perf_counter() - start
+        timings["chunks"] += len(chunks)
+        return chunks, remainder
+
+    def window_chunks():
+        parts = []
+        size = 0
+        limit = window_chars
+        for token in _iter_normalized_tokens(timed_pages()):
+            parts.append(token)
+            size += len(token) + 1
+            if size < limit:
+                continue
+            chunks, remainder = split(" ".join(parts))
+            yield from chunks
+            parts = [remainder]
+            size = len(remainder)
+            limit = size + window_chars
+        if parts:
+            yield from split(" ".join(parts), final=True)[0]
+
+    if is_page_aware(splitter):
+        # The splitter consumes pages lazily; its own time excludes extraction
+        chunks = splitter.split_pages(timed_pages())
+        while True:
+            start, extracted = time.perf_counter(), timings["extract"]
+            chunk = next(chunks, None)
+            timings["split"] += time.perf_counter() - start - (timings["extract"] - extracted)
+            if chunk is None:
+                break
+            timings["chunks"] += 1
+            yield from flush([chunk.text], chunk.metadata)
+    else:
+        for chunk in window_chunks():
+            yield from flush([chunk])
+
+    if batch:
+        yield batch
+
+    observe("ingest.extract", timings["extract"], timings["pages"])
+    observe("ingest.split", timings["split"], timings["chunks"])
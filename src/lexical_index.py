@@ -0,0 +1,282 @@
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+import numpy as np
+from src.utils.file_lock import file_lock
+
+_lexical_index_instances = {}
+
+# Keeps legal reference tokens intact: "12.3(b)", "$1,000", "10-k", "non-compete"
+TOKEN_PATTERN = re.compile(
+    r"\$?\d+(?:[.,]\d+)*(?:\([a-z0-9]{1,4}\))*%?(?![\w-])|[a-z0-9]+(?:[-'][a-z0-9]+)*"
+)
+
+
+def tokenize(text: str):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index with array-backed postings.
+
+    Each term owns two compact arrays (document slots and term frequencies).
+    Documents are addressed by Qdrant point ID and can be added or removed
+    incrementally; removals are tombstoned and compacted once they pile up.
+
+    With a `path`, several processes (the app, the ingest and re-index CLIs)
+    can share the index: searches reload a version another process saved,
+    and `save` merges this process's unsaved changes into the latest version
+    on disk under a file lock instead of overwriting it.
+    """
+
+    def __init__(self, path=None, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._pending = []  # Unsaved (method, ids, texts) changes, replayed over newer saves
+        self._disk_version = None
+        self._reset()
+        if path:
+            with self._file_lock(shared=True), self._lock:
+                self._reload()
+
+    def _reset(self):
+        self._vocab = {}
+        self._post_slots = []
+        self._post_tfs = []
+        self._doc_ids = []
+        self._doc_lens = array("I")
+        self._alive = bytearray()
+        self._slot_of = {}
+        self._total_len = 0
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, point_id):
+        return str(point_id) in self._slot_of
+
+    def _file_lock(self, shared=False):
+        return file_lock(os.path.join(self.path, "lock"), shared=shared)
+
+    def _signature(self):
+        try:
+            stat = os.stat(os.path.join(self.path, "postings.npz"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _reload(self):
+        """Loads the saved version and replays unsaved changes on top (locks held)."""
+        self._disk_version = self._signature()
+        self._reset()
+        if self._disk_version is not None:
+            self._load()
+        for method, ids, texts in self._pending:
+            if method == "add":
+                self._add(ids, texts)
+            else:
+                self._remove(ids)
+
+    def refresh(self):
+        """Picks up a version saved by another process since the last look."""
+        if not self.path or self._signature() == self._disk_version:
+            return
+        with self._file_lock(shared=True), self._lock:
+            self._reload()
+
+    def add(self, ids, texts):
+        """Indexes (point id, text) pairs, replacing any previous version of an id."""
+        ids, texts = list(ids), list(texts)
+        with self._lock:
+            self._add(ids, texts)
+            if self.path:
+                self._pending.append(("add", ids, texts))
+
+    def _add(self, ids, texts):
+        for point_id, text in zip(ids, texts):
+            point_id = str(point_id)
+            if point_id in self._slot_of:
+                self._remove_slot(self._slot_of.pop(point_id))
+
+            slot = len(self._doc_ids)
+            tokens = tokenize(text)
+            self._doc_ids.append(point_id)
+            self._doc_lens.append(len(tokens))
+            self._alive.append(1)
+            self._slot_of[point_id] = slot
+            self._total_len += len(tokens)
+
+            for term, tf in Counter(tokens).items():
+                term_id = self._vocab.get(term)
+                if term_id is None:
+                    term_id = self._vocab[term] = len(self._post_slots)
+                    self._post_slots.append(array("I"))
+                    self._post_tfs.append(array("H"))
+                self._post_slots[term_id].append(slot)
+                self._post_tfs[term_id].append(min(tf, 65535))
+
+    def remove(self, ids):
+        ids = list(ids)
+        with self._lock:
+            self._remove(ids)
+            if self.path and ids:
+                self._pending.append(("remove", ids, None))
+
+    def _remove(self, ids):
+        for point_id in ids:
+            slot = self._slot_of.pop(str(point_id), None)
+            if slot is not None:
+                self._remove_slot(slot)
+        if self._dead > 1000 and self._dead > len(self._slot_of) // 4:
+            self._compact()
+
+    def _remove_slot(self, slot):
+        self._alive[slot] = 0
+        self._total_len -= self._doc_lens[slot]
+        self._dead += 1
+
+    def _compact(self):
+        """Rebuilds postings without tombstoned documents."""
+        alive = np.frombuffer(bytes(self._alive), dtype=np.uint8).astype(bool)
+        new_slot = np.cumsum(alive) - 1
+        for term_id in range(len(self._post_slots)):
+            slots = np.frombuffer(self._post_slots[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)
+            keep = alive[slots]
+            remapped = new_slot[slots[keep]].astype(np.uint32)
+            self._post_slots[term_id] = array("I", remapped.tobytes())
+            self._post_tfs[term_id] = array("H", tfs[keep].tobytes())
+
+        self._doc_ids = [d for d, a in zip(self._doc_ids, self._alive) if a]
+        self._doc_lens = array("I", (n for n, a in zip(self._doc_lens, self._alive) if a))
+        self._alive = bytearray(b"\x01" * len(self._doc_ids))
+        self._slot_of = {point_id: slot for slot, point_id in enumerate(self._doc_ids)}
+        self._dead = 0
+
+    def search(self, query: str, k=25):
+        """Returns up to k (point id, BM25 score) pairs, best first."""
+        self.refresh()
+        with self._lock:
+            num_docs = len(self._slot_of)
+            if not num_docs:
+                return []
+            alive = np.frombuffer(bytes(self._alive), dtype=np.uint8).astype(bool)
+            doc_lens = np.frombuffer(self._doc_lens, dtype=np.uint32).astype(np.float32)
+            avg_len = self._total_len / num_docs or 1.0
+            norm = self.k1 * (1 - self.b + self.b * doc_lens / avg_len)
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+
+            for term in set(tokenize(query)):
+                term_id = self._vocab.get(term)
+                if term_id is None:
+                    continue
+                slots = np.frombuffer(self._post_slots[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16)
+                tfs = tfs.astype(np.float32)
+                live = alive[slots]
+                slots, tfs = slots[live], tfs[live]
+                if not len(slots):
+                    continue
+                idf = math.log(1 + (num_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + norm[slots])
+
+            hits = np.flatnonzero(scores > 0)
+            top = hits[np.argsort(-scores[hits], kind="stable")[:k]]
+            return [(self._doc_ids[slot], float(scores[slot])) for slot in top]
+
+    def save(self):
+        """Persists the index as flat CSR arrays, merged with any newer saved version."""
+        if not self.path:
+            return
+        with self._file_lock(), self._lock:
+            if self._signature() != self._disk_version:
+                self._reload()  # Another process saved since: keep its changes too
+            lengths = [len(p) for p in self._post_slots]
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            slots = b"".join(p.tobytes() for p in self._post_slots)
+            tfs = b"".join(p.tobytes() for p in self._post_tfs)
+
+            # Write-then-rename so a crash never leaves a half-written index
+            postings_tmp = os.path.join(self.path, "postings.tmp.npz")
+            terms_tmp = os.path.join(self.path, "terms.json.tmp")
+            np.savez(
+                postings_tmp,
+                offsets=offsets,
+                slots=np.frombuffer(slots, dtype=np.uint32),
+                tfs=np.frombuffer(tfs, dtype=np.uint16),
+                doc_lens=np.frombuffer(self._doc_lens, dtype=np.uint32),
+                alive=np.frombuffer(bytes(self._alive), dtype=np.uint8),
+            )
+            with open(terms_tmp, "w") as f:
+                json.dump({"terms": list(self._vocab), "doc_ids": self._doc_ids}, f)
+            os.replace(terms_tmp, os.path.join(self.path, "terms.json"))
+            os.replace(postings_tmp, os.path.join(self.path, "postings.npz"))
+            self._pending = []
+            self._disk_version = self._signature()
+
+    def _load(self):
+        with open(os.path.join(self.path, "terms.json")) as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(self.path, "postings.npz"))
+        offsets, slots, tfs = data["offsets"], data["slots"], data["tfs"]
+        consistent = len(offsets) == len(meta["terms"]) + 1 and len(
+            data["alive"]
+        ) == len(meta["doc_ids"])
+        if not consistent:
+            return  # Interrupted save: start empty and let the caller rebuild
+
+        self._vocab = {term: i for i, term in enumerate(meta["terms"])}
+        bounds = list(zip(offsets, offsets[1:]))
+        self._post_slots = [array("I", slots[s:e].tobytes()) for s, e in bounds]
+        self._post_tfs = [array("H", tfs[s:e].tobytes()) for s, e in bounds]
+        self._doc_ids = meta["doc_ids"]
+        self._doc_lens = array("I", data["doc_lens"].tobytes())
+        self._alive = bytearray(data["alive"].tobytes())
+        self._slot_of = {d: i for i, d in enumerate(self._doc_ids) if self._alive[i]}
+        self._total_len = int(data["doc_lens"][data["alive"].astype(bool)].sum())
+        self._dead = len(self._doc_ids) - len(self._slot_of)
+
+
+def rebuild_lexical_index(index: LexicalIndex, client, collection_name: str, batch_size=512):
+    """Fills the index from every point already stored in the collection."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["page_content"],
+        )
+        index.add([p.id for p in points], [p.payload.get("page_content", "") for p in points])
+        if offset is None:
+            break
+    index.save()
+
+
+def get_lexical_index(collection_name="legal-rag"):
+    """Returns the persistent lexical index for a collection."""
+    if collection_name not in _lexical_index_instances:
+        base_dir = os.getenv("LEXICAL_INDEX_DIR", "data/lexical_index")
+        _lexical_index_instances[collection_name] = LexicalIndex(
+            os.path.join(base_dir, collection_name)
+        )
+
+    return _lexical_index_instances[collection_name]
+
+
+def drop_lexical_index(collection_name: str):
+    """Forgets a deleted collection's lexical index and removes its files."""
+    import shutil
+
+    _lexical_index_instances.pop(collection_name, None)
+    base_dir = os.getenv("LEXICAL_INDEX_DIR", "data/lexical_index")
+    shutil.rmtree(os.path.join(base_dir, collection_name), ignore_errors=True)
@@ -0,0 +1,278 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def embedding_cache_key(model_name: str, text: str) -> bytes:
+    """Content address of a vector: hash of the model name plus the exact text."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed, size-bounded LRU store of embedding vectors.
+
+    Vectors live in a memory-mapped matrix (float16 by default) with a parallel
+    array of 16-byte content hashes and last-used ticks, so the index is
+    rebuilt from disk on startup and nothing has to be unpickled.
+
+    Several processes (API workers, the ingest queue, re-index) can share one
+    directory: slots are allocated under an exclusive file lock, a shared
+    generation counter tells each process when to re-read the keys, and a
+    slot only counts as a hit while it still holds the requested key.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries=200_000, dtype="float16"):
+        # One directory per model so a model swap never serves stale vectors
+        slug = hashlib.blake2b(model_name.encode("utf-8"), digest_size=8).hexdigest()
+        self.path = os.path.join(path, slug)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._keys = None
+        self._ticks = None
+        self._state = None  # [generation, tick], shared by every process
+        self._known = None  # Keys as last indexed into _slots
+        self._slots = {}
+        self._generation = -1
+        self._size = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.path, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._open_existing()
+
+    @contextmanager
+    def _file_lock(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open_existing(self) -> bool:
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["max_entries"] != self.max_entries or meta["dtype"] != self.dtype.name:
+            return False
+        with self._file_lock():
+            self._open(meta["dim"], mode="r+")
+        return True
+
+    def _open(self, dim: int, mode: str):
+        self._vectors = np.memmap(
+            os.path.join(self.path, "vectors.bin"),
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self.max_entries, dim),
+        )
+        self._keys = np.memmap(
+            os.path.join(self.path, "keys.bin"),
+            dtype=np.uint8,
+            mode=mode,
+            shape=(self.max_entries, 16),
+        )
+        self._ticks = np.memmap(
+            os.path.join(self.path, "ticks.bin"),
+            dtype=np.int64,
+            mode=mode,
+            shape=(self.max_entries,),
+        )
+        state_path = os.path.join(self.path, "state.bin")
+        new_state = mode == "w+" or not os.path.exists(state_path)
+        self._state = np.memmap(
+            state_path, dtype=np.int64, mode="w+" if new_state else "r+", shape=(2,)
+        )
+        if new_state:
+            # Caches written before the shared counter existed keep their recency
+            self._state[1] = int(self._ticks.max())
+            self._state.flush()
+
+        if mode == "w+":
+            with open(os.path.join(self.path, "meta.json"), "w") as f:
+                json.dump(
+                    {
+                        "model_name": self.model_name,
+                        "dim": dim,
+                        "max_entries": self.max_entries,
+                        "dtype": self.dtype.name,
+                    },
+                    f,
+                )
+
+        # Rebuild the hash index from the occupied slots (tick 0 = empty)
+        self._known = np.zeros((self.max_entries, 16), dtype=np.uint8)
+        self._slots = {}
+        self._generation = -1
+        self._sync()
+
+    def _sync(self):
+        """Re-reads the slots other processes changed since the last look."""
+        generation = int(self._state[0])
+        if generation == self._generation:
+            return
+        changed = np.flatnonzero((self._keys != self._known).any(axis=1))
+        for slot in changed:
+            slot = int(slot)
+            old_key = self._known[slot].tobytes()
+            if self._slots.get(old_key) == slot:
+                del self._slots[old_key]
+            key = np.array(self._keys[slot])
+            self._known[slot] = key
+            if key.any():
+                self._slots[key.tobytes()] = slot
+        self._size = len(self._slots)
+        self._generation = generation
+
+    def _touch(self, slot: int):
+        # Unlocked: a lost update only makes the LRU order slightly less exact
+        tick = int(self._state[1]) + 1
+        self._state[1] = tick
+        self._ticks[slot] = tick
+
+    def get_many(self, keys):
+        """Returns a list of float32 vectors (or None on a miss) and updates recency."""
+        with self._lock:
+            if self._vectors is None and not self._open_existing():
+                self.misses += len(keys)
+                return [None] * len(keys)
+            self._sync()
+
+            results = []
+            for key in keys:
+                slot = self._slots.get(key)
+                vector = None
+                if slot is not None and self._keys[slot].tobytes() == key:
+                    vector = np.array(self._vectors[slot], dtype=np.float32)
+                    # Writers clear the key before touching the vector: re-check it
+                    if self._keys[slot].tobytes() != key:
+                        vector = None
+                if vector is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self._touch(slot)
+                results.append(vector)
+            return results
+
+    def put_many(self, keys, vectors):
+        """Stores vectors and returns them as read back at the cache's precision."""
+        with self._lock, self._file_lock():
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if self._vectors is None:
+                # Another process may have created the cache since we looked
+                meta_path = os.path.join(self.path, "meta.json")
+                reuse = False
+                if os.path.exists(meta_path):
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                    reuse = (
+                        meta["max_entries"] == self.max_entries
+                        and meta["dtype"] == self.dtype.name
+                        and meta["dim"] == vectors.shape[1]
+                    )
+                self._open(vectors.shape[1], mode="r+" if reuse else "w+")
+            self._sync()
+
+            # Known keys first: refreshed ticks keep them out of the eviction below
+            pending = dict(zip(keys, vectors))
+            slots = []
+            for key in [key for key in pending if key in self._slots]:
+                slots.append(self._write_slot(self._slots[key], key, pending.pop(key)))
+            for slot, (key, vector) in zip(self._allocate_slots(len(pending)), pending.items()):
+                old_key = self._keys[slot].tobytes()
+                if self._slots.get(old_key) == slot:
+                    del self._slots[old_key]
+                self._slots[key] = slot
+                slots.append(self._write_slot(slot, key, vector))
+
+            self._known[slots] = self._keys[slots]
+            self._state[0] += 1
+            self._generation = int(self._state[0])
+            self._size = len(self._slots)
+            self._vectors.flush()
+            self._keys.flush()
+            self._ticks.flush()
+            self._state.flush()
+            return vectors.astype(self.dtype).astype(np.float32)
+
+    def _write_slot(self, slot: int, key: bytes, vector) -> int:
+        # Readers don't lock: invalidate the slot while its vector changes
+        self._keys[slot] = 0
+        self._vectors[slot] = vector
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._state[1] += 1
+        self._ticks[slot] = self._state[1]
+        return slot
+
+    def _allocate_slots(self, count: int):
+        """Empty slots first (tick 0), then the least recently used ones."""
+        if count == 0:
+            return []
+        count = min(count, self.max_entries)
+        if count == self.max_entries:
+            return list(range(count))
+        order = np.argpartition(self._ticks, count - 1)[:count]
+        return [int(slot) for slot in order]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings model so repeated texts are served from an EmbeddingCache."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _keys(self, texts):
+        return [embedding_cache_key(self.cache.model_name, text) for text in texts]
+
+    def embed_documents(self, texts):
+        keys = self._keys(texts)
+        vectors = self.cache.get_many(keys)
+
+        # Encode each distinct missing text once (boilerplate repeats within a batch too)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = self.cache.put_many(list(missing.keys()), new_vectors)
+            fresh = dict(zip(missing.keys(), new_vectors))
+            vectors = [fresh[k] if v is None else v for k, v in zip(keys, vectors)]
+
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text):
+        key = embedding_cache_key(self.cache.model_name, "query\0" + text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            vector = self.cache.put_many([key], [vector])[0]
+        return np.asarray(vector, dtype=np.float32).tolist()
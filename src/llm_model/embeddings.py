@@ -1,30 +1,85 @@
 import os
-from langchain_huggingface import HuggingFaceEmbeddings
+from src.llm_model.embedding_cache import CachedEmbeddings, EmbeddingCache
 
 # Global variable to hold the model in memory
 _embedding_model_instance = None
 
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+
+def _load_huggingface_model():
+    # Determine device (use GPU if available, else CPU)
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    model_kwargs = {"device": device}
+    encode_kwargs = {"normalize_embeddings": True}  # Essential for Cosine Similarity
+
+    model = HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        # Keep the download next to the data volume so restarts don't refetch it
+        cache_folder=os.path.join(os.getenv("MODEL_CACHE_DIR", "data/models"), "huggingface"),
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs,
+    )
+    print(f"Embedding model loaded on {device}")
+    return model
+
+
+def _load_onnx_model():
+    # No torch import: ONNX Runtime runs the exported int8 model on CPU
+    from src.llm_model.onnx_embeddings import OnnxEmbeddings
+
+    threads = int(os.getenv("EMBEDDING_THREADS", "0"))
+    model = OnnxEmbeddings(
+        os.getenv("ONNX_EMBEDDING_DIR", "data/onnx/all-mpnet-base-v2"),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        num_threads=threads or None,
+        max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "0")),
+    )
+    print(f"ONNX embedding model loaded from {model.model_path}")
+    return model
+
 
 def get_embedding_model():
+    """
+    Returns the shared embedding model. EMBEDDING_BACKEND selects it:
+    "huggingface" (torch, default), "onnx" (int8 ONNX Runtime, CPU) or
+    "hash" (deterministic offline stand-in).
+    """
     global _embedding_model_instance
 
     if _embedding_model_instance is None:
-        # Determine device (use GPU if available, else CPU)
-        import torch
-
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-
-        model_name = "sentence-transformers/all-mpnet-base-v2"
-        model_kwargs = {"device": device}
-        encode_kwargs = {
-            "normalize_embeddings": True
-        }  # Essential for Cosine Similarity
-
-        _embedding_model_instance = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs=model_kwargs,
-            encode_kwargs=encode_kwargs,
-        )
-        print(f"Embedding model loaded on {device}")
+        backend = os.getenv("EMBEDDING_BACKEND", "huggingface")
+
+        if backend == "hash":
+            # Deterministic offline stand-in for benchmarks; too cheap to be worth caching
+            from src.llm_model.hash_embeddings import HashEmbeddings
+
+            _embedding_model_instance = HashEmbeddings(size=768)
+            print("Hash embeddings initialized")
+            return _embedding_model_instance
+
+        if backend == "onnx":
+            model = _load_onnx_model()
+            # Quantized vectors differ slightly: keep them apart in the cache
+            cache_model_name = f"{MODEL_NAME}-onnx-{os.path.basename(model.model_path)}"
+        else:
+            model = _load_huggingface_model()
+            cache_model_name = MODEL_NAME
+        _embedding_model_instance = model
+
+        # Content-addressed disk cache: set EMBEDDING_CACHE_DIR="" to disable
+        cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")
+        if cache_dir:
+            cache = EmbeddingCache(
+                cache_dir,
+                model_name=cache_model_name,
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+                dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float16"),
+            )
+            _embedding_model_instance = CachedEmbeddings(model, cache)
 
     return _embedding_model_instance
@@ -0,0 +1,91 @@
+import json
+import random
+import re
+import threading
+import time
+from typing import Any
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeRateLimitError(Exception):
+    """Mimics the 429 Gemini returns when the quota is exhausted."""
+
+    code = 429
+
+
+class FakeLegalLLM(BaseChatModel):
+    """
+    Offline stand-in for Gemini, for batch runs and benchmarks.
+
+    Answers by quoting the first sentence of the retrieved context after
+    `latency` seconds. Audit reduce prompts get their findings merged, and
+    other prompts without a context section get their latest message echoed
+    back. A seeded `error_rate` fraction of calls raise
+    `FakeRateLimitError`, so retry and rate-limit handling can be exercised
+    without a network.
+    """
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+    calls: int = 0
+    errors: int = 0
+    _rng: Any = None
+    _lock: Any = None
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-legal"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeRateLimitError("429 RESOURCE_EXHAUSTED: fake quota exceeded")
+
+        prompt = "\n".join(str(message.content) for message in messages)
+        match = re.search(r"--- DOCUMENT: (.*?) ---\n([^\n]+)", prompt)
+        if "FINDINGS:" in prompt:
+            # Audit reduce steps: keep every distinct finding, as JSON when a schema is given
+            findings_text = str(messages[0].content).split("FINDINGS:", 1)[1]
+            lines = (line.strip() for line in findings_text.splitlines())
+            findings = list(dict.fromkeys(line for line in lines if line))
+            answer = "\n".join(findings)
+            if '"risk_level"' in prompt:
+                answer = json.dumps(
+                    {
+                        "answer": answer,
+                        "citations": sorted(set(re.findall(r"[\w.-]+\.pdf", answer))),
+                        "risk_level": "Medium",
+                    }
+                )
+        elif match:
+            # Skip the "[p. 3-4, Section 4.2] " locator the context packer prepends
+            body = re.sub(r"^\[p\. [^\]]*\]\s*", "", match.group(2).strip())
+            sentence = re.split(r"(?<=[.!?])\s", body)[0]
+            answer = f"According to {match.group(1)}: {sentence}"
+        elif "CONTEXT:" in prompt:
+            answer = "I apologize, but the provided documents do not contain this information."
+        else:
+            # Condensing and summarizing: echo the latest message
+            answer = str(messages[-1].content).removeprefix("Follow-up: ")
+        message = AIMessage(
+            content=answer,
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(answer) // 4,
+                "total_tokens": (len(prompt) + len(answer)) // 4,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
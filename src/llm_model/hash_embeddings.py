@@ -0,0 +1,45 @@
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.lexical_index import tokenize
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic, model-free stand-in for the sentence-transformer.
+
+    Tokens and token bigrams are hashed into `size` signed buckets and the
+    result is L2-normalized, so texts sharing words still land close
+    together. Used for offline benchmarks and tests (EMBEDDING_BACKEND=hash).
+    """
+
+    def __init__(self, size=768):
+        self.size = size
+        self._bucket_cache = {}
+
+    def _bucket(self, feature: str):
+        bucket = self._bucket_cache.get(feature)
+        if bucket is None:
+            digest = int.from_bytes(
+                hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            bucket = (digest % self.size, 1.0 if digest >> 63 else -1.0)
+            if len(self._bucket_cache) < 500_000:
+                self._bucket_cache[feature] = bucket
+        return bucket
+
+    def _embed(self, text: str):
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in features:
+            index, sign = self._bucket(feature)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
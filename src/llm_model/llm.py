@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 load_dotenv()
 
@@ -8,9 +7,25 @@ _llm_instance = None
 
 
 def get_gemini_llm(temperature=0):
+    """
+    Returns the chat model shared by every chain. LLM_BACKEND=fake swaps in
+    an offline stand-in (see `FakeLegalLLM`) for batch tests and benchmarks.
+    """
     global _llm_instance
 
     if _llm_instance is None:
+        if os.getenv("LLM_BACKEND", "gemini") == "fake":
+            from src.llm_model.fake_llm import FakeLegalLLM
+
+            _llm_instance = FakeLegalLLM(
+                latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+                error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            )
+            print("Fake LLM initialized")
+            return _llm_instance
+
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         _llm_instance = ChatGoogleGenerativeAI(
             # model="gemini-2.5-flash-lite",
             model="gemini-3-flash-preview",
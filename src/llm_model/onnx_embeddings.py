@@ -0,0 +1,287 @@
+"""
+Int8-quantized ONNX Runtime backend for all-mpnet-base-v2 (EMBEDDING_BACKEND=onnx).
+
+Export once, on a machine with torch and transformers installed:
+    python -m src.llm_model.onnx_embeddings export --output data/onnx/all-mpnet-base-v2
+
+Check accuracy drift and speed against the torch model:
+    python -m src.llm_model.onnx_embeddings check --model-dir data/onnx/all-mpnet-base-v2
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+MAX_SEQ_LENGTH = 384  # all-mpnet-base-v2's sentence-transformers limit
+
+# Used by `check` when no sample file is given
+SAMPLE_TEXTS = [
+    "The Licensee shall indemnify and hold harmless the Licensor from any third-party claim.",
+    "Either party may terminate this Agreement upon thirty (30) days written notice.",
+    "The Employee shall not compete with the Company for twelve months after termination.",
+    "The aggregate liability of the Supplier shall not exceed $500,000 in any calendar year.",
+    "All notices under Section 12.3(b) shall be delivered in writing to the registered address.",
+    "This Agreement shall be governed by the laws of the State of Delaware.",
+    "Confidential Information shall not be disclosed to any third party without prior consent.",
+    "The Tenant shall maintain general liability insurance of at least $1,000,000.",
+    "Payment is due within forty-five days of the invoice date.",
+    "The Company may assign this Agreement to an affiliate without the other party's consent.",
+    "Force majeure events excuse performance for the duration of the event.",
+    "Any dispute shall be resolved by binding arbitration in New York.",
+    "What is the notice period for termination?",
+    "Who bears liability for breach of the confidentiality clause?",
+    "Is there a non-compete clause longer than twelve months?",
+    "Which law governs the merger agreement?",
+]
+
+
+class _DynamicBatcher:
+    """
+    Coalesces concurrent single-text requests into one forward pass.
+
+    A lone request runs immediately. Requests that arrive while a pass is
+    running queue up and go through together in the next one, optionally
+    waiting up to `max_wait` seconds for more.
+    """
+
+    def __init__(self, embed_batch, max_batch=32, max_wait=0.0):
+        self.embed_batch = embed_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch:
+                try:
+                    timeout = deadline - time.monotonic()
+                    items.append(
+                        self._queue.get(timeout=timeout)
+                        if timeout > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+
+            self.batches += 1
+            self.requests += len(items)
+            try:
+                vectors = self.embed_batch([text for text, _ in items])
+                for (_, future), vector in zip(items, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an exported (optionally int8-quantized) ONNX model.
+
+    Mean pooling and L2 normalization match sentence-transformers, so the
+    vectors are drop-in compatible with the torch model's collection.
+    Documents are embedded in length-sorted batches to minimize padding;
+    queries go through a dynamic batcher shared by all threads.
+    """
+
+    def __init__(self, model_dir, batch_size=32, num_threads=None, max_wait_ms=0.0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, "model.onnx")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        # Graph optimization dominates session start-up, so the first load
+        # saves the optimized graph next to the model and later loads reuse it
+        optimized_path = model_path[: -len(".onnx")] + ".optimized.onnx"
+        session_path = model_path
+        if os.path.exists(optimized_path) and (
+            os.path.getmtime(optimized_path) >= os.path.getmtime(model_path)
+        ):
+            session_path = optimized_path
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            # Extended fusions only: unlike ORT_ENABLE_ALL, they don't tie the saved graph to this CPU
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+            if os.access(model_dir, os.W_OK):
+                options.optimized_model_filepath = optimized_path
+        self.session = ort.InferenceSession(
+            session_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_path = model_path
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        pad_token = "<pad>" if self.tokenizer.token_to_id("<pad>") is not None else "[PAD]"
+        self.tokenizer.enable_padding(
+            pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token
+        )
+
+        self.batch_size = batch_size
+        self._batcher = _DynamicBatcher(
+            self._embed_batch, max_batch=batch_size, max_wait=max_wait_ms / 1000
+        )
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        # Mean pooling over real tokens, then L2 normalization
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.tolist()
+
+    def embed_documents(self, texts):
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self._batcher.submit(text)
+
+
+def export_onnx_model(output_dir, model_name=MODEL_NAME, quantize=True):
+    """Exports the Hugging Face model to ONNX and quantizes its weights to int8."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["An example clause."], return_tensors="pt")
+
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=17,
+        )
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+
+    if quantize:
+        quantize_dynamic(
+            fp32_path,
+            os.path.join(output_dir, "model.int8.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+    print(f"Exported {model_name} to {output_dir}")
+
+
+def compare_embeddings(candidate, reference, texts, repeats=3):
+    """
+    Accuracy drift and throughput of `candidate` against `reference`.
+
+    Reports the mean and minimum cosine between both models' vectors, how
+    often each text's nearest neighbour is the same under both, and
+    texts/sec for each model.
+    """
+
+    def timed(model):
+        model.embed_documents(texts[:4])  # Warm up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+        return vectors, len(texts) * repeats / (time.perf_counter() - start)
+
+    ours, ours_rate = timed(candidate)
+    theirs, theirs_rate = timed(reference)
+    cosines = (ours * theirs).sum(axis=1)
+
+    def neighbours(vectors):
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, -np.inf)
+        return similarity.argmax(axis=1)
+
+    return {
+        "texts": len(texts),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "min_cosine": round(float(cosines.min()), 5),
+        "neighbour_agreement": round(float((neighbours(ours) == neighbours(theirs)).mean()), 3),
+        "candidate_texts_per_sec": round(ours_rate, 1),
+        "reference_texts_per_sec": round(theirs_rate, 1),
+        "speedup": round(ours_rate / theirs_rate, 2),
+    }
+
+
+def main(argv=None):
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="export and quantize the model")
+    export.add_argument("--output", default="data/onnx/all-mpnet-base-v2")
+    export.add_argument("--no-quantize", action="store_true")
+    check = commands.add_parser("check", help="compare against the torch model")
+    check.add_argument("--model-dir", default="data/onnx/all-mpnet-base-v2")
+    check.add_argument("--texts", help="file with one sample text per line")
+    check.add_argument("--threads", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_onnx_model(args.output, quantize=not args.no_quantize)
+        return
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    texts = SAMPLE_TEXTS
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    reference = HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True},
+    )
+    candidate = OnnxEmbeddings(args.model_dir, num_threads=args.threads)
+    print(json.dumps(compare_embeddings(candidate, reference, texts), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import re
+
+# Each client matter is its own collection, so a query only searches the selected
+# matters' graphs and a closed matter is dropped in one call
+COLLECTION_NAME = "legal-rag"
+DEFAULT_MATTER = "default"
+MATTER_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,47}$")
+
+
+def normalize_matter(name: str) -> str:
+    """Turns a matter name like "Acme v. Smith" into its ID ("acme-v-smith")."""
+    matter = re.sub(r"[^a-z0-9_]+", "-", (name or "").strip().lower()).strip("-")[:48]
+    if not MATTER_PATTERN.match(matter):
+        raise ValueError(f"Invalid matter name: {name!r}")
+    return matter
+
+
+def matter_collection(matter=None) -> str:
+    """Collection holding a matter; the default matter keeps the original "legal-rag"."""
+    matter = normalize_matter(matter or DEFAULT_MATTER)
+    return COLLECTION_NAME if matter == DEFAULT_MATTER else f"{COLLECTION_NAME}-{matter}"
+
+
+def collection_matter(collection_name: str):
+    """The matter stored in a collection, or None for unrelated collections."""
+    if collection_name == COLLECTION_NAME:
+        return DEFAULT_MATTER
+    if collection_name.startswith(f"{COLLECTION_NAME}-"):
+        return collection_name[len(COLLECTION_NAME) + 1 :]
+    return None
@@ -0,0 +1,658 @@
+"""
+Embedded vector store for single-node and air-gapped deployments (VECTOR_BACKEND=mmap).
+
+`MmapVectorClient` implements the part of the `QdrantClient` API this app
+uses, so `QdrantVectorStore`, the retriever and the indexing code run on it
+unchanged. Vectors live in memory-mapped int8 (or float16) matrices, with
+the float32 originals kept on disk for rescoring; payloads live in SQLite.
+"""
+
+import copy
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+from qdrant_client import models
+from qdrant_client.http.models import QueryResponse
+
+SCAN_BLOCK_ROWS = 512  # Rows dequantized at a time while scoring; small enough to stay in cache
+
+
+def _point_id(point_id):
+    """Qdrant's canonical form: UUIDs as hyphenated strings, ints as ints."""
+    if isinstance(point_id, int):
+        return point_id
+    return str(uuid.UUID(str(point_id)))
+
+
+def _payload_value(payload, key):
+    value = payload
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _as_list(conditions):
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+
+def _to_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _in_range(value, condition_range):
+    if value is None:
+        return False
+    if isinstance(condition_range, models.DatetimeRange):
+        value = _to_datetime(value)
+        if value is None:
+            return False
+        bounds = [_to_datetime(b) for b in (condition_range.gt, condition_range.gte,
+                                             condition_range.lt, condition_range.lte)]
+        # Naive payload dates compare against naive bounds
+        bounds = [b.replace(tzinfo=None) if b is not None else None for b in bounds]
+        value = value.replace(tzinfo=None)
+    else:
+        bounds = [condition_range.gt, condition_range.gte, condition_range.lt, condition_range.lte]
+    gt, gte, lt, lte = bounds
+    return (
+        (gt is None or value > gt)
+        and (gte is None or value >= gte)
+        and (lt is None or value < lt)
+        and (lte is None or value <= lte)
+    )
+
+
+def quantize(vectors, dtype):
+    """
+    Returns (stored matrix, per-row scale). int8 uses symmetric per-vector
+    scaling, so a score is `scale * (row @ query)`; float16 needs no scale.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == np.int8:
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        stored = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return stored, scales.astype(np.float32)
+    return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+
+
+class _Collection:
+    """One collection: memory-mapped vector matrices plus a SQLite payload table."""
+
+    def __init__(self, path, dim=None, dtype="int8", rescore=True):
+        self.path = path
+        self._lock = threading.RLock()
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta = {"dim": dim, "dtype": dtype, "rescore": rescore, "capacity": 0}
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.rescore = meta["rescore"]
+        self.capacity = 0
+        self._write_meta(meta["capacity"])
+        self._open(meta["capacity"])
+
+        self._db = sqlite3.connect(os.path.join(path, "payloads.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points "
+            "(id TEXT PRIMARY KEY, row INTEGER NOT NULL, payload TEXT NOT NULL, content TEXT)"
+        )
+        self._db.commit()
+
+        # Everything but page_content stays in memory for filtering
+        self._ids, self._payloads, self._rows = [], [], {}
+        for point_id, row, payload in self._db.execute("SELECT id, row, payload FROM points"):
+            point_id = int(point_id) if point_id.isdigit() else point_id
+            self._grow_lists(row + 1)
+            self._ids[row] = point_id
+            self._payloads[row] = json.loads(payload)
+            self._rows[point_id] = row
+        self._free = [row for row, point_id in enumerate(self._ids) if point_id is None]
+        self._live = np.array([point_id is not None for point_id in self._ids], dtype=bool)
+        self._columns = {}
+
+    # --- storage ---
+
+    def _write_meta(self, capacity):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(
+                {"dim": self.dim, "dtype": self.dtype.name, "rescore": self.rescore,
+                 "capacity": capacity},
+                f,
+            )
+
+    def _memmap(self, name, dtype, shape, capacity):
+        file_path = os.path.join(self.path, name)
+        size = capacity * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        with open(file_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)  # Grows the file with zeros
+        if capacity == 0:
+            return np.zeros((0, *shape), dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=(capacity, *shape))
+
+    def _open(self, capacity):
+        self.vectors = self._memmap(f"vectors.{self.dtype.name}.bin", self.dtype, (self.dim,), capacity)
+        self.scales = self._memmap("scales.bin", np.float32, (), capacity)
+        # Full-precision originals: only the rows being rescored are ever paged in
+        self.originals = (
+            self._memmap("vectors.float32.bin", np.float32, (self.dim,), capacity)
+            if self.rescore
+            else None
+        )
+        self.capacity = capacity
+
+    def _ensure_capacity(self, rows):
+        if rows > self.capacity:
+            capacity = max(rows, self.capacity * 2, 1024)
+            self._open(capacity)
+            self._write_meta(capacity)
+
+    def _grow_lists(self, rows):
+        while len(self._ids) < rows:
+            self._ids.append(None)
+            self._payloads.append(None)
+
+    def flush(self):
+        for matrix in (self.vectors, self.scales, self.originals):
+            if isinstance(matrix, np.memmap):
+                matrix.flush()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+    # --- writes ---
+
+    def upsert(self, points):
+        if not points:
+            return
+        ids = [_point_id(p.id) for p in points]
+        vectors = []
+        for p in points:
+            vector = p.vector
+            if isinstance(vector, dict):  # Named vectors; this app uses the unnamed one
+                vector = vector.get("") if "" in vector else next(iter(vector.values()))
+            vectors.append(vector)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+        # Cosine distance: normalize once at write time, like Qdrant
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        stored, scales = quantize(vectors, self.dtype)
+
+        with self._lock:
+            rows = []
+            for point_id in ids:
+                row = self._rows.get(point_id)
+                if row is None:
+                    row = self._free.pop() if self._free else len(self._ids)
+                    self._grow_lists(row + 1)
+                    self._rows[point_id] = row
+                rows.append(row)
+            self._ensure_capacity(len(self._ids))
+
+            rows_array = np.asarray(rows)
+            self.vectors[rows_array] = stored
+            self.scales[rows_array] = scales
+            if self.originals is not None:
+                self.originals[rows_array] = vectors
+            self.flush()
+
+            records = []
+            for point, point_id, row in zip(points, ids, rows):
+                payload = dict(point.payload or {})
+                content = payload.pop("page_content", None)
+                self._ids[row] = point_id
+                self._payloads[row] = payload
+                records.append((str(point_id), row, json.dumps(payload), content))
+            self._db.executemany("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)", records)
+            self._db.commit()
+            self._sync_live()
+
+    def delete(self, ids):
+        with self._lock:
+            deleted = []
+            for point_id in ids:
+                row = self._rows.pop(_point_id(point_id), None)
+                if row is not None:
+                    self._ids[row] = self._payloads[row] = None
+                    self._free.append(row)
+                    deleted.append((str(_point_id(point_id)),))
+            self._db.executemany("DELETE FROM points WHERE id = ?", deleted)
+            self._db.commit()
+            self._sync_live()
+
+    def set_payload(self, ids, payload, key=None):
+        with self._lock:
+            records = []
+            for point_id in ids:
+                row = self._rows.get(_point_id(point_id))
+                if row is None:
+                    continue
+                updates = dict(payload)
+                content = updates.pop("page_content", None)
+                target = self._payloads[row]
+                if key:
+                    target = target.setdefault(key, {})
+                target.update(updates)
+                records.append((json.dumps(self._payloads[row]), str(self._ids[row])))
+                if content is not None and not key:
+                    self._db.execute(
+                        "UPDATE points SET content = ? WHERE id = ?", (content, str(self._ids[row]))
+                    )
+            self._db.executemany("UPDATE points SET payload = ? WHERE id = ?", records)
+            self._db.commit()
+            self._columns = {}
+
+    def _sync_live(self):
+        self._live = np.array([point_id is not None for point_id in self._ids], dtype=bool)
+        self._columns = {}
+
+    # --- reads ---
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _column(self, key):
+        """Payload values at `key` for every row, as an object array (cached until the next write)."""
+        column = self._columns.get(key)
+        if column is None:
+            column = np.empty(len(self._payloads), dtype=object)
+            column[:] = [
+                _payload_value(payload, key) if payload is not None else None
+                for payload in self._payloads
+            ]
+            self._columns[key] = column
+        return column
+
+    def _condition_mask(self, condition):
+        if isinstance(condition, models.Filter):
+            return self.filter_mask(condition)
+        if isinstance(condition, models.HasIdCondition):
+            mask = np.zeros(len(self._ids), dtype=bool)
+            rows = [self._rows.get(_point_id(i)) for i in condition.has_id]
+            mask[[row for row in rows if row is not None]] = True
+            return mask
+        if isinstance(condition, models.FieldCondition):
+            column = self._column(condition.key)
+            match = condition.match
+            if isinstance(match, models.MatchValue):
+                return column == match.value
+            if isinstance(match, models.MatchAny):
+                allowed = set(match.any)
+                return np.array([value in allowed for value in column], dtype=bool)
+            if isinstance(match, models.MatchExcept):
+                excluded = set(match.except_)
+                return np.array(
+                    [value is not None and value not in excluded for value in column], dtype=bool
+                )
+            if condition.range is not None:
+                return np.array([_in_range(value, condition.range) for value in column], dtype=bool)
+        raise ValueError(
+            f"The mmap store can't filter on {type(condition).__name__} conditions: {condition!r}"
+        )
+
+    def filter_mask(self, query_filter):
+        """Boolean row mask of live points matching a Qdrant `Filter`."""
+        mask = self._live.copy()
+        if query_filter is None:
+            return mask
+        for condition in _as_list(query_filter.must):
+            mask &= self._condition_mask(condition)
+        should = _as_list(query_filter.should)
+        if should:
+            any_mask = np.zeros_like(mask)
+            for condition in should:
+                any_mask |= self._condition_mask(condition)
+            mask &= any_mask
+        for condition in _as_list(query_filter.must_not):
+            mask &= ~self._condition_mask(condition)
+        return mask
+
+    def search(self, query, query_filter=None, limit=10, offset=0, score_threshold=None,
+               rescore_factor=4):
+        """Top-k (row, cosine score) by a blocked NumPy scan, optionally rescored in float32."""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            mask = self.filter_mask(query_filter)
+            vectors, scales, originals = self.vectors, self.scales, self.originals
+
+        rows = len(mask)
+        wanted = (offset or 0) + limit
+        if rows == 0 or wanted <= 0:
+            return []
+        scores = np.empty(rows, dtype=np.float32)
+        buffer = np.empty((min(SCAN_BLOCK_ROWS, rows), self.dim), dtype=np.float32)
+        for start in range(0, rows, SCAN_BLOCK_ROWS):
+            block = vectors[start : min(start + SCAN_BLOCK_ROWS, rows)]
+            np.copyto(buffer[: len(block)], block)
+            scores[start : start + len(block)] = buffer[: len(block)] @ query
+        if self.dtype == np.int8:
+            scores *= scales[:rows]
+        scores[~mask] = -np.inf
+
+        candidates = int(mask.sum())
+        if candidates == 0:
+            return []
+        pool = min(candidates, wanted * rescore_factor if originals is not None else wanted)
+        top = np.argpartition(-scores, pool - 1)[:pool] if pool < rows else np.arange(rows)
+        top = top[np.isfinite(scores[top])]
+        if originals is not None:
+            # Exact scores for the shortlist; the quantized scan only has to get it into the pool
+            order = np.sort(top)
+            scores[order] = originals[order] @ query
+        top = top[np.argsort(-scores[top], kind="stable")][offset or 0 : wanted]
+        return [
+            (int(row), float(scores[row]))
+            for row in top
+            if score_threshold is None or scores[row] >= score_threshold
+        ]
+
+    def records(self, rows, with_payload=True, with_vectors=False):
+        """
+        (row, id, payload, vector) for the live rows among `rows`; page_content
+        is read from SQLite on demand.
+        """
+        with self._lock:
+            rows = [row for row in rows if self._ids[row] is not None]
+            ids = [self._ids[row] for row in rows]
+            payloads = [copy.deepcopy(self._payloads[row]) for row in rows]
+            contents = {}
+            wants_content = with_payload is True or (
+                isinstance(with_payload, list) and "page_content" in with_payload
+            )
+            if wants_content and ids:
+                keys = [str(point_id) for point_id in ids]
+                for start in range(0, len(keys), 500):
+                    batch = keys[start : start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    contents.update(
+                        self._db.execute(
+                            f"SELECT id, content FROM points WHERE id IN ({placeholders})", batch
+                        )
+                    )
+            vectors = None
+            if with_vectors:
+                if self.originals is not None:
+                    vectors = np.asarray(self.originals[rows]).tolist()
+                else:
+                    vectors = (
+                        self.vectors[rows].astype(np.float32) * self.scales[rows][:, None]
+                    ).tolist()
+
+        results = []
+        for i, (row, point_id, payload) in enumerate(zip(rows, ids, payloads)):
+            content = contents.get(str(point_id))
+            if content is not None:
+                payload["page_content"] = content
+            if with_payload is False:
+                payload = None
+            elif isinstance(with_payload, list):
+                payload = {key: payload[key] for key in with_payload if key in payload}
+            results.append((row, point_id, payload, vectors[i] if vectors is not None else None))
+        return results
+
+    def rows_for(self, ids):
+        with self._lock:
+            rows = [self._rows.get(_point_id(point_id)) for point_id in ids]
+        return [row for row in rows if row is not None]
+
+    def ids_matching(self, query_filter):
+        with self._lock:
+            return [self._ids[row] for row in np.flatnonzero(self.filter_mask(query_filter))]
+
+
+class MmapVectorClient:
+    """
+    Embedded stand-in for `QdrantClient`: one directory per collection under `path`.
+
+    Compared with float32 vectors in a server, int8 storage cuts resident
+    vector memory about 4x (float16: 2x) and queries skip the network hop.
+    Only cosine distance and single unnamed vectors are supported, and only
+    one process can open a store directory at a time. Filters combine
+    must/should/must_not over match value/any/except, range, datetime range
+    and has-id conditions; any other condition raises ValueError.
+    """
+
+    def __init__(self, path="data/vectors", dtype="int8", rescore=True):
+        if np.dtype(dtype) not in (np.int8, np.float16):
+            raise ValueError("dtype must be int8 or float16")
+        self.path = path
+        self.dtype = np.dtype(dtype).name
+        self.rescore = rescore
+        self._collections = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        # Rows are allocated from in-memory state, so one process owns the store
+        # at a time (as with Qdrant local mode); the lock goes with the process
+        self._owner_fd = os.open(os.path.join(path, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._owner_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._owner_fd)
+            raise RuntimeError(
+                f"The vector store in {path} is open in another process; stop the "
+                "app (or the other job) first, or run against a Qdrant server"
+            ) from None
+
+    def _collection(self, collection_name) -> _Collection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                if not self.collection_exists(collection_name):
+                    raise ValueError(f"Collection {collection_name} not found")
+                collection = _Collection(os.path.join(self.path, collection_name))
+                self._collections[collection_name] = collection
+            return collection
+
+    # --- collections ---
+
+    def collection_exists(self, collection_name) -> bool:
+        return os.path.exists(os.path.join(self.path, collection_name, "meta.json"))
+
+    def create_collection(self, collection_name, vectors_config, **kwargs):
+        if isinstance(vectors_config, dict):
+            vectors_config = vectors_config.get("") or next(iter(vectors_config.values()))
+        if vectors_config.distance != models.Distance.COSINE:
+            raise ValueError("The mmap store only supports cosine distance")
+        with self._lock:
+            self._collections[collection_name] = _Collection(
+                os.path.join(self.path, collection_name),
+                dim=vectors_config.size,
+                dtype=self.dtype,
+                rescore=self.rescore,
+            )
+        return True
+
+    def get_collection(self, collection_name):
+        """The fields callers read from Qdrant's `CollectionInfo`."""
+        collection = self._collection(collection_name)
+        params = models.VectorParams(size=collection.dim, distance=models.Distance.COSINE)
+        return SimpleNamespace(
+            config=SimpleNamespace(params=SimpleNamespace(vectors=params)),
+            points_count=len(collection),
+            payload_schema={},
+        )
+
+    def get_collections(self):
+        names = sorted(name for name in os.listdir(self.path) if self.collection_exists(name))
+        return models.CollectionsResponse(
+            collections=[models.CollectionDescription(name=name) for name in names]
+        )
+
+    def create_snapshot(self, collection_name, **kwargs):
+        """Archives the collection's directory as a tar under `<path>/snapshots`."""
+        import tarfile
+
+        collection = self._collection(collection_name)
+        created = datetime.now()
+        name = f"{collection_name}-{created.strftime('%Y-%m-%d-%H-%M-%S')}.snapshot"
+        directory = os.path.join(self.path, "snapshots", collection_name)
+        os.makedirs(directory, exist_ok=True)
+        with collection._lock:
+            collection.flush()
+            collection._db.commit()
+            with tarfile.open(os.path.join(directory, name), "w") as tar:
+                tar.add(collection.path, arcname=collection_name)
+        return models.SnapshotDescription(
+            name=name,
+            creation_time=created.isoformat(timespec="seconds"),
+            size=os.path.getsize(os.path.join(directory, name)),
+        )
+
+    def create_payload_index(self, *args, **kwargs):
+        """Filters are evaluated over in-memory payload columns; nothing to index."""
+
+    def delete_collection(self, collection_name, **kwargs):
+        import shutil
+
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+        shutil.rmtree(os.path.join(self.path, collection_name), ignore_errors=True)
+        return True
+
+    def close(self, **kwargs):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+            if self._owner_fd is not None:
+                os.close(self._owner_fd)
+                self._owner_fd = None
+
+    # --- points ---
+
+    def upsert(self, collection_name, points, wait=True, **kwargs):
+        if isinstance(points, models.Batch):
+            points = [
+                models.PointStruct(id=i, vector=v, payload=p)
+                for i, v, p in zip(points.ids, points.vectors, points.payloads or [None] * len(points.ids))
+            ]
+        self._collection(collection_name).upsert(list(points))
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def delete(self, collection_name, points_selector, wait=True, **kwargs):
+        collection = self._collection(collection_name)
+        if isinstance(points_selector, models.PointIdsList):
+            ids = points_selector.points
+        elif isinstance(points_selector, models.FilterSelector):
+            ids = collection.ids_matching(points_selector.filter)
+        elif isinstance(points_selector, models.Filter):
+            ids = collection.ids_matching(points_selector)
+        else:
+            ids = list(points_selector)
+        collection.delete(ids)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def set_payload(self, collection_name, payload, points=None, key=None, **kwargs):
+        collection = self._collection(collection_name)
+        if isinstance(points, models.Filter):
+            points = collection.ids_matching(points)
+        collection.set_payload(points or [], payload, key=key)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def batch_update_points(self, collection_name, update_operations, **kwargs):
+        results = []
+        for operation in update_operations:
+            if isinstance(operation, models.SetPayloadOperation):
+                op = operation.set_payload
+                points = op.points if op.points is not None else op.filter
+                results.append(self.set_payload(collection_name, op.payload, points, key=op.key))
+            elif isinstance(operation, models.UpsertOperation):
+                results.append(self.upsert(collection_name, operation.upsert.points))
+            elif isinstance(operation, models.DeleteOperation):
+                results.append(self.delete(collection_name, operation.delete))
+            else:
+                raise TypeError(
+                    f"The mmap store doesn't support {type(operation).__name__} updates"
+                )
+        return results
+
+    def retrieve(self, collection_name, ids, with_payload=True, with_vectors=False, **kwargs):
+        collection = self._collection(collection_name)
+        return [
+            models.Record(id=point_id, payload=payload, vector=vector)
+            for _, point_id, payload, vector in collection.records(
+                collection.rows_for(ids), with_payload, with_vectors
+            )
+        ]
+
+    def scroll(self, collection_name, scroll_filter=None, limit=10, offset=None,
+               with_payload=True, with_vectors=False, **kwargs):
+        """Pages through matching points in storage order; the offset is opaque to callers."""
+        collection = self._collection(collection_name)
+        with collection._lock:
+            rows = np.flatnonzero(collection.filter_mask(scroll_filter))
+        rows = rows[rows >= (offset or 0)]
+        page, rest = rows[:limit], rows[limit:]
+        records = [
+            models.Record(id=point_id, payload=payload, vector=vector)
+            for _, point_id, payload, vector in collection.records(
+                page.tolist(), with_payload, with_vectors
+            )
+        ]
+        return records, (int(rest[0]) if len(rest) else None)
+
+    def count(self, collection_name, count_filter=None, exact=True, **kwargs):
+        collection = self._collection(collection_name)
+        with collection._lock:
+            return models.CountResult(count=int(collection.filter_mask(count_filter).sum()))
+
+    def facet(self, collection_name, key, facet_filter=None, limit=10, **kwargs):
+        collection = self._collection(collection_name)
+        with collection._lock:
+            mask = collection.filter_mask(facet_filter)
+            values = collection._column(key)[mask]
+        counts = {}
+        for value in values:
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+        hits = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+        return models.FacetResponse(
+            hits=[models.FacetValueHit(value=value, count=count) for value, count in hits]
+        )
+
+    def query_points(self, collection_name, query, query_filter=None, limit=10, offset=None,
+                     with_payload=True, with_vectors=False, score_threshold=None, **kwargs):
+        collection = self._collection(collection_name)
+        if isinstance(query, models.NearestQuery):
+            query = query.nearest
+        hits = collection.search(
+            query, query_filter, limit=limit, offset=offset or 0, score_threshold=score_threshold
+        )
+        scores = dict(hits)
+        return QueryResponse(
+            points=[
+                models.ScoredPoint(
+                    id=point_id, version=0, score=scores[row], payload=payload, vector=vector
+                )
+                for row, point_id, payload, vector in collection.records(
+                    [row for row, _ in hits], with_payload, with_vectors
+                )
+            ]
+        )
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+_page_store_instance = None
+
+# Pages per query when streaming a document back, and per write while recording one
+READ_BATCH_PAGES = 64
+
+
+class PageStore:
+    """
+    Extracted page texts, zlib-compressed and keyed by the PDF's SHA-256.
+
+    Pages are written once, while a file is first extracted (`record`), and
+    read back in order (`iter_pages`) or one at a time (`get_page`), so
+    re-chunking never has to parse the PDF again. A document only counts as
+    stored once all its pages are written.
+    """
+
+    def __init__(self, path="data/page_store.sqlite", level=6):
+        self.path = path
+        self.level = level
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "digest TEXT NOT NULL, page INTEGER NOT NULL, text BLOB NOT NULL, "
+            "PRIMARY KEY (digest, page)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "digest TEXT PRIMARY KEY, pages INTEGER NOT NULL, chars INTEGER NOT NULL, "
+            "stored_bytes INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def __contains__(self, digest):
+        return self.page_count(digest) is not None
+
+    def page_count(self, digest):
+        """Number of pages of a stored document, or None if it isn't (fully) stored."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pages FROM documents WHERE digest = ?", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_page(self, digest, page: int) -> str:
+        """Text of one page (numbered from 1, like chunk page ranges)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text FROM pages WHERE digest = ? AND page = ?", (digest, page)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No page {page} stored for {digest}")
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def iter_pages(self, digest):
+        """Yields a stored document's page texts in order, a batch of pages per query."""
+        pages = self.page_count(digest)
+        if pages is None:
+            raise KeyError(f"No pages stored for {digest}")
+        for start in range(1, pages + 1, READ_BATCH_PAGES):
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT text FROM pages WHERE digest = ? AND page >= ? AND page < ? "
+                    "ORDER BY page",
+                    (digest, start, start + READ_BATCH_PAGES),
+                ).fetchall()
+            for (blob,) in rows:
+                yield zlib.decompress(blob).decode("utf-8")
+
+    def record(self, digest, page_texts):
+        """
+        Passes `page_texts` through while storing them. The document is marked
+        stored only after the last page, so an interrupted extraction is redone.
+        """
+        pending = []
+        pages = chars = stored_bytes = 0
+        for page, text in enumerate(page_texts, start=1):
+            blob = zlib.compress(text.encode("utf-8"), self.level)
+            pending.append((digest, page, blob))
+            pages, chars, stored_bytes = page, chars + len(text), stored_bytes + len(blob)
+            if len(pending) >= READ_BATCH_PAGES:
+                self._write_pages(pending)
+                pending = []
+            yield text
+
+        self._write_pages(pending)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (digest, pages, chars, stored_bytes, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (digest, pages, chars, stored_bytes, time.time()),
+            )
+            self._db.commit()
+
+    def _write_pages(self, rows):
+        # Short transactions: no lock is held while the caller works on a page
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pages (digest, page, text) VALUES (?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents, pages, chars, stored_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(pages), 0), COALESCE(SUM(chars), 0), "
+                "COALESCE(SUM(stored_bytes), 0) FROM documents"
+            ).fetchone()
+        return {
+            "documents": documents,
+            "pages": pages,
+            "chars": chars,
+            "stored_bytes": stored_bytes,
+        }
+
+
+def get_page_store():
+    """
+    Returns the shared page store (PAGE_STORE_PATH), or None when
+    PAGE_STORE_PATH="" disables it.
+    """
+    global _page_store_instance
+
+    path = os.getenv("PAGE_STORE_PATH", "data/page_store.sqlite")
+    if not path:
+        return None
+    if _page_store_instance is None:
+        _page_store_instance = PageStore(path)
+
+    return _page_store_instance
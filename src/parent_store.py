@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+from langchain_core.documents import Document
+
+_parent_store_instances = {}
+
+
+class ParentStore:
+    """
+    Parent chunks of small-to-big collections, keyed by point-style ID.
+
+    Only the small child passages are embedded and stored as points; each
+    carries the `parent_id` of the full chunk kept here, which the retriever
+    swaps in after reranking (see `expand_to_parents`).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS parents ("
+            "id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+    def put_many(self, parents):
+        """Stores (parent id, Document) pairs, replacing earlier versions."""
+        rows = [
+            (str(parent_id), doc.page_content, json.dumps(doc.metadata))
+            for parent_id, doc in parents
+        ]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO parents VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def get_many(self, ids) -> dict:
+        """Parent Documents by ID; unknown IDs are left out."""
+        ids = [str(parent_id) for parent_id in ids]
+        if not ids:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, page_content, metadata FROM parents "
+                f"WHERE id IN ({', '.join('?' * len(ids))})",
+                ids,
+            ).fetchall()
+        return {
+            parent_id: Document(page_content=page_content, metadata=json.loads(metadata))
+            for parent_id, page_content, metadata in rows
+        }
+
+    def delete(self, ids):
+        ids = [(str(parent_id),) for parent_id in ids]
+        if ids:
+            with self._lock:
+                self._db.executemany("DELETE FROM parents WHERE id = ?", ids)
+                self._db.commit()
+
+    def backup(self, path):
+        """Copies the store to `path` (consistent even while it is being written)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        target = sqlite3.connect(path)
+        with self._lock:
+            self._db.backup(target)
+        target.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def expand_to_parents(docs, limit=None, collection_name=None):
+    """
+    Replaces child passages by their parent chunks, in the children's order.
+
+    A parent appears once, where its best child ranked, with that child's
+    `relevance_score`; docs without a `parent_id` are kept as they are.
+    With `limit`, stops after that many distinct results.
+    """
+    keys, firsts = [], {}
+    for doc in docs:
+        parent_id = doc.metadata.get("parent_id")
+        collection = doc.metadata.get("_collection_name", collection_name)
+        key = (collection, parent_id) if parent_id is not None else id(doc)
+        if key not in firsts:
+            if limit is not None and len(keys) >= limit:
+                break
+            firsts[key] = doc
+            keys.append(key)
+
+    wanted = {}
+    for key in keys:
+        if isinstance(key, tuple):
+            wanted.setdefault(key[0], []).append(key[1])
+    parents = {}
+    for collection, parent_ids in wanted.items():
+        for parent_id, parent in get_parent_store(collection).get_many(parent_ids).items():
+            parents[(collection, parent_id)] = parent
+
+    expanded = []
+    for key in keys:
+        child = firsts[key]
+        parent = parents.get(key)
+        if parent is None:
+            # Not a child, or its parent is missing: the passage is still evidence
+            expanded.append(child)
+            continue
+        metadata = dict(parent.metadata, _id=key[1], _collection_name=key[0])
+        if "relevance_score" in child.metadata:
+            metadata["relevance_score"] = child.metadata["relevance_score"]
+        expanded.append(Document(page_content=parent.page_content, metadata=metadata))
+    return expanded
+
+
+def _store_path(collection_name: str) -> str:
+    base_dir = os.getenv("PARENT_STORE_DIR", "data/parent_store")
+    return os.path.join(base_dir, f"{collection_name}.sqlite")
+
+
+def get_parent_store(collection_name="legal-rag"):
+    """Returns the parent chunk store for a collection."""
+    if collection_name not in _parent_store_instances:
+        _parent_store_instances[collection_name] = ParentStore(_store_path(collection_name))
+
+    return _parent_store_instances[collection_name]
+
+
+def archive_parent_store(collection_name: str, snapshot_name: str):
+    """Keeps a copy of a collection's parents next to its snapshot (PARENT_STORE_DIR/archive)."""
+    if not os.path.exists(_store_path(collection_name)):
+        return
+    base_dir = os.getenv("PARENT_STORE_DIR", "data/parent_store")
+    get_parent_store(collection_name).backup(
+        os.path.join(base_dir, "archive", collection_name, f"{snapshot_name}.sqlite")
+    )
+
+
+def drop_parent_store(collection_name: str):
+    """Forgets a deleted collection's parents and removes their file."""
+    store = _parent_store_instances.pop(collection_name, None)
+    if store is not None:
+        store.close()
+    path = _store_path(collection_name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
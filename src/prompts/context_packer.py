@@ -0,0 +1,150 @@
+from src.ingestion import context_prefix
+from src.utils.metrics import span
+from src.utils.rate_limit import estimate_tokens
+
+
+def _chunk_text(doc) -> str:
+    """Chunk text without the "Doc: … | Company: …" prefix baked in at ingestion."""
+    meta = doc.metadata
+    if "doc_title" in meta and "company" in meta:
+        prefix = context_prefix(meta)
+        if doc.page_content.startswith(prefix):
+            return doc.page_content[len(prefix) :]
+    return doc.page_content
+
+
+def _stitch(left: str, right: str) -> str:
+    """
+    Joins two consecutive chunks of one file, dropping the text they share.
+
+    The splitter cuts at spaces, so a genuine overlap is whole words: the
+    shared text must start after a space in `left` and end before a space
+    (or the end) in `right`. Without one, the chunks simply abut.
+    """
+    for size in range(min(len(left), len(right)), 0, -1):
+        if (
+            left.endswith(right[:size])
+            and (size == len(left) or left[-size - 1] == " ")
+            and (size == len(right) or right[size] == " ")
+        ):
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def _build_spans(docs):
+    """Groups docs into contiguous per-file spans, best relevance first."""
+    entries = {}
+    for rank, doc in enumerate(docs):
+        meta = doc.metadata
+        score = meta.get("relevance_score")
+        score = float(score) if score is not None else -float(rank)
+        index = meta.get("chunk_index")
+        # Without a chunk index (legacy points) a chunk is its own span
+        key = (str(meta.get("source_filename")), index if index is not None else -1 - rank)
+        if key not in entries or score > entries[key][2]:
+            entries[key] = (index, doc, score)
+
+    spans = []
+    for (filename, _), (index, doc, score) in sorted(entries.items()):
+        text = _chunk_text(doc)
+        last = spans[-1] if spans else None
+        if (
+            last is not None
+            and index is not None
+            and last["filename"] == filename
+            and last["last_index"] == index - 1
+        ):
+            last["text"] = _stitch(last["text"], text)
+            last["last_index"] = index
+            last["page_end"] = doc.metadata.get("page_end", last["page_end"])
+            last["score"] = max(last["score"], score)
+        else:
+            spans.append(
+                {
+                    "filename": filename,
+                    "meta": doc.metadata,
+                    "first_index": index if index is not None else -1,
+                    "last_index": index,
+                    "text": text,
+                    "score": score,
+                    "page_start": doc.metadata.get("page_start"),
+                    "page_end": doc.metadata.get("page_end"),
+                    "section": doc.metadata.get("section") or "",
+                }
+            )
+    return sorted(spans, key=lambda s: s["score"], reverse=True)
+
+
+def _locator(span_) -> str:
+    """Where a span sits in its file, for page-aware chunks: "[p. 3-4, Section 4.2] "."""
+    if span_.get("page_start") is None:
+        return ""
+    pages = f"p. {span_['page_start']}"
+    if span_.get("page_end") not in (None, span_["page_start"]):
+        pages += f"-{span_['page_end']}"
+    section = f", {span_['section']}" if span_.get("section") else ""
+    return f"[{pages}{section}] "
+
+
+def _header(meta) -> str:
+    header = f"--- DOCUMENT: {meta.get('source_filename', 'N/A')}"
+    if "doc_title" in meta and "company" in meta:
+        header += f" | Doc: {meta['doc_title']} | Company: {meta['company']}"
+    return header + " ---"
+
+
+def pack_context(docs, token_budget=3000):
+    """
+    Builds the prompt context from reranked docs within `token_budget` tokens.
+
+    Consecutive and overlapping chunks of a file are stitched back into one
+    span, each file gets a single header instead of a prefix per chunk, and
+    spans are admitted in relevance order until the budget is spent. Returns
+    (context text, stats), where stats compare against the naive layout.
+    """
+    with span("chain.pack_context") as s:
+        s.items = len(docs)
+        spans = _build_spans(docs)
+
+        chosen = {}  # filename -> spans, in order of the file's best span
+        used = 0
+        dropped = 0
+        for candidate in spans:
+            filename = candidate["filename"]
+            cost = estimate_tokens(_locator(candidate) + candidate["text"])
+            if filename not in chosen:
+                cost += estimate_tokens(_header(candidate["meta"]))
+            if used + cost > token_budget:
+                if chosen:
+                    dropped += 1
+                    continue
+                # Even the best span alone is too long: keep its beginning
+                chars = max(0, (token_budget - (cost - estimate_tokens(candidate["text"]))) * 4)
+                candidate = {**candidate, "text": candidate["text"][:chars].rsplit(" ", 1)[0]}
+                cost = token_budget
+            chosen.setdefault(filename, []).append(candidate)
+            used += cost
+
+        sections = []
+        for file_spans in chosen.values():
+            file_spans.sort(key=lambda c: c["first_index"])  # Reading order within a file
+            body = "\n[...]\n".join(_locator(c) + c["text"] for c in file_spans)
+            sections.append(f"{_header(file_spans[0]['meta'])}\n{body}")
+        context = "\n\n".join(sections)
+
+    # Unpacked baseline: every chunk verbatim behind its own document header
+    naive_tokens = sum(
+        estimate_tokens(f"--- DOCUMENT: {d.metadata.get('source_filename', 'N/A')} ---\n")
+        + estimate_tokens(d.page_content)
+        for d in docs
+    )
+    context_tokens = estimate_tokens(context) if context else 0
+    stats = {
+        "chunks": len(docs),
+        "spans": sum(len(file_spans) for file_spans in chosen.values()),
+        "spans_dropped": dropped,
+        "naive_tokens": naive_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": naive_tokens - context_tokens,
+    }
+    return context, stats
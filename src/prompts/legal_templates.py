@@ -1,14 +1,17 @@
+import os
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough, RunnableParallel
 from pydantic import BaseModel, Field
 from typing import List
-from langchain_core.output_parsers import StrOutputParser
 
 
 from ..llm_model.llm import get_gemini_llm
 from ..database import get_vector_store
+from src.prompts.context_packer import pack_context
 from src.retriever import get_legal_retriever
+from src.utils.chat_utils import convert_to_langchain_messages
+from src.utils.metrics import LLMTimingCallback, get_stage_metrics, span
 
 
 class LegalAuditResponse(BaseModel):
@@ -19,22 +22,172 @@ class LegalAuditResponse(BaseModel):
     risk_level: str = Field(description="Low, Medium, or High based on the content")
 
 
-def format_docs(docs):
-    """Refined helper to inject source metadata clearly."""
-    return "\n\n".join(
-        f"--- DOCUMENT: {d.metadata.get('source_filename', 'N/A')} ---\n{d.page_content}"
-        for d in docs
-    )
+CONDENSE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """Rewrite the user's follow-up as a standalone question that can be understood without the conversation.
+    Keep company names, document titles, section numbers, dates and amounts. Return only the question.
+
+    CONVERSATION SUMMARY:
+    {history_summary}
+    """,
+        ),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "Follow-up: {question}"),
+    ]
+)
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You maintain the running summary of a legal audit conversation.
+    Fold the new messages into the summary. Keep every document, party, clause, figure and conclusion discussed; drop pleasantries.
+    Answer with the updated summary only, in at most 200 words.
+
+    CURRENT SUMMARY:
+    {history_summary}
+    """,
+        ),
+        MessagesPlaceholder(variable_name="messages"),
+    ]
+)
+
+
+AUDIT_MAP_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are a Senior Legal Auditor doing an exhaustive review of one document, one excerpt at a time.
+    List every provision in this excerpt that answers the audit question, one per line, as "- [p. 3, Section 4.2] finding".
+    Keep parties, amounts, periods and conditions. If nothing in the excerpt is relevant, answer exactly NONE.
+
+    CONTEXT:
+    {context}
+    """,
+        ),
+        ("human", "{question}"),
+    ]
+)
+
+AUDIT_REDUCE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are a Senior Legal Auditor merging partial findings from an exhaustive review of {filename}.
+    Combine them into one list, one provision per line, keeping every page and section locator.
+    Merge duplicates but never drop a distinct provision. Answer with the list only.
+
+    FINDINGS:
+    {findings}
+    """,
+        ),
+        ("human", "{question}"),
+    ]
+)
+
+AUDIT_FINAL_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are a Senior Legal Auditor writing up an exhaustive review of {filename}.
+    Answer the audit question from the findings below, listing every provision with its page and section locator.
+    Rate the overall risk as Low, Medium or High.
+
+    {format_instructions}
+
+    FINDINGS:
+    {findings}
+    """,
+        ),
+        ("human", "{question}"),
+    ]
+)
+
+
+def get_audit_chains():
+    """
+    Map, reduce and final chains for the whole-document audit (`src.audit`),
+    plus the parser for the final chain's `LegalAuditResponse` JSON.
+    """
+    llm = get_gemini_llm()
+    parser = PydanticOutputParser(pydantic_object=LegalAuditResponse)
+    final_prompt = AUDIT_FINAL_PROMPT.partial(format_instructions=parser.get_format_instructions())
+    chains = {
+        "map": AUDIT_MAP_PROMPT | llm | StrOutputParser(),
+        "reduce": AUDIT_REDUCE_PROMPT | llm | StrOutputParser(),
+        "final": final_prompt | llm | StrOutputParser(),
+    }
+    return chains, parser
+
+
+def get_history_summarizer():
+    """Returns `summarizer(previous_summary, messages)` for `ChatHistoryManager`."""
+    chain = SUMMARY_PROMPT | get_gemini_llm() | StrOutputParser()
+
+    def summarize(previous_summary, messages):
+        with span("chain.summarize_history") as s:
+            s.items = len(messages)
+            return chain.invoke(
+                {"history_summary": previous_summary or "None.", "messages": messages}
+            )
+
+    return summarize
 
 
-def get_rag_chain():
+def get_standalone_question(llm):
+    """
+    Runnable that condenses a follow-up into a standalone retrieval query.
+    First questions (no history, no summary) skip the LLM call.
+    """
+    condense = CONDENSE_PROMPT | llm | StrOutputParser()
+
+    def inputs(x):
+        return {
+            "question": x["question"],
+            "chat_history": convert_to_langchain_messages(x["chat_history"]),
+            "history_summary": x.get("history_summary") or "None.",
+        }
+
+    def standalone(x):
+        if not x["chat_history"] and not x.get("history_summary"):
+            return x["question"]
+        with span("chain.condense"):
+            return condense.invoke(inputs(x)).strip() or x["question"]
+
+    async def astandalone(x):
+        if not x["chat_history"] and not x.get("history_summary"):
+            return x["question"]
+        with span("chain.condense"):
+            return (await condense.ainvoke(inputs(x))).strip() or x["question"]
+
+    return RunnableLambda(standalone, afunc=astandalone)
+
+
+def get_rag_chain(retriever=None, token_budget=None):
     llm = get_gemini_llm()
-    retriever = get_legal_retriever()
+    # Retrieval searches for the follow-up as a standalone question (CONDENSE_QUESTION)
+    retrieval_query = (
+        get_standalone_question(llm)
+        if os.getenv("CONDENSE_QUESTION", "1") == "1"
+        else RunnableLambda(lambda x: x["question"])
+    )
+    if get_stage_metrics() is not None:
+        # Time to first token and total generation time per answer
+        llm = llm.with_config(callbacks=[LLMTimingCallback()])
+    # Reuse the caller's retriever so the reranker is only ever loaded once
+    retriever = retriever or get_legal_retriever()
+    # Prompt tokens spent on retrieved context (CONTEXT_TOKEN_BUDGET)
+    token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
 
     system_prompt = """You are a Senior Legal Auditor. Answer strictly based on context.
     
     If the answer isn't present, say: "I apologize, but the provided documents do not contain information regarding [topic]."
     
+    EARLIER CONVERSATION (summary):
+    {history_summary}
+    
     CONTEXT:
     {context}
     """
@@ -47,28 +200,41 @@ def get_rag_chain():
         ]
     )
 
+    def search(x):
+        # Optional metadata filters ride along with each request, so one chain serves them all
+        filters = x.get("filters")
+        return retrieval_query | (retriever.with_filters(**filters) if filters else retriever)
+
     setup_and_retrieval = RunnableParallel(
         {
-            "context": (lambda x: x["question"])
-            | retriever,  # Keep as Doc objects here
+            "context": RunnableLambda(search),  # Keep as Doc objects here
             "question": lambda x: x["question"],
-            "chat_history": lambda x: x["chat_history"],
+            "history_summary": lambda x: x.get("history_summary") or "None.",
+            # Runs alongside retrieval; accepts role/content dicts or messages
+            "chat_history": lambda x: convert_to_langchain_messages(x["chat_history"]),
         }
     )
 
+    # Overlapping chunks are stitched and packed into the token budget once
+    packing = RunnablePassthrough.assign(
+        packed=lambda x: pack_context(x["context"], token_budget)
+    )
+
     # We use a chain that preserves context
-    rag_chain = setup_and_retrieval | {
+    rag_chain = setup_and_retrieval | packing | {
         "answer": (
             lambda x: {
-                "context": format_docs(x["context"]),
+                "context": x["packed"][0],
                 "question": x["question"],
                 "chat_history": x["chat_history"],
+                "history_summary": x["history_summary"],
             }
         )
         | prompt
         | llm
         | StrOutputParser(),
         "retrieved_docs": lambda x: x["context"],  # Pass the docs through for audit
+        "context_stats": lambda x: x["packed"][1],
     }
 
     return rag_chain
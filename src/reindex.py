@@ -0,0 +1,140 @@
+"""
+Rebuilds chunks and vectors from the page store, without the original PDFs,
+e.g. after changing CHUNK_SIZE, CHUNK_OVERLAP or the metadata prefix.
+
+    python -m src.reindex                                   # every matter
+    python -m src.reindex --matter acme-v-smith --company Acme --workers 4
+    CHUNK_SIZE=1500 python -m src.reindex --filing-type 10-K --dry-run
+
+Files indexed before the page store existed have no stored pages; they are
+reported and left as they are (upload them again to store their pages).
+
+Against a Qdrant server this can run while the app is up: the lexical index
+is merged on save and the app's caches see the new collection generation.
+The embedded stores (VECTOR_BACKEND=mmap, QDRANT_PATH) belong to one process,
+so stop the app first; the command refuses to start while it holds the store.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.utils.metrics import observe
+
+
+def select_stored_files(client, matters=None, filters=None):
+    """(matter, source_filename, file_digest) of every indexed file matching `filters`."""
+    from src.database import list_matters
+    from src.matters import matter_collection
+    from src.utils.db_utils import indexed_file_digest, list_indexed_files
+
+    selected = []
+    for matter in matters or list_matters(client):
+        collection_name = matter_collection(matter)
+        if not client.collection_exists(collection_name):
+            raise ValueError(f"Unknown matter: {matter}")
+        for filename in list_indexed_files(client, collection_name, filters):
+            digest = indexed_file_digest(client, collection_name, filename)
+            if digest is not None:  # Skips files still being ingested
+                selected.append((matter, filename, digest))
+    return selected
+
+
+def reindex(engine, files, workers=2, progress=None):
+    """
+    Rebuilds `files` ((matter, source_filename, digest) triples) with the
+    engine's splitter, `workers` files at a time. Returns a summary.
+    """
+    from src.database import get_vector_store
+    from src.indexing import reindex_stored_file
+    from src.page_store import get_page_store
+
+    page_store = get_page_store()
+    missing = [f for f in files if page_store is None or f[2] not in page_store]
+    stored = [f for f in files if f not in missing]
+    summary = {"files": 0, "missing_pages": [f[1] for f in missing], "failed": {}}
+    totals = {"added": 0, "deleted": 0}
+    if os.getenv("QDRANT_PATH"):
+        workers = 1  # Qdrant local mode is not safe for concurrent writers
+
+    engine.get("vector_store")  # The client and embedder are loaded
+    splitter = engine.get("splitter")
+
+    def rebuild(matter, filename, digest):
+        return reindex_stored_file(get_vector_store(matter), filename, digest, splitter)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(rebuild, *f): f for f in stored}
+        for future in as_completed(futures):
+            matter, filename, _ = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Re-index of {filename} ({matter}) failed: {e}")
+                summary["failed"][filename] = str(e)
+                continue
+            summary["files"] += 1
+            for key in totals:
+                totals[key] += result.get(key, 0)
+            if progress is not None:
+                progress(summary["files"] + len(summary["failed"]), len(stored), filename, result)
+
+    summary.update(totals)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    observe("reindex.total", summary["seconds"], summary["files"])
+    return summary
+
+
+def main(argv=None):
+    from src.engine import COMPONENTS, Engine
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--matter", action="append", help="matter to rebuild (repeatable; default: all)")
+    parser.add_argument("--company")
+    parser.add_argument("--filing-type", dest="filling_type")
+    parser.add_argument("--filename", dest="source_filename")
+    parser.add_argument("--date-from", help="ISO date, inclusive")
+    parser.add_argument("--date-to", help="ISO date, exclusive")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "2")))
+    parser.add_argument("--dry-run", action="store_true", help="list the files and exit")
+    args = parser.parse_args(argv)
+
+    # Only what indexing needs: no reranker or LLM
+    engine = Engine(
+        {name: COMPONENTS[name] for name in ("qdrant", "embedder", "splitter", "vector_store")}
+    ).start()
+    try:
+        engine.get("qdrant")
+    except RuntimeError as e:
+        # An embedded store (VECTOR_BACKEND=mmap, QDRANT_PATH) has one owner process
+        parser.error(f"{e}: {e.__cause__}")
+    filters = {
+        key: getattr(args, key)
+        for key in ("company", "filling_type", "source_filename", "date_from", "date_to")
+        if getattr(args, key)
+    }
+    try:
+        files = select_stored_files(engine.get("qdrant"), args.matter, filters)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{len(files)} files selected")
+    if args.dry_run:
+        for matter, filename, _ in files:
+            print(f"  {matter}: {filename}")
+        return
+
+    summary = reindex(
+        engine,
+        files,
+        workers=args.workers,
+        progress=lambda done, total, filename, result: print(
+            f"[{done}/{total}] {filename}: {result['added']} chunks, {result['deleted']} removed"
+        ),
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,545 @@
-from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
-from langchain_classic.retrievers import ContextualCompressionRetriever
-from src.database import get_vector_store
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.database import get_collection_generation, get_vector_store
+from src.matters import DEFAULT_MATTER
+from src.lexical_index import get_lexical_index, rebuild_lexical_index
+from src.parent_store import expand_to_parents
+from src.utils.db_utils import build_metadata_filter, matches_metadata_filters
+from src.utils.metrics import span
 
+_reranker_instance = None
+_score_cache_instance = None
+_retriever_instances = {}
+_filter_vocabulary_cache = {}
 
-def get_legal_retriever():
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+
+
+def get_reranker():
+    """Returns the single FlashRank reranker shared by every retriever."""
+    global _reranker_instance
+
+    if _reranker_instance is None:
+        from flashrank import Ranker
+        from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
+
+        # Using TinyBERT-L2-v2 as it's lightning fast for legal text. FlashRank
+        # downloads it to /tmp by default, which a container restart wipes.
+        model_name = "ms-marco-TinyBERT-L-2-v2"
+        cache_dir = os.path.join(os.getenv("MODEL_CACHE_DIR", "data/models"), "flashrank")
+        _reranker_instance = FlashrankRerank(
+            client=Ranker(model_name=model_name, cache_dir=cache_dir),
+            model=model_name,
+            top_n=5,
+        )
+
+    return _reranker_instance
+
+
+class RerankScoreCache:
     """
-    Two-stage retrieval:
-    1. Similarity Search (Fetch 25 candidates)
-    2. FlashRank Reranking (Refine to top 5)
+    LRU cache of cross-encoder scores keyed by (query, point id, text hash).
+
+    The text is part of the key because a point ID can outlive its text:
+    re-indexing with a new metadata prefix rewrites a chunk in place.
+    """
+
+    def __init__(self, max_entries=20_000):
+        self.max_entries = max_entries
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query, point_id, text):
+        return (query, point_id, hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest())
+
+    def get(self, query, point_id, text):
+        key = self._key(query, point_id, text)
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def put(self, query, point_id, text, score):
+        key = self._key(query, point_id, text)
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+
+def get_filter_vocabulary(client, collection_name: str) -> dict:
+    """Known companies and filing types, refreshed whenever ingestion changes the data."""
+    generation = get_collection_generation()
+    key = (collection_name, generation)
+    if key not in _filter_vocabulary_cache:
+        vocabulary = {}
+        for field in ("company", "filling_type"):
+            try:
+                response = client.facet(
+                    collection_name=collection_name, key=f"metadata.{field}", limit=1000
+                )
+                vocabulary[field] = [str(hit.value) for hit in response.hits]
+            except Exception:
+                vocabulary[field] = []
+        for stale in [k for k in _filter_vocabulary_cache if k[1] != generation]:
+            del _filter_vocabulary_cache[stale]
+        _filter_vocabulary_cache[key] = vocabulary
+    return _filter_vocabulary_cache[key]
+
+
+def infer_query_filters(query: str, vocabulary: dict) -> dict:
+    """
+    Turns hints like "Acme's 2021 10-K" into metadata filters.
+
+    Only values that actually exist in the collection are matched. A year
+    narrows the search only alongside a company or filing type, since bare
+    years in legal questions usually refer to clause content.
     """
-    # Initialize the base vector store
-    vector_store = get_vector_store()
+    lowered = query.lower()
+    filters = {}
+    for field in ("company", "filling_type"):
+        for value in sorted(vocabulary.get(field, []), key=len, reverse=True):
+            if re.search(rf"(?<![\w-]){re.escape(value.lower())}(?![\w-])", lowered):
+                filters[field] = value
+                break
+
+    year = YEAR_PATTERN.search(lowered)
+    if filters and year:
+        filters["date_from"] = f"{year.group(0)}-01-01T00:00:00"
+        filters["date_to"] = f"{int(year.group(0)) + 1}-01-01T00:00:00"
+    return filters
+
+
+class AdaptiveRerankRetriever(BaseRetriever):
+    """
+    Dense search followed by FlashRank reranking with an adaptive candidate depth.
+
+    Candidates are fetched `step_k` at a time. Fetching stops once the top
+    `top_n` dense scores clear the weakest candidate by `margin` (the ranking
+    is decisive) or `max_k` is reached (the ranking stays ambiguous).
+    When a `lexical_index` is set, BM25 hits are fused with the dense
+    candidates by reciprocal rank fusion before reranking, so exact tokens
+    like "12.3(b)" reach the reranker without widening the dense search.
+    Cross-encoder scores are cached per (query, point id, text).
+
+    `filters` restricts every search to a metadata slice (see
+    `build_metadata_filter`); with `infer_filters`, hints in the question add
+    filters too, falling back to an unfiltered search when the hinted slice
+    yields fewer than `step_k` candidates.
+
+    The async path (`ainvoke`/`astream`) searches through `async_client` and
+    runs embedding, BM25 and reranking on `executor`, so concurrent queries
+    never block the event loop.
+    """
+
+    vector_store: Any
+    reranker: Any
+    score_cache: Any
+    top_n: int = 5
+    step_k: int = 10
+    max_k: int = 25
+    margin: float = 0.05
+    search_kwargs: dict = {}
+    lexical_index: Any = None
+    rrf_k: int = 60
+    filters: dict = {}
+    infer_filters: bool = False
+    async_client: Any = None
+    executor: Any = None
+
+    def with_filters(self, **filters):
+        """Returns a copy of this retriever that only searches the matching slice."""
+        return self.model_copy(update={"filters": {**self.filters, **filters}})
+
+    def _candidate_page_size(self, candidates) -> int:
+        return min(self.step_k, self.max_k - len(candidates))
+
+    def _needs_more_candidates(self, candidates, page) -> bool:
+        """Decides whether to fetch another page after `page` was appended."""
+        if len(page) < self.step_k or len(candidates) >= self.max_k:
+            return False  # Collection exhausted or depth limit reached
+        if len(candidates) > self.top_n:
+            cutoff = candidates[self.top_n - 1][1]
+            if cutoff - candidates[-1][1] >= self.margin:
+                return False
+        return True
+
+    def _embed_query(self, query: str):
+        with span("query.embed"):
+            return self.vector_store.embeddings.embed_query(query)
+
+    def _search_lexical(self, query: str, k: int):
+        with span("query.lexical"):
+            return self.lexical_index.search(query, k=k)
+
+    def fetch_candidates(self, query: str, query_filter=None):
+        """Returns (Document, dense score) pairs, widening only when ambiguous."""
+        embedding = self._embed_query(query)
+        candidates = []
+        while True:
+            with span("query.search") as s:
+                page = self.vector_store.similarity_search_with_score_by_vector(
+                    embedding,
+                    k=self._candidate_page_size(candidates),
+                    offset=len(candidates),
+                    filter=query_filter,
+                    **self.search_kwargs,
+                )
+                s.items = len(page)
+            candidates.extend(page)
+            if not self._needs_more_candidates(candidates, page):
+                return candidates
+
+    async def afetch_candidates(self, query: str, query_filter=None):
+        """Async `fetch_candidates`: embeds in the executor, searches on the async client."""
+        loop = asyncio.get_running_loop()
+        embedding = await loop.run_in_executor(self.executor, self._embed_query, query)
+        candidates = []
+        while True:
+            with span("query.search") as s:
+                page = await self._afetch_page(
+                    embedding,
+                    self._candidate_page_size(candidates),
+                    len(candidates),
+                    query_filter,
+                )
+                s.items = len(page)
+            candidates.extend(page)
+            if not self._needs_more_candidates(candidates, page):
+                return candidates
+
+    async def _afetch_page(self, embedding, k, offset, query_filter):
+        if self.async_client is None:
+            # Local mode has no async client; keep the event loop free anyway
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                lambda: self.vector_store.similarity_search_with_score_by_vector(
+                    embedding,
+                    k=k,
+                    offset=offset,
+                    filter=query_filter,
+                    **self.search_kwargs,
+                ),
+            )
+        response = await self.async_client.query_points(
+            collection_name=self.vector_store.collection_name,
+            query=embedding,
+            using=self.vector_store.vector_name,
+            query_filter=query_filter,
+            limit=k,
+            offset=offset,
+            with_payload=True,
+            **self.search_kwargs,
+        )
+        return [(self._document_from_point(point), point.score) for point in response.points]
+
+    def _document_from_point(self, point):
+        return self.vector_store._document_from_point(
+            point,
+            self.vector_store.collection_name,
+            self.vector_store.content_payload_key,
+            self.vector_store.metadata_payload_key,
+        )
+
+    def _lexical_depth(self, depth, filters=None) -> int:
+        # The lexical index is unfiltered, so over-fetch when a slice is selected
+        return max(depth, self.step_k) * (4 if filters else 1)
+
+    def _fuse_rankings(self, dense_docs, lexical_hits):
+        """Returns (fused point ids, docs by id) for the RRF of both rankings."""
+        depth = len(dense_docs)
+        docs_by_id = {str(doc.metadata.get("_id")): doc for doc in dense_docs}
+        dense_ranking = [str(doc.metadata.get("_id")) for doc in dense_docs]
+        lexical_ranking = [point_id for point_id, _ in lexical_hits]
 
-    # Stage 1: The "Wide Net" (Retrieves 25 docs based on vector similarity)
-    base_retriever = vector_store.as_retriever(search_kwargs={"k": 25})
+        fused = {}
+        for ranking in (dense_ranking, lexical_ranking):
+            for rank, point_id in enumerate(ranking):
+                fused[point_id] = fused.get(point_id, 0.0) + 1 / (self.rrf_k + rank + 1)
+        ranked = sorted(fused, key=fused.get, reverse=True)[: max(depth, self.top_n)]
+        return ranked, docs_by_id
 
-    # Stage 2: The "Sniper" (Reranker)
-    # Using TinyBERT-L2-v2 as it's lightning fast for legal text
-    compressor = FlashrankRerank(model="ms-marco-TinyBERT-L-2-v2", top_n=5)
+    @staticmethod
+    def _fused_documents(ranked, docs_by_id, filters=None):
+        # Points deleted since the lexical index was saved are simply skipped
+        fused_docs = [docs_by_id[point_id] for point_id in ranked if point_id in docs_by_id]
+        if filters:
+            fused_docs = [
+                doc for doc in fused_docs if matches_metadata_filters(doc.metadata, filters)
+            ]
+        return fused_docs
 
-    # Combine them
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor, base_retriever=base_retriever
-    )
+    def fuse_lexical(self, query: str, dense_docs, filters=None, lexical_hits=None):
+        """Reciprocal rank fusion of dense and BM25 rankings, cut to the dense depth."""
+        lexical_k = self._lexical_depth(len(dense_docs), filters)
+        if lexical_hits is None:
+            lexical_hits = self._search_lexical(query, lexical_k)
+        ranked, docs_by_id = self._fuse_rankings(dense_docs, lexical_hits[:lexical_k])
 
-    return compression_retriever
+        missing = [point_id for point_id in ranked if point_id not in docs_by_id]
+        if missing:
+            with span("query.fetch_lexical") as s:
+                for point in self.vector_store.client.retrieve(
+                    collection_name=self.vector_store.collection_name,
+                    ids=missing,
+                    with_payload=True,
+                ):
+                    docs_by_id[str(point.id)] = self._document_from_point(point)
+                s.items = len(missing)
+        return self._fused_documents(ranked, docs_by_id, filters)
+
+    async def afuse_lexical(self, query: str, dense_docs, filters=None, lexical_hits=None):
+        """Async `fuse_lexical`; only the lookup of lexical-only hits touches Qdrant."""
+        loop = asyncio.get_running_loop()
+        lexical_k = self._lexical_depth(len(dense_docs), filters)
+        if lexical_hits is None:
+            lexical_hits = await loop.run_in_executor(
+                self.executor, self._search_lexical, query, lexical_k
+            )
+        ranked, docs_by_id = self._fuse_rankings(dense_docs, lexical_hits[:lexical_k])
+
+        missing = [point_id for point_id in ranked if point_id not in docs_by_id]
+        if missing and self.async_client is None:
+            return await loop.run_in_executor(
+                self.executor, self.fuse_lexical, query, dense_docs, filters, lexical_hits
+            )
+        if missing:
+            with span("query.fetch_lexical") as s:
+                points = await self.async_client.retrieve(
+                    collection_name=self.vector_store.collection_name,
+                    ids=missing,
+                    with_payload=True,
+                )
+                s.items = len(missing)
+            for point in points:
+                docs_by_id[str(point.id)] = self._document_from_point(point)
+        return self._fused_documents(ranked, docs_by_id, filters)
+
+    def rerank(self, query: str, docs):
+        """
+        Scores docs with the cross-encoder, reusing cached scores, and returns
+        the `top_n` best (as parent chunks, for small-to-big collections).
+        """
+        scores = {}
+        uncached = []
+        for i, doc in enumerate(docs):
+            point_id = doc.metadata.get("_id")
+            score = None
+            if point_id is not None:
+                score = self.score_cache.get(query, point_id, doc.page_content)
+            if score is None:
+                uncached.append(i)
+            else:
+                scores[i] = score
+
+        if uncached:
+            from flashrank import RerankRequest
+
+            passages = [{"id": i, "text": docs[i].page_content} for i in uncached]
+            with span("query.rerank") as s:
+                results = self.reranker.client.rerank(
+                    RerankRequest(query=query, passages=passages)
+                )
+                s.items = len(passages)
+            for result in results:
+                score = float(result["score"])
+                scores[result["id"]] = score
+                doc = docs[result["id"]]
+                point_id = doc.metadata.get("_id")
+                if point_id is not None:
+                    self.score_cache.put(query, point_id, doc.page_content, score)
+
+        ranked = [
+            Document(
+                page_content=docs[i].page_content,
+                metadata={**docs[i].metadata, "relevance_score": scores[i]},
+            )
+            for i in sorted(scores, key=scores.get, reverse=True)
+        ]
+        # Small-to-big: child passages give way to their parent chunks, once each
+        return expand_to_parents(
+            ranked, limit=self.top_n, collection_name=self.vector_store.collection_name
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ):
+        with span("query.retrieve"):
+            return self._retrieve(query)
+
+    def _retrieve(self, query: str):
+        return self.rerank(query, self.gather(query))
+
+    def gather(self, query: str):
+        """Filtered dense candidates fused with BM25 hits, before reranking."""
+        inferred = {}
+        if self.infer_filters:
+            vocabulary = get_filter_vocabulary(
+                self.vector_store.client, self.vector_store.collection_name
+            )
+            inferred = infer_query_filters(query, vocabulary)
+        filters = {**inferred, **self.filters}
+
+        candidates = self.fetch_candidates(query, build_metadata_filter(filters))
+        if inferred and len(candidates) < self.step_k:
+            # The hint matched little or nothing; don't let it hide the answer
+            filters = dict(self.filters)
+            candidates = self.fetch_candidates(query, build_metadata_filter(filters))
+
+        docs = [doc for doc, _ in candidates]
+        if self.lexical_index is not None:
+            docs = self.fuse_lexical(query, docs, filters)
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ):
+        with span("query.retrieve"):
+            return await self._aretrieve(query)
+
+    async def _aretrieve(self, query: str):
+        docs = await self.agather(query)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.rerank, query, docs
+        )
+
+    async def agather(self, query: str):
+        """Async `gather`."""
+        loop = asyncio.get_running_loop()
+        inferred = {}
+        if self.infer_filters:
+            vocabulary = await loop.run_in_executor(
+                self.executor,
+                get_filter_vocabulary,
+                self.vector_store.client,
+                self.vector_store.collection_name,
+            )
+            inferred = infer_query_filters(query, vocabulary)
+        filters = {**inferred, **self.filters}
+
+        # BM25 doesn't depend on the dense results: search at full depth meanwhile
+        lexical_search = None
+        if self.lexical_index is not None:
+            lexical_search = loop.run_in_executor(
+                self.executor,
+                self._search_lexical,
+                query,
+                self._lexical_depth(self.max_k, filters),
+            )
+
+        candidates = await self.afetch_candidates(query, build_metadata_filter(filters))
+        if inferred and len(candidates) < self.step_k:
+            # The hint matched little or nothing; don't let it hide the answer
+            filters = dict(self.filters)
+            candidates = await self.afetch_candidates(query, build_metadata_filter(filters))
+
+        docs = [doc for doc, _ in candidates]
+        if lexical_search is not None:
+            docs = await self.afuse_lexical(query, docs, filters, await lexical_search)
+        return docs
+
+
+class MatterRouter(BaseRetriever):
+    """
+    Searches several matters (one collection each) and reranks them together.
+
+    Each matter's retriever gathers its own dense and BM25 candidates;
+    the union then goes through one cross-encoder pass, so the top results
+    are comparable across matters. Unselected matters are never searched.
+    """
+
+    retrievers: list
+
+    def with_filters(self, **filters):
+        return self.model_copy(
+            update={"retrievers": [r.with_filters(**filters) for r in self.retrievers]}
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ):
+        with span("query.retrieve"):
+            docs = [doc for retriever in self.retrievers for doc in retriever.gather(query)]
+            return self.retrievers[0].rerank(query, docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ):
+        with span("query.retrieve"):
+            gathered = await asyncio.gather(*(r.agather(query) for r in self.retrievers))
+            docs = [doc for matter_docs in gathered for doc in matter_docs]
+            first = self.retrievers[0]
+            return await asyncio.get_running_loop().run_in_executor(
+                first.executor, first.rerank, query, docs
+            )
+
+
+def _get_matter_retriever(matter):
+    global _score_cache_instance
+
+    vector_store = get_vector_store(matter)
+    retriever = _retriever_instances.get(vector_store.collection_name)
+    # A dropped and recreated matter gets a new vector store, and so a new retriever
+    if retriever is None or retriever.vector_store is not vector_store:
+        reranker = get_reranker()
+        if _score_cache_instance is None:
+            _score_cache_instance = RerankScoreCache()
+
+        lexical_index = None
+        if os.getenv("HYBRID_SEARCH", "1") == "1":
+            lexical_index = get_lexical_index(vector_store.collection_name)
+            if not len(lexical_index):
+                # First run against an existing collection: backfill once
+                rebuild_lexical_index(
+                    lexical_index, vector_store.client, vector_store.collection_name
+                )
+
+        retriever = AdaptiveRerankRetriever(
+            vector_store=vector_store,
+            reranker=reranker,
+            score_cache=_score_cache_instance,
+            top_n=reranker.top_n,
+            lexical_index=lexical_index,
+            # Opt-in: hints also narrow comparative questions to one company or type
+            infer_filters=os.getenv("QUERY_HINT_FILTERS", "0") == "1",
+        )
+        _retriever_instances[vector_store.collection_name] = retriever
+
+    return retriever
+
+
+def get_legal_retriever(matters=None):
+    """
+    Two-stage retrieval:
+    1. Hybrid Search (10-25 dense candidates, depending on how decisive the
+       scores are, fused with BM25 hits via reciprocal rank fusion)
+    2. FlashRank Reranking (Refine to top 5)
+
+    With QUERY_HINT_FILTERS=1, company, filing type and year hints in the
+    question narrow both stages to the matching payload slice.
+
+    Only the given `matters` are searched (the default matter when omitted);
+    several matters are routed through a `MatterRouter`. Retrievers, the
+    reranker and its score cache are shared across calls.
+    """
+    retrievers = {}
+    for matter in matters or [DEFAULT_MATTER]:
+        retriever = _get_matter_retriever(matter)
+        retrievers[retriever.vector_store.collection_name] = retriever
+    if len(retrievers) == 1:
+        return next(iter(retrievers.values()))
+    return MatterRouter(retrievers=list(retrievers.values()))
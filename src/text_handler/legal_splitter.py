@@ -0,0 +1,171 @@
+import re
+from dataclasses import dataclass, field
+
+# Article/section/clause headings at the start of a line: "ARTICLE V", "Section 4.2",
+# "Exhibit B", "§ 12", "4.2 Termination", "7. Governing Law", and "(a)"/"(iv)"
+# sub-clauses. Bare numbers must be followed by a capitalized word so amounts and
+# list items in running text don't count.
+HEADING_PATTERN = re.compile(
+    r"(?:"
+    r"(?i:article|section|clause|schedule|exhibit|annex|appendix)\s+"
+    r"(?:[0-9]+(?:\.[0-9]+)*[a-z]?|[IVXLCDM]+|[ivxlcdm]+|[A-Z])\b"
+    r"|§\s*[0-9]+(?:\.[0-9]+)*"
+    r"|[0-9]{1,3}(?:\.[0-9]{1,3})+\.?(?=\s+[A-Z(])"
+    r"|[0-9]{1,3}\.(?=\s+[A-Z])"
+    r"|(?P<sub>\((?:[a-z]{1,2}|[ivx]{1,4})\))(?=\s)"
+    r")"
+)
+SENTENCE_END = re.compile(r"[.;:](?=\s)")
+# A wrapped body line can start with "Section 4.2 ..." too; headings follow the end
+# of a sentence or a short title line ("TERMINATION", "Term and Termination")
+TITLE_LINE_CHARS = 60
+
+
+def _starts_section(previous_line: str) -> bool:
+    if not previous_line or previous_line[-1] in ".;:!?)":
+        return True
+    last_word = previous_line.rsplit(" ", 1)[-1]
+    return len(previous_line) < TITLE_LINE_CHARS and not last_word[0].islower()
+
+
+@dataclass
+class LegalChunk:
+    text: str
+    page_start: int
+    page_end: int
+    section: str = ""
+
+    @property
+    def metadata(self) -> dict:
+        return {
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "section": self.section,
+        }
+
+
+@dataclass
+class _Buffer:
+    """Pending text plus where pages and sections start inside it."""
+
+    text: str = ""
+    pages: list = field(default_factory=list)  # (offset, page number)
+    headings: list = field(default_factory=list)  # (offset, section label)
+    section: str = ""  # Section in effect at offset 0
+
+    def append(self, line: str, page: int, heading=None):
+        if self.text:
+            self.text += " "
+        offset = len(self.text)
+        if not self.pages or self.pages[-1][1] != page:
+            self.pages.append((offset, page))
+        if heading is not None:
+            self.headings.append((offset, heading))
+        self.text += line
+
+    def page_at(self, offset: int) -> int:
+        page = self.pages[0][1]
+        for start, number in self.pages:
+            if start > offset:
+                break
+            page = number
+        return page
+
+    def section_at(self, offset: int) -> str:
+        section = self.section
+        for start, label in self.headings:
+            if start > offset:
+                break
+            section = label
+        return section
+
+    def take(self, end: int, resume: int) -> LegalChunk:
+        """Returns text[:end] as a chunk and keeps text[resume:] (resume <= end) buffered."""
+        chunk = LegalChunk(
+            text=self.text[:end].strip(),
+            page_start=self.page_at(0),
+            page_end=self.page_at(max(end - 1, 0)),
+            section=self.section_at(0),
+        )
+        while resume < len(self.text) and self.text[resume] == " ":
+            resume += 1
+        self.section = self.section_at(resume)
+        self.pages = [(0, self.page_at(resume))] + [
+            (start - resume, page) for start, page in self.pages if start > resume
+        ]
+        self.headings = [(start - resume, label) for start, label in self.headings if start >= resume]
+        self.text = self.text[resume:]
+        return chunk
+
+
+class LegalTextSplitter:
+    """
+    Splits page texts on article, section and clause headings in a single pass.
+
+    Consecutive sections are packed into chunks of up to `chunk_size`
+    characters and cut at the last heading that fits, with no overlap. Only a
+    section too long for one chunk is cut inside, at a sentence boundary when
+    possible; the next chunk then repeats its trailing sentence (at most
+    `max_overlap` characters), because that clause spans the boundary. Every
+    chunk records its page range and the section it starts in.
+    """
+
+    def __init__(self, chunk_size=2000, max_overlap=400):
+        if max_overlap >= chunk_size // 2:
+            raise ValueError("max_overlap must be less than half of chunk_size")
+        self.chunk_size = chunk_size
+        self.max_overlap = max_overlap
+
+    def _cut(self, buffer: _Buffer) -> LegalChunk:
+        size = self.chunk_size
+        headings = [start for start, _ in buffer.headings if 0 < start <= size]
+        if headings:
+            return buffer.take(headings[-1], headings[-1])
+
+        # The section doesn't fit: prefer a sentence end in the second half
+        window = buffer.text[: size + 1]
+        ends = [m.end() for m in SENTENCE_END.finditer(window) if m.end() > size // 2]
+        if ends:
+            end = ends[-1]
+        else:
+            space = window.rfind(" ", size // 2)
+            end = space if space > 0 else size
+
+        # Repeat the trailing sentence of the cut-off part, or failing that its last words
+        tail_start = max(end - self.max_overlap, 0)
+        resume = end
+        if self.max_overlap > 0:
+            tail_ends = [m.end() for m in SENTENCE_END.finditer(buffer.text, tail_start, end - 1)]
+            if tail_ends:
+                resume = tail_ends[-1]
+            else:
+                space = buffer.text.find(" ", tail_start, end)
+                resume = space if space > 0 else end
+        return buffer.take(end, resume)
+
+    def split_pages(self, page_texts):
+        """Yields `LegalChunk`s from an iterable of page texts (page numbers start at 1)."""
+        buffer = _Buffer()
+        section = ""  # Last article/section heading, the parent of "(a)" sub-clauses
+        previous_line = ""
+        for page, page_text in enumerate(page_texts, start=1):
+            for raw_line in page_text.splitlines():
+                line = " ".join(raw_line.split())
+                if not line:
+                    continue
+                heading = None
+                match = HEADING_PATTERN.match(line)
+                if match and _starts_section(previous_line):
+                    if match.group("sub"):
+                        heading = f"{section} {match.group('sub')}".strip()
+                    else:
+                        heading = section = match.group(0).rstrip(".")
+                buffer.append(line, page, heading)
+                previous_line = line
+                while len(buffer.text) > self.chunk_size:
+                    yield self._cut(buffer)
+        if buffer.text.strip():
+            yield buffer.take(len(buffer.text), len(buffer.text))
+
+    def split_text(self, text: str):
+        return [chunk.text for chunk in self.split_pages([text])]
@@ -1,3 +1,4 @@
+import os
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
@@ -5,3 +6,27 @@ def get_recursive_text_splitter(chunk_size=500, chunk_overlap=100):
     return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, chunk_overlap=chunk_overlap
     )
+
+
+def get_legal_text_splitter(chunk_size=2000, max_overlap=400):
+    """Heading-aware splitter that keeps page ranges and section numbers (see `LegalTextSplitter`)."""
+    from src.text_handler.legal_splitter import LegalTextSplitter
+
+    return LegalTextSplitter(chunk_size=chunk_size, max_overlap=max_overlap)
+
+
+def get_child_text_splitter():
+    """
+    Splitter for the short passages embedded in small-to-big mode, cut at
+    sentence and clause ends. Returns None unless CHILD_CHUNK_SIZE is set,
+    in which case every chunk is indexed as one point.
+    """
+    chunk_size = int(os.getenv("CHILD_CHUNK_SIZE", "0"))
+    if chunk_size <= 0:
+        return None
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=0,
+        separators=[". ", "; ", ", ", " ", ""],
+        keep_separator="end",
+    )
@@ -0,0 +1,59 @@
+from src.utils.chat_utils import convert_to_langchain_messages
+from src.utils.rate_limit import estimate_tokens
+
+
+class ChatHistoryManager:
+    """
+    Token-bounded chat history with a rolling summary of older turns.
+
+    Messages are converted once, as they are appended. The most recent
+    messages are kept verbatim up to `max_recent_tokens`; when the window
+    overflows, the oldest messages are folded into the summary by
+    `summarizer(previous_summary, messages)`, so each message is summarized
+    exactly once. Eviction goes down to half the budget, which keeps
+    summarizer calls to one every few turns. Without a summarizer, evicted
+    messages are simply dropped.
+    """
+
+    def __init__(self, summarizer=None, max_recent_tokens=2000):
+        self.summarizer = summarizer
+        self.max_recent_tokens = max_recent_tokens
+        self.summary = ""
+        self._messages = []
+        self._tokens = []
+        self._start = 0
+        self._recent_tokens = 0
+
+    def reset(self):
+        self.summary = ""
+        self._messages, self._tokens = [], []
+        self._start = self._recent_tokens = 0
+
+    def update(self, messages):
+        """
+        Syncs with the full, append-only message list ({"role", "content"}
+        dicts or LangChain messages) and returns (recent messages, summary).
+        """
+        if len(messages) < len(self._messages):
+            self.reset()  # The conversation was cleared
+
+        for message in convert_to_langchain_messages(messages[len(self._messages) :]):
+            tokens = estimate_tokens(str(message.content))
+            self._messages.append(message)
+            self._tokens.append(tokens)
+            self._recent_tokens += tokens
+
+        if self._recent_tokens > self.max_recent_tokens:
+            evicted_from = self._start
+            # Always keep the latest exchange verbatim
+            while (
+                self._recent_tokens > self.max_recent_tokens // 2
+                and self._start < len(self._messages) - 2
+            ):
+                self._recent_tokens -= self._tokens[self._start]
+                self._start += 1
+            evicted = self._messages[evicted_from : self._start]
+            if evicted and self.summarizer is not None:
+                self.summary = self.summarizer(self.summary, evicted)
+
+        return list(self._messages[self._start :]), self.summary
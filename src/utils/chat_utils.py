@@ -1,14 +1,17 @@
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
 
 def convert_to_langchain_messages(messages):
     """
     Converts Streamlit-style dict history to LangChain Message objects.
     Expects messages to be a list of: {"role": "user/assistant", "content": "..."}
+    Messages that are already LangChain messages are passed through.
     """
     lc_messages = []
     for msg in messages:
-        if msg["role"] == "user":
+        if isinstance(msg, BaseMessage):
+            lc_messages.append(msg)
+        elif msg["role"] == "user":
             lc_messages.append(HumanMessage(content=msg["content"]))
         elif msg["role"] == "assistant":
             lc_messages.append(AIMessage(content=msg["content"]))
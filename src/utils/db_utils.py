@@ -1,21 +1,153 @@
 from qdrant_client import QdrantClient, models
 
 
-def is_file_indexed(client: QdrantClient, collection_name: str, filename: str) -> bool:
-    """Checks if segments of this file already exist in Qdrant."""
+def _metadata_filter(**fields) -> models.Filter:
+    """Builds an AND filter over `metadata.<field>` payload values."""
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key=f"metadata.{field}",
+                match=models.MatchValue(value=value),
+            )
+            for field, value in fields.items()
+        ]
+    )
+
+
+# Explicit filter keys accepted by the retriever, mapped to metadata fields
+KEYWORD_FILTERS = ("company", "filling_type", "source_filename", "file_digest")
+
+
+def build_metadata_filter(filters: dict):
+    """
+    Turns {company, filling_type, source_filename, file_digest, date_from,
+    date_to} into a Qdrant filter. Dates are ISO strings; date_to is exclusive.
+    """
+    conditions = [
+        models.FieldCondition(
+            key=f"metadata.{field}", match=models.MatchValue(value=filters[field])
+        )
+        for field in KEYWORD_FILTERS
+        if filters.get(field) is not None
+    ]
+    if filters.get("date_from") or filters.get("date_to"):
+        conditions.append(
+            models.FieldCondition(
+                key="metadata.date",
+                range=models.DatetimeRange(
+                    gte=filters.get("date_from"), lt=filters.get("date_to")
+                ),
+            )
+        )
+    return models.Filter(must=conditions) if conditions else None
+
+
+def metadata_filter_key(filters) -> tuple:
+    """Hashable, order-independent form of a filters dict, for cache keys."""
+    return tuple(sorted((field, value) for field, value in (filters or {}).items() if value))
+
+
+def matches_metadata_filters(metadata: dict, filters: dict) -> bool:
+    """In-process equivalent of `build_metadata_filter` for already fetched points."""
+    for field in KEYWORD_FILTERS:
+        if filters.get(field) is not None and metadata.get(field) != filters[field]:
+            return False
+    date = metadata.get("date") or ""
+    if filters.get("date_from") and date < filters["date_from"]:
+        return False
+    if filters.get("date_to") and date >= filters["date_to"]:
+        return False
+    return True
+
+
+def is_file_indexed(
+    client: QdrantClient, collection_name: str, filename: str, file_digest=None
+) -> bool:
+    """
+    Checks if this file was fully indexed into Qdrant.
+    When `file_digest` is given, only points from that exact revision count.
+    Only a finished ingest sets the completion marker, so an interrupted
+    one is never reported as indexed.
+    """
+    fields = {"source_filename": filename, "index_complete": True}
+    if file_digest is not None:
+        fields["file_digest"] = file_digest
     try:
         # Check for the filename in the metadata field
         search_result = client.count(
             collection_name=collection_name,
-            count_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="metadata.source_filename",
-                        match=models.MatchValue(value=filename),
-                    )
-                ]
-            ),
+            count_filter=_metadata_filter(**fields),
         )
         return search_result.count > 0
     except Exception:
         return False
+
+
+def mark_file_indexed(client: QdrantClient, collection_name: str, last_point_id):
+    """Sets the completion marker checked by `is_file_indexed` on a file's last chunk."""
+    client.set_payload(
+        collection_name=collection_name,
+        payload={"index_complete": True},
+        points=[last_point_id],
+        key="metadata",
+    )
+
+
+def scroll_file_points(
+    client: QdrantClient,
+    collection_name: str,
+    with_vectors=False,
+    batch_size=256,
+    **fields,
+):
+    """Yields every point whose metadata matches `fields`, page by page."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=_metadata_filter(**fields),
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=with_vectors,
+        )
+        yield from points
+        if offset is None:
+            break
+
+
+def indexed_file_digest(client: QdrantClient, collection_name: str, filename: str):
+    """Digest of the fully indexed revision of a file, if any."""
+    points, _ = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=_metadata_filter(source_filename=filename, index_complete=True),
+        limit=1,
+        with_payload=True,
+    )
+    if not points:
+        return None
+    return points[0].payload["metadata"]["file_digest"]
+
+
+def find_filename_by_digest(client: QdrantClient, collection_name: str, file_digest: str):
+    """Returns the name of an already indexed file with identical contents, if any."""
+    points, _ = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=_metadata_filter(file_digest=file_digest, index_complete=True),
+        limit=1,
+        with_payload=True,
+    )
+    if not points:
+        return None
+    return points[0].payload["metadata"]["source_filename"]
+
+
+def list_indexed_files(client: QdrantClient, collection_name: str, filters=None, limit=10_000):
+    """Names of the files stored in a collection (matching `filters`), alphabetically."""
+    response = client.facet(
+        collection_name=collection_name,
+        key="metadata.source_filename",
+        facet_filter=build_metadata_filter(filters or {}),
+        limit=limit,
+    )
+    return sorted(str(hit.value) for hit in response.hits)
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+load_dotenv()
+
+_stage_metrics_instance = None
+_metrics_enabled = None
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class StageMetrics:
+    """
+    Per-stage latency histograms and item counters for the RAG pipeline.
+
+    Stages are dotted names such as "ingest.extract", "query.rerank" or
+    "llm.first_token". Every observation updates a cumulative histogram for
+    Prometheus, a window of recent samples for percentiles and, when
+    `jsonl_path` is set, is appended to a JSON-lines log.
+    """
+
+    def __init__(self, jsonl_path=None, window=512):
+        self.jsonl_path = jsonl_path
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, items=None):
+        """Records one `seconds`-long run of `stage` that processed `items` things."""
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {
+                    "buckets": [0] * (len(BUCKETS) + 1),
+                    "count": 0,
+                    "sum": 0.0,
+                    "items": 0,
+                    "recent": deque(maxlen=self.window),
+                }
+            entry["buckets"][bisect_left(BUCKETS, seconds)] += 1
+            entry["count"] += 1
+            entry["sum"] += seconds
+            entry["items"] += items or 0
+            entry["recent"].append(seconds)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    record = {"ts": time.time(), "stage": stage, "seconds": seconds}
+                    if items is not None:
+                        record["items"] = items
+                    f.write(json.dumps(record) + "\n")
+
+    def summary(self):
+        """One row per stage: count, p50/p95 over recent runs, total time and items/sec."""
+        with self._lock:
+            stages = {
+                stage: (entry["count"], entry["sum"], entry["items"], list(entry["recent"]))
+                for stage, entry in self._stages.items()
+            }
+        rows = []
+        for stage, (count, total, items, recent) in sorted(stages.items()):
+            p50, p95 = np.percentile(recent, [50, 95])
+            rows.append(
+                {
+                    "stage": stage,
+                    "count": count,
+                    "p50_ms": round(float(p50) * 1000, 1),
+                    "p95_ms": round(float(p95) * 1000, 1),
+                    "total_s": round(total, 3),
+                    "items_per_sec": round(items / total, 1) if items and total else None,
+                }
+            )
+        return rows
+
+    def to_prometheus(self) -> str:
+        """Renders every stage in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE rag_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for stage, entry in stages:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), entry["buckets"]):
+                    cumulative += count
+                    lines.append(
+                        f'rag_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {entry["sum"]}')
+                lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+            lines.append("# TYPE rag_stage_items_total counter")
+            for stage, entry in stages:
+                lines.append(f'rag_stage_items_total{{stage="{stage}"}} {entry["items"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+class _Span:
+    """Times a `with` block; set `.items` inside the block to record throughput."""
+
+    __slots__ = ("metrics", "stage", "items", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.items = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.items)
+        return False
+
+
+class _NullSpan:
+    """Shared do-nothing span used while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def get_stage_metrics():
+    """Returns the process-wide StageMetrics, or None when RAG_METRICS=0."""
+    global _stage_metrics_instance, _metrics_enabled
+
+    # Decided once, so disabled spans cost a single global lookup
+    if _metrics_enabled is None:
+        _metrics_enabled = os.getenv("RAG_METRICS", "1") == "1"
+        if _metrics_enabled:
+            _stage_metrics_instance = StageMetrics(jsonl_path=os.getenv("RAG_METRICS_JSONL"))
+
+    return _stage_metrics_instance
+
+
+def span(stage: str):
+    """Context manager timing one stage; a shared no-op when metrics are disabled."""
+    metrics = get_stage_metrics()
+    return _NULL_SPAN if metrics is None else _Span(metrics, stage)
+
+
+def observe(stage: str, seconds: float, items=None):
+    """Records a duration measured elsewhere (e.g. summed over a generator)."""
+    metrics = get_stage_metrics()
+    if metrics is not None:
+        metrics.observe(stage, seconds, items)
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """Records time to first token ("llm.first_token") and total LLM time ("llm.total")."""
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._runs[run_id] = [time.perf_counter(), False]
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or run[1]:
+                return
+            run[1] = True
+        observe("llm.first_token", time.perf_counter() - run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        elapsed = time.perf_counter() - run[0]
+        if not run[1]:
+            observe("llm.first_token", elapsed)  # Not streamed: the whole answer arrives at once
+        generations = response.generations[0] if response.generations else []
+        message = getattr(generations[0], "message", None) if generations else None
+        usage = getattr(message, "usage_metadata", None) or {}
+        observe("llm.total", elapsed, usage.get("output_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
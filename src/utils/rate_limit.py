@@ -0,0 +1,122 @@
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_gemini_limiter_instance = None
+
+# Substrings of Gemini / HTTP errors that mean "slow down and try again"
+RETRYABLE_MARKERS = (
+    "429",
+    "503",
+    "RESOURCE_EXHAUSTED",
+    "UNAVAILABLE",
+    "rate limit",
+    "overloaded",
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for rate-limit (429) and overload (503) errors."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, 503):
+        return True
+    message = str(error)
+    return any(marker.lower() in message.lower() for marker in RETRYABLE_MARKERS)
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits as two token buckets.
+
+    `acquire(tokens)` blocks until both buckets can pay for one request of
+    `tokens` tokens, so any number of threads can share one limiter. Each
+    bucket holds at most one minute's worth (`burst_seconds`) of budget.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst_seconds=60):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._rates = [
+            rate / 60 if rate else None for rate in (requests_per_minute, tokens_per_minute)
+        ]
+        self._capacity = [rate * burst_seconds if rate else None for rate in self._rates]
+        self._levels = list(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        for i, rate in enumerate(self._rates):
+            if rate:
+                self._levels[i] = min(self._capacity[i], self._levels[i] + elapsed * rate)
+
+    def acquire(self, tokens=1) -> float:
+        """Waits for budget for one request of `tokens` tokens. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                # A request larger than the bucket only has to wait for a full bucket
+                costs = [1, tokens]
+                costs = [
+                    min(cost, capacity) if capacity else 0
+                    for cost, capacity in zip(costs, self._capacity)
+                ]
+                wait = max(
+                    (cost - level) / rate if rate else 0.0
+                    for cost, level, rate in zip(costs, self._levels, self._rates)
+                )
+                if wait <= 0:
+                    for i, cost in enumerate(costs):
+                        if self._rates[i]:
+                            self._levels[i] -= cost
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+
+def call_with_backoff(
+    fn,
+    max_retries=6,
+    base_delay=2.0,
+    max_delay=90.0,
+    on_retry=None,
+    sleep=time.sleep,
+):
+    """
+    Calls `fn()`, retrying 429/503 errors with exponential backoff and full
+    jitter. Other errors, and the last retryable one, are raised.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable_error(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            if on_retry is not None:
+                on_retry(attempt + 1, delay, e)
+            sleep(delay)
+
+
+def get_gemini_rate_limiter():
+    """Returns the limiter shared by every batch job that calls Gemini."""
+    global _gemini_limiter_instance
+
+    if _gemini_limiter_instance is None:
+        _gemini_limiter_instance = TokenBucketLimiter(
+            requests_per_minute=float(os.getenv("GEMINI_RPM", "15")),
+            tokens_per_minute=float(os.getenv("GEMINI_TPM", "1000000")),
+        )
+
+    return _gemini_limiter_instance
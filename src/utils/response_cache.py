@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+_response_cache_instance = None
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?.! ")
+
+
+# Streamlit-style roles, mapped to LangChain message types
+_ROLE_TYPES = {"user": "human", "assistant": "ai"}
+
+
+def history_fingerprint(chat_history, history_summary="") -> str:
+    """Stable hash of LangChain messages or role/content dicts (same value for both)."""
+    digest = hashlib.sha1(f"{history_summary}\0".encode("utf-8"))
+    for message in chat_history:
+        if isinstance(message, dict):
+            kind = _ROLE_TYPES.get(message["role"], message["role"])
+            content = message["content"]
+        else:
+            kind, content = message.type, message.content
+        digest.update(f"{kind}\0{content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache in front of the RAG chain.
+
+    The exact tier is keyed on (normalized question, history fingerprint,
+    collection generation). The semantic tier reuses an answer for a
+    different wording when the query embeddings' cosine similarity is at
+    least `similarity_threshold`, within the same history and generation.
+    Both tiers share TTL and LRU size eviction.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        max_entries=256,
+        ttl_seconds=3600,
+        similarity_threshold=0.95,
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _query_vector(self, question):
+        if self.embeddings is None or self.similarity_threshold is None:
+            return None
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(self, question, chat_history, generation, history_summary=""):
+        """Returns the cached answer for this question, or None."""
+        key = (
+            normalize_question(question),
+            history_fingerprint(chat_history, history_summary),
+            generation,
+        )
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry["answer"]
+            candidates = [
+                (k, e)
+                for k, e in self._entries.items()
+                if k[1:] == key[1:] and e["vector"] is not None
+            ]
+
+        query_vector = self._query_vector(question) if candidates else None
+        if query_vector is not None:
+            matrix = np.stack([e["vector"] for _, e in candidates])
+            scores = matrix @ query_vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                best_key, entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.stats["semantic_hits"] += 1
+                return entry["answer"]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def store(self, question, chat_history, generation, answer, history_summary=""):
+        if not answer:
+            return
+        key = (
+            normalize_question(question),
+            history_fingerprint(chat_history, history_summary),
+            generation,
+        )
+        vector = self._query_vector(question)
+        with self._lock:
+            self._entries[key] = {"answer": answer, "vector": vector, "created": time.time()}
+            self._entries.move_to_end(key)
+            self._evict(time.time())
+
+    def stream(self, chain, question, chat_history, generation, history_summary="", filters=None):
+        """
+        Yields answer text for `st.write_stream`: replayed from the cache on a
+        hit, otherwise streamed from the chain and stored once complete.
+        `filters` are passed to the chain; `generation` must already tell
+        differently filtered answers apart.
+        """
+        cached = self.lookup(question, chat_history, generation, history_summary)
+        if cached is not None:
+            # Replay in word-sized pieces so hits render like a live answer
+            for piece in re.findall(r"\S+\s*|\s+", cached):
+                yield piece
+            return
+
+        parts = []
+        inputs = {
+            "question": question,
+            "chat_history": chat_history,
+            "history_summary": history_summary,
+            "filters": filters,
+        }
+        for chunk in chain.stream(inputs):
+            # Extracts 'content' if it's a message chunk, or 'answer' if it's a RAG dict
+            text = chunk.content if hasattr(chunk, "content") else chunk.get("answer", "")
+            parts.append(text)
+            yield text
+        self.store(question, chat_history, generation, "".join(parts), history_summary)
+
+    async def astream(
+        self,
+        chain,
+        question,
+        chat_history,
+        generation,
+        executor=None,
+        history_summary="",
+        filters=None,
+    ):
+        """
+        Async `stream` for `chain.astream`. Lookups and stores embed the
+        question, so they run on `executor` instead of the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(
+            executor, self.lookup, question, chat_history, generation, history_summary
+        )
+        if cached is not None:
+            for piece in re.findall(r"\S+\s*|\s+", cached):
+                yield piece
+            return
+
+        parts = []
+        inputs = {
+            "question": question,
+            "chat_history": chat_history,
+            "history_summary": history_summary,
+            "filters": filters,
+        }
+        async for chunk in chain.astream(inputs):
+            text = chunk.content if hasattr(chunk, "content") else chunk.get("answer", "")
+            parts.append(text)
+            yield text
+        await loop.run_in_executor(
+            executor,
+            self.store,
+            question,
+            chat_history,
+            generation,
+            "".join(parts),
+            history_summary,
+        )
+
+
+def get_response_cache():
+    """Returns a single, persistent ResponseCache instance."""
+    global _response_cache_instance
+
+    if _response_cache_instance is None:
+        from src.llm_model.embeddings import get_embedding_model
+
+        threshold = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+        _response_cache_instance = ResponseCache(
+            embeddings=get_embedding_model(),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256")),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+            # A threshold above 1 can never match: exact tier only
+            similarity_threshold=threshold if threshold <= 1 else None,
+        )
+
+    return _response_cache_instance
@@ -0,0 +1,436 @@
+"""
+Offline ingest and query benchmark. No network, no API keys.
+
+    python -m tests.benchmark                    # run and compare with the baseline
+    python -m tests.benchmark --update-baseline  # store this run as the new baseline
+
+Generates a synthetic corpus of legal-style PDFs, then times extraction and
+splitting, embedding and upserts into a local-mode Qdrant collection, and
+hybrid retrieval with reranking. `--store mmap` swaps the local-mode Qdrant
+collection for the embedded int8 store. Exits with status 1 when a metric regresses
+by more than --tolerance against tests/benchmark_baseline.json.
+
+Options left unset take the baseline's configuration, except the reranker:
+FlashRank, as in the app, unless `--reranker overlap` picks the word-overlap
+stand-in (for machines that can't download its model; `--reranker-fallback`
+switches to it automatically). The reranker that ran is recorded, and a run
+with a different configuration exits with status 2 rather than skipping the
+comparison. Timings
+are scaled by a fixed CPU calibration loop measured alongside each run, so a
+slower or busier machine is not reported as a regression. The scaling is
+approximate: after moving to very different hardware, re-record the baseline
+on it with --update-baseline.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import sys
+import time
+import uuid
+import numpy as np
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+
+DEFAULT_CONFIG = {
+    "docs": 20,
+    "pages_per_doc": 10,
+    "queries": 100,
+    "reranker": "flashrank",
+    "store": "qdrant",
+    "splitter": "legal",
+}
+
+# Higher is better for throughput, lower is better for latency and memory
+HIGHER_IS_BETTER = ("pages_per_sec", "chunks_per_sec", "upsert_docs_per_sec")
+LOWER_IS_BETTER = (
+    "retrieval_p50_ms",
+    "retrieval_p95_ms",
+    "retrieval_p99_ms",
+    "peak_rss_mb",
+)
+
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne"]
+FILING_TYPES = ["10-K", "10-Q", "8-K", "S-1"]
+TITLES = ["License", "Lease", "Supply", "Employment", "Merger", "Services"]
+PARTIES = ["the Licensee", "the Licensor", "the Company", "the Supplier", "the Tenant"]
+CLAUSES = [
+    "{party} shall indemnify and hold harmless {other} from any claim arising under Section {sec}.",
+    "Either party may terminate this Agreement upon {days} days written notice pursuant to {sec}.",
+    "{party} shall not compete with {other} for a period of {months} months after termination.",
+    "The aggregate liability of {party} shall not exceed ${amount} in any calendar year.",
+    "All notices under Section {sec} shall be delivered in writing to the address of {other}.",
+    "{party} shall maintain insurance coverage of at least ${amount} during the term.",
+    "This Agreement shall be governed by the laws of the State of {state}.",
+    "Confidential Information disclosed by {party} shall remain the property of {other}.",
+]
+STATES = ["Delaware", "New York", "California", "Texas"]
+HEADINGS = [
+    "Definitions",
+    "Term and Termination",
+    "Indemnification",
+    "Limitation of Liability",
+    "Confidentiality",
+    "Governing Law",
+    "Notices",
+    "Insurance",
+    "Non-Competition",
+    "Assignment",
+]
+
+
+def _clause(rng):
+    party, other = rng.sample(PARTIES, 2)
+    return rng.choice(CLAUSES).format(
+        party=party,
+        other=other,
+        sec=f"{rng.randint(1, 20)}.{rng.randint(1, 9)}({rng.choice('abcd')})",
+        days=rng.choice([10, 30, 60, 90]),
+        months=rng.choice([6, 12, 18, 24]),
+        amount=f"{rng.randint(1, 900)},000",
+        state=rng.choice(STATES),
+    )
+
+
+def make_pdf(pages):
+    """Writes a minimal text PDF (one list of lines per page) without extra dependencies."""
+
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None]
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for lines in pages:
+        text = " T* ".join(f"({escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    )
+    return out.getvalue()
+
+
+def make_corpus(num_docs, pages_per_doc, seed=0):
+    """Returns named in-memory PDFs whose filenames follow the 7-part metadata format."""
+    rng = random.Random(seed)
+    files = []
+    for i in range(num_docs):
+        name = "_".join(
+            [
+                rng.choice(COMPANIES),
+                f"{rng.randint(2015, 2024)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}",
+                rng.choice(FILING_TYPES),
+                f"EX-10.{i}",
+                str(rng.randint(100000, 999999)),
+                str(i),
+                rng.choice(TITLES),
+            ]
+        )
+        # Clauses grouped under numbered section headings, 60 lines per page
+        lines = []
+        section = 0
+        while len(lines) < 60 * pages_per_doc:
+            section += 1
+            lines.append(f"Section {section}. {rng.choice(HEADINGS)}")
+            lines.extend(_clause(rng) for _ in range(rng.randint(3, 12)))
+        pages = [lines[start : start + 60] for start in range(0, 60 * pages_per_doc, 60)]
+        f = io.BytesIO(make_pdf(pages))
+        f.name = f"{name}.pdf"
+        files.append(f)
+    return files
+
+
+class OverlapRanker:
+    """Stand-in for FlashRank when its model isn't available offline: scores word overlap."""
+
+    def rerank(self, request):
+        query = set(request.query.lower().split())
+        results = []
+        for passage in request.passages:
+            words = passage["text"].lower().split()
+            results.append(
+                {"id": passage["id"], "score": len(query.intersection(words)) / (len(query) or 1)}
+            )
+        return sorted(results, key=lambda r: r["score"], reverse=True)
+
+
+def _load_reranker(kind, fallback=False):
+    """
+    Returns (reranker, name of the one loaded). FlashRank failing to load
+    raises unless `fallback` allows the word-overlap stand-in instead.
+    """
+    from types import SimpleNamespace
+
+    if kind == "flashrank":
+        try:
+            from src.retriever import get_reranker
+
+            return get_reranker(), "flashrank"
+        except Exception as e:
+            if not fallback:
+                raise RuntimeError(
+                    f"FlashRank couldn't load ({str(e)[:80]}). Benchmark the stand-in "
+                    "explicitly with --reranker overlap, or pass --reranker-fallback"
+                ) from e
+            print(f"FlashRank unavailable ({str(e)[:60]}); falling back to word overlap")
+    return SimpleNamespace(client=OverlapRanker(), top_n=5), "overlap"
+
+
+def calibrate(repeats=5):
+    """
+    Speed of this machine on a fixed mix of tokenizing, hashing and small
+    numpy work (the pipeline's own kinds of CPU work), in loops per second.
+    The best of `repeats` runs is kept, which filters out most background noise.
+    """
+    import hashlib
+    from src.lexical_index import tokenize
+
+    rng = random.Random(7)
+    texts = [" ".join(_clause(rng) for _ in range(8)) for _ in range(400)]
+    matrix = np.random.default_rng(7).standard_normal((256, 64)).astype(np.float32)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in texts:
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            hashlib.blake2b(text.encode("utf-8")).digest()
+            matrix @ matrix[: len(counts) % 64 + 1].T
+        best = min(best, time.perf_counter() - start)
+    return round(len(texts) / best, 1)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(
+    num_docs=20,
+    pages_per_doc=10,
+    num_queries=100,
+    reranker="flashrank",
+    seed=0,
+    store="qdrant",
+    splitter="legal",
+    reranker_fallback=False,
+):
+    """Runs every stage once and returns the metrics with the configuration used."""
+    os.environ.setdefault("EMBEDDING_BACKEND", "hash")
+    os.environ["EMBEDDING_CACHE_DIR"] = ""  # Measure embedding, not cache hits
+    os.environ["PAGE_STORE_PATH"] = ""  # Measure PDF extraction, not stored pages
+
+    from qdrant_client import QdrantClient
+    from qdrant_client.http.models import Distance, VectorParams
+    from langchain_qdrant import QdrantVectorStore
+    from src.bulk_upsert import bulk_upsert
+    from src.ingestion import process_pdf_to_documents
+    from src.lexical_index import LexicalIndex
+    from src.llm_model.embeddings import get_embedding_model
+    from src.retriever import AdaptiveRerankRetriever, RerankScoreCache
+    from src.text_handler.splitter import get_legal_text_splitter, get_recursive_text_splitter
+
+    files = make_corpus(num_docs, pages_per_doc, seed)
+    if splitter == "recursive":
+        text_splitter = get_recursive_text_splitter(chunk_size=2000, chunk_overlap=400)
+    else:
+        text_splitter = get_legal_text_splitter(chunk_size=2000, max_overlap=400)
+    embeddings = get_embedding_model()
+
+    # 1. Extraction and splitting
+    start = time.perf_counter()
+    docs = [doc for f in files for doc in process_pdf_to_documents(f, text_splitter)]
+    ingest_seconds = time.perf_counter() - start
+
+    # 2. Embedding and upserts into a local-mode collection
+    if store == "mmap":
+        import tempfile
+        from src.mmap_store import MmapVectorClient
+
+        client = MmapVectorClient(tempfile.mkdtemp(prefix="legal-rag-bench-"))
+    else:
+        client = QdrantClient(":memory:")
+    client.create_collection(
+        "legal-rag",
+        vectors_config=VectorParams(
+            size=len(embeddings.embed_query("probe")), distance=Distance.COSINE
+        ),
+    )
+    vector_store = QdrantVectorStore(
+        client=client, collection_name="legal-rag", embedding=embeddings
+    )
+    ids = [str(uuid.UUID(int=random.Random(seed + i).getrandbits(128))) for i in range(len(docs))]
+    upsert_stats = bulk_upsert(vector_store, [(docs, ids)])
+
+    # 3. Hybrid retrieval and reranking
+    lexical_index = LexicalIndex()
+    lexical_index.add(ids, [doc.page_content for doc in docs])
+    ranker, ranker_name = _load_reranker(reranker, fallback=reranker_fallback)
+    retriever = AdaptiveRerankRetriever(
+        vector_store=vector_store,
+        reranker=ranker,
+        score_cache=RerankScoreCache(),
+        top_n=ranker.top_n,
+        lexical_index=lexical_index,
+    )
+    rng = random.Random(seed + 1)
+    queries = [_clause(rng) for _ in range(num_queries)]
+    retriever.invoke(queries[0])  # Warm up
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.invoke(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "machine": {"calibration_per_sec": calibrate()},
+        "config": {
+            "docs": num_docs,
+            "pages_per_doc": pages_per_doc,
+            "queries": num_queries,
+            "embedder": type(embeddings).__name__,
+            "reranker": ranker_name,
+            "store": store,
+            "splitter": splitter,
+        },
+        "metrics": {
+            "pages_per_sec": round(num_docs * pages_per_doc / ingest_seconds, 1),
+            "chunks_per_sec": round(len(docs) / ingest_seconds, 1),
+            # Informational: what the splitter hands to embedding and storage
+            "chunks_per_doc": round(len(docs) / num_docs, 1),
+            "stored_chars_per_page": round(
+                sum(len(doc.page_content) for doc in docs) / (num_docs * pages_per_doc)
+            ),
+            "upsert_docs_per_sec": round(upsert_stats["docs_per_sec"], 1),
+            "retrieval_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "retrieval_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "retrieval_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        },
+    }
+
+
+def compare(result, baseline, tolerance):
+    """
+    Returns human-readable regressions of `result` against `baseline`, with
+    timings scaled by the machines' calibration speeds when both have one.
+    """
+    regressions = []
+    speed = 1.0
+    base_calibration = baseline.get("machine", {}).get("calibration_per_sec")
+    if base_calibration:
+        speed = result["machine"]["calibration_per_sec"] / base_calibration
+    for name, value in result["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if not base:
+            continue
+        # What the baseline would measure on this machine
+        if name in HIGHER_IS_BETTER:
+            base = base * speed
+        elif name.endswith("_ms"):
+            base = base / speed
+        change = (value - base) / base
+        if name in HIGHER_IS_BETTER and change < -tolerance:
+            regressions.append(f"{name}: {value} vs {base:.1f} ({change:+.0%})")
+        if name in LOWER_IS_BETTER and change > tolerance:
+            regressions.append(f"{name}: {value} vs {base:.1f} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int)
+    parser.add_argument("--pages", type=int, dest="pages_per_doc", help="pages per document")
+    parser.add_argument("--queries", type=int)
+    parser.add_argument(
+        "--reranker", choices=["flashrank", "overlap"], help="default: flashrank, as in the app"
+    )
+    parser.add_argument(
+        "--reranker-fallback",
+        action="store_true",
+        help="use the word-overlap stand-in if FlashRank can't load",
+    )
+    parser.add_argument("--store", choices=["qdrant", "mmap"])
+    parser.add_argument("--splitter", choices=["legal", "recursive"])
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    # Unset options follow the baseline, so a plain run is always comparable
+    config = dict(DEFAULT_CONFIG, **(baseline["config"] if baseline else {}))
+    config.update(
+        {key: value for key in DEFAULT_CONFIG if (value := getattr(args, key)) is not None}
+    )
+    # The reranker doesn't follow the baseline: FlashRank is measured whenever it loads
+    config["reranker"] = args.reranker or DEFAULT_CONFIG["reranker"]
+
+    try:
+        result = run_benchmark(
+            config["docs"],
+            config["pages_per_doc"],
+            config["queries"],
+            config["reranker"],
+            store=config["store"],
+            splitter=config["splitter"],
+            reranker_fallback=args.reranker_fallback,
+        )
+    except RuntimeError as e:
+        print(e)
+        return 2
+    print(json.dumps(result, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("No baseline yet; run with --update-baseline to store one")
+        return 0
+    if baseline["config"] != result["config"]:
+        print(
+            f"Baseline was recorded with {baseline['config']}; can't compare. "
+            "Run with the baseline's options, or --update-baseline to replace it"
+        )
+        return 2
+
+    regressions = compare(result, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
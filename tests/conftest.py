@@ -0,0 +1,60 @@
+import sys
+from types import SimpleNamespace
+import pytest
+
+# Module-level singletons that would otherwise leak state (or files under data/) between tests
+SINGLETONS = {
+    "src.database": {
+        "_client_instance": None,
+        "_async_client_instance": None,
+        "_vector_store_instances": {},
+    },
+    "src.llm_model.embeddings": {"_embedding_model_instance": None},
+    "src.llm_model.llm": {"_llm_instance": None},
+    "src.lexical_index": {"_lexical_index_instances": {}},
+    "src.page_store": {"_page_store_instance": None},
+    "src.parent_store": {"_parent_store_instances": {}},
+    "src.retriever": {
+        "_score_cache_instance": None,
+        "_retriever_instances": {},
+        "_filter_vocabulary_cache": {},
+    },
+    "src.async_rag": {"_async_engine_instances": {}},
+    "src.utils.response_cache": {"_response_cache_instance": None},
+    "src.utils.rate_limit": {"_gemini_limiter_instance": None},
+}
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """
+    Runs the app's modules against throwaway local storage: in-memory Qdrant,
+    hash embeddings, the fake LLM, the word-overlap reranker, and every
+    on-disk store under `tmp_path`.
+    """
+    monkeypatch.delenv("VECTOR_BACKEND", raising=False)
+    monkeypatch.delenv("CHILD_CHUNK_SIZE", raising=False)
+    for name, value in {
+        "QDRANT_PATH": ":memory:",
+        "EMBEDDING_BACKEND": "hash",
+        "EMBEDDING_CACHE_DIR": "",
+        "LLM_BACKEND": "fake",
+        "LEXICAL_INDEX_DIR": str(tmp_path / "lexical_index"),
+        "PAGE_STORE_PATH": str(tmp_path / "page_store.sqlite"),
+        "PARENT_STORE_DIR": str(tmp_path / "parent_store"),
+        "COLLECTION_GENERATION_PATH": str(tmp_path / "collection_generation"),
+    }.items():
+        monkeypatch.setenv(name, value)
+
+    import src.retriever
+    from tests.benchmark import OverlapRanker
+
+    for module_name, attributes in SINGLETONS.items():
+        __import__(module_name)
+        for attribute, value in attributes.items():
+            fresh = dict(value) if isinstance(value, dict) else value
+            monkeypatch.setattr(sys.modules[module_name], attribute, fresh)
+    monkeypatch.setattr(
+        src.retriever, "_reranker_instance", SimpleNamespace(client=OverlapRanker(), top_n=5)
+    )
+    return tmp_path
@@ -3,11 +3,12 @@ from src.database import get_vector_store
 from src.llm_model.llm import get_gemini_llm
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from src.utils.rate_limit import call_with_backoff, get_gemini_rate_limiter
+from tests.eval_harness import EvalCache, content_hash
 import random
-import time
 
 
-def generate_test_set(num_samples=10):
+def generate_test_set(num_samples=10, cache_path="data/eval_cache.sqlite"):
     vector_store = get_vector_store()
     llm = get_gemini_llm()
 
@@ -37,26 +38,41 @@ def generate_test_set(num_samples=10):
     )
 
     chain = gen_prompt | llm | JsonOutputParser()
+    # Paced by GEMINI_RPM / GEMINI_TPM instead of fixed sleeps
+    limiter = get_gemini_rate_limiter()
+    # Q&A pairs are cached per chunk and prompt, so reruns only generate for new chunks
+    cache = EvalCache(cache_path)
+    prompt_key = content_hash(
+        [gen_prompt.messages[0].prompt.template, llm._llm_type, getattr(llm, "model", None)]
+    )
 
     dataset = []
     for i, doc in enumerate(random_docs):
+        key = content_hash([prompt_key, doc.page_content])
+        cached = cache.get("qa", key)
+        if cached is not None:
+            dataset.append(cached)
+            continue
         print(f"[{i+1}/{len(random_docs)}] Generating Q&A for chunk...")
 
+        def generate():
+            limiter.acquire(len(doc.page_content) // 4 + 512)
+            return chain.invoke({"context": doc.page_content})
+
         try:
-            time.sleep(2)
-            res = chain.invoke({"context": doc.page_content})
+            # 429/503 responses are retried with exponential backoff
+            res = call_with_backoff(
+                generate,
+                on_retry=lambda n, delay, e: print(
+                    f"Rate limit hit! Retry {n} in {delay:.0f} seconds..."
+                ),
+            )
             res["context"] = doc.page_content
+            cache.put("qa", key, res)
             dataset.append(res)
 
-            print("Sleeping to avoid rate limits...")
-            time.sleep(60)
-
         except Exception as e:
-            if "429" in str(e):  # 429 is the standard 'Rate Limit Exceeded' error
-                print("Rate limit hit! Sleeping for 60 seconds...")
-                time.sleep(60)
-            else:
-                print(f"Error: {e}")
+            print(f"Error: {e}")
 
     # 2. Save to CSV for RAGAS
     df = pd.DataFrame(dataset)
@@ -0,0 +1,95 @@
+"""
+Whole-document audit over local-mode Qdrant with hash embeddings and the fake LLM.
+
+    python -m pytest tests/test_audit.py -q
+"""
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from src.audit import audit_document, load_document_chunks
+from src.database import get_qdrant_client, get_vector_store
+from src.indexing import index_file
+from src.llm_model.fake_llm import FakeLegalLLM
+from src.matters import matter_collection
+from src.prompts.legal_templates import LegalAuditResponse, get_audit_chains
+from src.text_handler.splitter import get_legal_text_splitter
+from src.utils.rate_limit import TokenBucketLimiter
+from tests.benchmark import make_corpus
+
+QUESTION = "List every indemnification clause"
+
+
+@pytest.fixture
+def indexed(offline):
+    upload = make_corpus(1, 4, seed=5)[0]
+    # Small chunks, so only some of them mention indemnification
+    index_file(get_vector_store(create=True), upload, get_legal_text_splitter(400, 100))
+    return get_qdrant_client(), upload.name
+
+
+def _recording_chains(llm):
+    """Audit chains on `llm` whose map and reduce outputs are recorded."""
+    chains, parser = get_audit_chains()
+    calls = {"map": [], "reduce": []}
+    for stage in calls:
+        chain = chains[stage].steps[0] | llm | chains[stage].steps[-1]
+        record = RunnableLambda(lambda text, stage=stage: calls[stage].append(text) or text)
+        chains[stage] = chain | record
+    chains["final"] = chains["final"].steps[0] | llm | chains["final"].steps[-1]
+    return (chains, parser), calls
+
+
+def test_audit_reduces_every_relevant_chunk(indexed):
+    client, filename = indexed
+    llm = FakeLegalLLM()
+    chains, calls = _recording_chains(llm)
+    progress = []
+
+    response, stats = audit_document(
+        client,
+        filename,
+        QUESTION,
+        chains=chains,
+        limiter=TokenBucketLimiter(),
+        map_tokens=300,
+        fan_in=2,
+        progress=progress.append,
+    )
+
+    docs = load_document_chunks(client, matter_collection("default"), filename)
+    relevant = [doc for doc in docs if "indemn" in doc.page_content.lower()]
+    assert stats["chunks"] == len(docs)
+    assert 0 < stats["relevant_chunks"] == len(relevant) < len(docs)
+
+    # Every map finding reaches the reduce step and, merged, the final answer
+    assert len(calls["map"]) == stats["findings"] > 2
+    assert calls["reduce"]
+    assert set(calls["map"]) <= set(response.answer.splitlines())
+    assert stats["llm_calls"] == llm.calls == len(calls["map"]) + len(calls["reduce"]) + 1
+
+    assert isinstance(response, LegalAuditResponse)
+    assert response.risk_level == "Medium" and response.citations == [filename]
+    assert [p["stage"] for p in progress][-1] == "final"
+
+
+def test_audit_without_relevant_chunks_skips_the_llm(indexed):
+    client, filename = indexed
+    llm = FakeLegalLLM()
+    chains, _ = _recording_chains(llm)
+
+    response, stats = audit_document(
+        client, filename, "List every cryptocurrency provision", chains=chains
+    )
+
+    assert stats["relevant_chunks"] == 0 and stats["llm_calls"] == llm.calls == 0
+    assert response.risk_level == "Low" and "no provisions" in response.answer
+
+
+def test_unknown_file_or_matter_is_an_error(indexed):
+    client, filename = indexed
+    with pytest.raises(ValueError, match="not indexed"):
+        audit_document(client, "Missing.pdf", QUESTION, chains=get_audit_chains())
+    with pytest.raises(ValueError, match="Unknown matter"):
+        audit_document(
+            client, filename, QUESTION, matter="closed-matter", chains=get_audit_chains()
+        )
@@ -0,0 +1,117 @@
+"""
+Batch runner retries, checkpoint resume and rate limiting, with the fake LLM.
+
+    python -m pytest tests/test_batch_runner.py -q
+"""
+
+import json
+import time
+import pytest
+from src.batch_runner import load_checkpoint, run_batch
+from src.database import get_vector_store
+from src.indexing import index_file
+from src.llm_model.fake_llm import FakeLegalLLM, FakeRateLimitError
+from src.prompts.legal_templates import get_rag_chain
+from src.retriever import get_legal_retriever
+from src.text_handler.splitter import get_legal_text_splitter
+from src.utils.rate_limit import TokenBucketLimiter, call_with_backoff
+from tests.benchmark import make_corpus
+
+
+def test_rate_limited_call_is_retried_until_it_succeeds():
+    # Seed 1: the first call draws a 429, the second goes through
+    llm = FakeLegalLLM(error_rate=0.5, seed=1)
+    retries, sleeps = [], []
+
+    answer = call_with_backoff(
+        lambda: llm.invoke("Who must indemnify?"),
+        base_delay=0.5,
+        on_retry=lambda n, delay, e: retries.append((n, type(e))),
+        sleep=sleeps.append,
+    )
+
+    assert answer.content
+    assert llm.errors == 1 and llm.calls == 2
+    assert retries == [(1, FakeRateLimitError)]
+    assert 0 <= sleeps[0] <= 0.5
+
+
+def test_retries_stop_at_the_limit_and_skip_other_errors():
+    llm = FakeLegalLLM(error_rate=1.0)
+    with pytest.raises(FakeRateLimitError):
+        call_with_backoff(lambda: llm.invoke("q"), max_retries=3, sleep=lambda _: None)
+    assert llm.calls == 4
+
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise KeyError("question")
+
+    with pytest.raises(KeyError):
+        call_with_backoff(broken, sleep=lambda _: None)
+    assert len(calls) == 1
+
+
+def test_resumed_batch_skips_answered_questions(offline, monkeypatch, tmp_path):
+    # Seed 0 at this rate: the third and fourth calls draw a 429
+    monkeypatch.setenv("FAKE_LLM_ERROR_RATE", "0.5")
+    vector_store = get_vector_store(create=True)
+    for f in make_corpus(2, 2, seed=4):
+        index_file(vector_store, f, get_legal_text_splitter())
+    chain = get_rag_chain(get_legal_retriever())
+    questions = [
+        {"id": f"q{i}", "question": question, "chat_history": []}
+        for i, question in enumerate(
+            [
+                "Who must indemnify?",
+                "What is the notice period for termination?",
+                "Which state's law governs?",
+                "How much insurance is required?",
+            ]
+        )
+    ]
+    output_path = str(tmp_path / "answers.jsonl")
+    with open(output_path, "w") as f:
+        f.write(json.dumps({"id": "q0", "status": "ok", "answer": "Earlier answer"}) + "\n")
+        f.write(json.dumps({"id": "q1", "status": "error", "error": "429"}) + "\n")
+        f.write('{"id": "q2", "sta')  # Torn line from an interrupted run
+
+    summary = run_batch(
+        questions,
+        output_path,
+        chain=chain,
+        limiter=TokenBucketLimiter(),
+        concurrency=2,
+        base_delay=0.01,
+    )
+
+    assert summary["skipped"] == 1
+    assert summary["answered"] == 3 and summary["failed"] == 0
+    assert load_checkpoint(output_path) == {"q0", "q1", "q2", "q3"}
+    with open(output_path) as f:
+        records = [json.loads(line) for line in f.read().split("\n")[3:] if line]
+    assert sorted(r["id"] for r in records) == ["q1", "q2", "q3"]
+    assert sum(r["attempts"] for r in records) == 5
+    assert all(r["answer"].startswith("According to") and r["sources"] for r in records)
+
+    # Everything is answered now: a rerun calls nothing
+    rerun = run_batch(questions, output_path, chain=None, limiter=TokenBucketLimiter())
+    assert rerun["skipped"] == 4 and rerun["answered"] == 0
+
+
+def test_limiter_paces_calls_to_its_rate():
+    # 600 RPM with a 0.1s burst: one call up front, then one every 0.1s
+    limiter = TokenBucketLimiter(requests_per_minute=600, burst_seconds=0.1)
+    start = time.monotonic()
+    waited = [limiter.acquire() for _ in range(6)]
+    elapsed = time.monotonic() - start
+
+    assert waited[0] == 0
+    assert 0.45 <= elapsed < 1.0
+    assert all(0.05 <= w <= 0.2 for w in waited[1:])
+
+    # Token budget: 6000 TPM is 100 tokens/s, so a 50-token call waits ~0.5s after a full one
+    limiter = TokenBucketLimiter(tokens_per_minute=6000, burst_seconds=0.5)
+    assert limiter.acquire(50) == 0
+    assert 0.4 <= limiter.acquire(50) <= 0.7
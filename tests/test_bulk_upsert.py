@@ -0,0 +1,58 @@
+"""
+Pipelined bulk upsert against an in-memory Qdrant (no server, no model).
+
+    python -m pytest tests/test_bulk_upsert.py -q
+"""
+
+import pytest
+from langchain_core.documents import Document
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+from src.bulk_upsert import bulk_upsert
+from src.llm_model.hash_embeddings import HashEmbeddings
+
+
+def _vector_store(size=64):
+    client = QdrantClient(location=":memory:")
+    client.create_collection(
+        collection_name="bulk-test",
+        vectors_config=VectorParams(size=size, distance=Distance.COSINE),
+    )
+    return QdrantVectorStore(
+        client=client, collection_name="bulk-test", embedding=HashEmbeddings(size=size)
+    )
+
+
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        ids = list(range(start, min(start + batch_size, count)))
+        docs = [Document(page_content=f"clause {i} of the agreement", metadata={"i": i}) for i in ids]
+        yield docs, ids
+
+
+@pytest.mark.parametrize("parallelism,wait", [(1, False), (3, False), (2, True)])
+def test_every_point_is_written(parallelism, wait):
+    vector_store = _vector_store()
+    stats = bulk_upsert(
+        vector_store, _batches(250, 40), batch_size=32, parallelism=parallelism, wait=wait
+    )
+
+    assert stats["points"] == 250
+    assert stats["docs_per_sec"] > 0
+    assert vector_store.client.count("bulk-test", exact=True).count == 250
+    point = vector_store.client.retrieve("bulk-test", [249], with_payload=True)[0]
+    assert point.payload["metadata"] == {"i": 249}
+
+
+def test_write_failure_is_raised():
+    # Vectors of the wrong size are rejected by the collection
+    vector_store = _vector_store(size=64)
+    vector_store.client.delete_collection("bulk-test")
+    vector_store.client.create_collection(
+        collection_name="bulk-test",
+        vectors_config=VectorParams(size=8, distance=Distance.COSINE),
+    )
+
+    with pytest.raises(Exception):
+        bulk_upsert(vector_store, _batches(100, 20), batch_size=16, parallelism=2)
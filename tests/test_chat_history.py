@@ -0,0 +1,75 @@
+"""
+Token-bounded chat history: eviction and rolling summaries (no LLM).
+
+    python -m pytest tests/test_chat_history.py -q
+"""
+
+from src.utils.chat_history import ChatHistoryManager
+
+
+def _turns(count, words=40):
+    messages = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"turn{i} " + "lorem " * words})
+    return messages
+
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, summary, messages):
+        self.calls.append([m.content.split()[0] for m in messages])
+        return " ".join(filter(None, [summary, *self.calls[-1]]))
+
+
+def test_short_conversations_are_kept_verbatim():
+    summarizer = RecordingSummarizer()
+    manager = ChatHistoryManager(summarizer=summarizer, max_recent_tokens=2000)
+
+    recent, summary = manager.update(_turns(4))
+
+    assert [m.type for m in recent] == ["human", "ai", "human", "ai"]
+    assert summary == "" and summarizer.calls == []
+
+
+def test_overflow_folds_the_oldest_turns_into_the_summary_once():
+    summarizer = RecordingSummarizer()
+    # Each turn is ~62 tokens: the window holds four, eviction goes down to two
+    manager = ChatHistoryManager(summarizer=summarizer, max_recent_tokens=250)
+    messages = _turns(5)
+
+    recent, summary = manager.update(messages)
+
+    assert summarizer.calls == [["turn0", "turn1", "turn2"]]
+    assert [m.content.split()[0] for m in recent] == ["turn3", "turn4"]
+    assert summary == "turn0 turn1 turn2"
+
+    # Growing the conversation again summarizes only the newly evicted turns
+    messages += _turns(8)[5:]
+    recent, summary = manager.update(messages)
+    assert summarizer.calls[1] == ["turn3", "turn4", "turn5"]
+    assert summary == "turn0 turn1 turn2 turn3 turn4 turn5"
+    assert [m.content.split()[0] for m in recent] == ["turn6", "turn7"]
+
+
+def test_latest_exchange_is_never_evicted():
+    manager = ChatHistoryManager(max_recent_tokens=10)
+
+    recent, summary = manager.update(_turns(4, words=200))
+
+    # Without a summarizer, evicted turns are dropped
+    assert [m.content.split()[0] for m in recent] == ["turn2", "turn3"]
+    assert summary == ""
+
+
+def test_cleared_conversation_resets_the_summary():
+    summarizer = RecordingSummarizer()
+    manager = ChatHistoryManager(summarizer=summarizer, max_recent_tokens=250)
+    manager.update(_turns(6))
+    assert manager.summary
+
+    recent, summary = manager.update(_turns(1))
+
+    assert summary == "" and len(recent) == 1
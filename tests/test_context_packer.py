@@ -0,0 +1,91 @@
+"""
+Context packing: stitching overlapping chunks and staying within the token budget.
+
+    python -m pytest tests/test_context_packer.py -q
+"""
+
+from langchain_core.documents import Document
+from src.ingestion import context_prefix
+from src.prompts.context_packer import pack_context
+from src.utils.rate_limit import estimate_tokens
+
+META = {"source_filename": "lease.pdf", "doc_title": "Lease", "company": "Acme"}
+
+
+def _chunk(text, index, score, filename="lease.pdf", **extra):
+    meta = dict(META, source_filename=filename, chunk_index=index, relevance_score=score, **extra)
+    return Document(page_content=context_prefix(meta) + text, metadata=meta)
+
+
+def test_overlapping_neighbours_are_stitched_under_one_header():
+    docs = [
+        _chunk("the tenant shall pay rent on the first day of each month", 1, 0.9),
+        _chunk("first day of each month and late fees apply", 2, 0.7),
+        _chunk("late fees apply at five percent", 3, 0.8),
+    ]
+
+    context, stats = pack_context(docs, token_budget=1000)
+
+    assert context.count("--- DOCUMENT: lease.pdf") == 1
+    assert "Company: Acme | Content:" not in context  # Per-chunk prefixes are dropped
+    assert context.endswith(
+        "the tenant shall pay rent on the first day of each month and late fees apply "
+        "at five percent"
+    )
+    assert stats["chunks"] == 3 and stats["spans"] == 1
+    assert stats["tokens_saved"] > 0
+
+
+def test_text_that_only_looks_shared_is_not_merged():
+    # "rent" ends chunk 1 and starts "rental" in chunk 2: not a whole-word overlap
+    docs = [_chunk("the tenant pays rent", 4, 0.9), _chunk("rental increases yearly", 5, 0.8)]
+
+    context, _ = pack_context(docs, token_budget=1000)
+
+    assert "the tenant pays rent rental increases yearly" in context
+
+
+def test_spans_are_admitted_by_relevance_within_the_budget():
+    filler = " ".join(["clause"] * 250)  # ~440 tokens each
+    docs = [
+        _chunk("best " + filler, 10, 0.9),
+        _chunk("worst " + filler, 1, 0.1, filename="other.pdf"),
+        _chunk("second " + filler, 20, 0.5),
+    ]
+
+    context, stats = pack_context(docs, token_budget=1000)
+
+    assert estimate_tokens(context) <= 1000
+    assert stats["spans"] == 2 and stats["spans_dropped"] == 1
+    assert "worst" not in context and "other.pdf" not in context
+    # Separate spans of a file appear in reading order with a gap marker
+    assert context.index("best") < context.index("[...]") < context.index("second")
+
+
+def test_oversized_best_span_is_truncated_to_fit():
+    docs = [_chunk(" ".join(f"word{i}" for i in range(2000)), 0, 0.9)]
+
+    context, stats = pack_context(docs, token_budget=200)
+
+    assert estimate_tokens(context) <= 210
+    assert context.split("\n", 1)[1].startswith("word0 word1")
+    assert stats["spans"] == 1
+
+
+def test_page_ranges_and_sections_are_cited():
+    docs = [
+        _chunk(
+            "notice shall be given in writing",
+            7,
+            0.9,
+            page_start=3,
+            page_end=4,
+            section="Section 4.2",
+        ),
+        _chunk("governing law is delaware", 12, 0.8, page_start=9, page_end=9),
+    ]
+
+    context, _ = pack_context(docs, token_budget=1000)
+
+    assert "[p. 3-4, Section 4.2] notice shall be given in writing" in context
+    assert "[p. 9] governing law is delaware" in context
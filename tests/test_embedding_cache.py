@@ -0,0 +1,81 @@
+"""
+Disk-backed embedding cache: hits, LRU eviction and reopening (no model).
+
+    python -m pytest tests/test_embedding_cache.py -q
+"""
+
+import numpy as np
+from src.llm_model.embedding_cache import CachedEmbeddings, EmbeddingCache, embedding_cache_key
+from src.llm_model.hash_embeddings import HashEmbeddings
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self, size=16):
+        super().__init__(size=size)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def _key(text):
+    return embedding_cache_key("test-model", text)
+
+
+def _vector(seed, dim=16):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def test_repeated_texts_are_served_from_the_cache(tmp_path):
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), "test-model", max_entries=32))
+
+    first = cached.embed_documents(["indemnity", "termination", "indemnity"])
+    second = cached.embed_documents(["termination", "indemnity"])
+
+    # Duplicates within a batch are encoded once, and the second call is all hits
+    assert model.embedded == ["indemnity", "termination"]
+    assert second == [first[1], first[0]]
+    np.testing.assert_allclose(first[0], model.embed_documents(["indemnity"])[0], atol=1e-2)
+    assert cached.cache.stats()["hits"] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", max_entries=3)
+    cache.put_many([_key("a"), _key("b"), _key("c")], [_vector(0), _vector(1), _vector(2)])
+
+    cache.get_many([_key("a")])  # "b" is now the least recently used
+    cache.put_many([_key("d")], [_vector(3)])
+
+    hits = cache.get_many([_key("a"), _key("b"), _key("c"), _key("d")])
+    assert [vector is not None for vector in hits] == [True, False, True, True]
+    assert cache.stats()["entries"] == 3
+
+
+def test_reopened_cache_keeps_vectors_and_recency(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", max_entries=3)
+    cache.put_many([_key("a"), _key("b"), _key("c")], [_vector(0), _vector(1), _vector(2)])
+    cache.get_many([_key("a")])
+
+    reopened = EmbeddingCache(str(tmp_path), "test-model", max_entries=3)
+    np.testing.assert_allclose(reopened.get_many([_key("c")])[0], _vector(2), atol=1e-2)
+    reopened.put_many([_key("d")], [_vector(3)])
+
+    assert reopened.get_many([_key("b")]) == [None]
+    # Another model name gets its own directory and never sees these vectors
+    assert EmbeddingCache(str(tmp_path), "other-model", max_entries=3).get_many([_key("a")]) == [None]
+
+
+def test_writes_from_another_instance_are_seen(tmp_path):
+    # Two instances on one directory stand in for two processes
+    reader = EmbeddingCache(str(tmp_path), "test-model", max_entries=4)
+    writer = EmbeddingCache(str(tmp_path), "test-model", max_entries=4)
+    writer.put_many([_key("a")], [_vector(0)])
+    assert reader.get_many([_key("a")])[0] is not None
+
+    writer.put_many([_key(t) for t in "bcde"], [_vector(i) for i in range(1, 5)])
+
+    # "a" was evicted by the other writer: the slot must not be served under the old key
+    assert reader.get_many([_key("a")]) == [None]
+    np.testing.assert_allclose(reader.get_many([_key("e")])[0], _vector(4), atol=1e-2)
@@ -0,0 +1,106 @@
+"""
+Incremental indexing: revisions, renamed copies and deleted chunks (offline).
+
+    python -m pytest tests/test_indexing.py -q
+"""
+
+import io
+import random
+from src.database import get_collection_generation, get_vector_store
+from src.indexing import index_file
+from src.lexical_index import get_lexical_index
+from src.text_handler.splitter import get_legal_text_splitter
+from src.utils.db_utils import scroll_file_points
+from tests.benchmark import _clause, make_pdf
+
+NAME = "Acme_20230115_10-K_EX-10.1_123456_1_License.pdf"
+
+
+def _pdf(pages, name=NAME):
+    f = io.BytesIO(make_pdf(pages))
+    f.name = name
+    return f
+
+
+def _pages(num_pages, seed=0):
+    rng = random.Random(seed)
+    return [
+        [f"Section {page + 1}. Heading"] + [_clause(rng) for _ in range(30)]
+        for page in range(num_pages)
+    ]
+
+
+def _points(vector_store, source_filename=NAME):
+    return {
+        str(p.id): p.payload
+        for p in scroll_file_points(
+            vector_store.client, vector_store.collection_name, source_filename=source_filename
+        )
+    }
+
+
+def test_revision_only_embeds_changed_chunks(offline):
+    vector_store = get_vector_store(create=True)
+    splitter = get_legal_text_splitter(chunk_size=800, max_overlap=200)
+    pages = _pages(4)
+
+    first = index_file(vector_store, _pdf(pages), splitter)
+    assert first["added"] > 0 and first["deleted"] == 0
+    before = _points(vector_store)
+    generation = get_collection_generation()
+
+    # Same name and contents: nothing to do, and cached answers stay valid
+    assert index_file(vector_store, _pdf(pages), splitter)["added"] == 0
+    assert get_collection_generation() == generation
+
+    # Rewrite the last page: earlier chunks keep their IDs and vectors
+    revised = pages[:3] + [["Section 4. Heading"] + [_clause(random.Random(9)) for _ in range(30)]]
+    summary = index_file(vector_store, _pdf(revised), splitter)
+    after = _points(vector_store)
+
+    assert 0 < summary["added"] < first["added"]
+    assert summary["deleted"] == len(set(before) - set(after)) > 0
+    assert summary["unchanged"] + summary["updated"] == len(set(before) & set(after))
+    assert len(after) == summary["added"] + summary["unchanged"] + summary["updated"]
+    assert get_collection_generation() > generation
+
+    lexical_index = get_lexical_index(vector_store.collection_name)
+    assert all(point_id in lexical_index for point_id in after)
+    assert not any(point_id in lexical_index for point_id in set(before) - set(after))
+
+
+def test_removed_pages_delete_their_chunks(offline):
+    vector_store = get_vector_store(create=True)
+    splitter = get_legal_text_splitter(chunk_size=800, max_overlap=200)
+    pages = _pages(4, seed=1)
+    index_file(vector_store, _pdf(pages), splitter)
+    before = _points(vector_store)
+
+    summary = index_file(vector_store, _pdf(pages[:2]), splitter)
+    after = _points(vector_store)
+
+    assert summary["added"] == 0
+    assert summary["deleted"] == len(before) - len(after) > 0
+    assert max(p["metadata"]["page_end"] for p in after.values()) == 2
+
+
+def test_renamed_copy_reuses_vectors(offline):
+    vector_store = get_vector_store(create=True)
+    splitter = get_legal_text_splitter(chunk_size=800, max_overlap=200)
+    pages = _pages(3, seed=2)
+    index_file(vector_store, _pdf(pages), splitter)
+
+    copy_name = "Globex_20240301_8-K_EX-10.2_654321_2_Lease.pdf"
+    summary = index_file(vector_store, _pdf(pages, name=copy_name), splitter)
+    original, copy = _points(vector_store), _points(vector_store, copy_name)
+
+    assert summary["copied"] == len(original) == len(copy)
+    assert summary["added"] == 0
+    assert not set(original) & set(copy)
+    for payload in copy.values():
+        assert payload["metadata"]["source_filename"] == copy_name
+        assert payload["metadata"]["company"] == "Globex"
+        assert payload["page_content"].startswith("Doc: Lease | Company: Globex | Content: ")
+    assert sorted(p["page_content"].split("Content: ", 1)[1] for p in copy.values()) == sorted(
+        p["page_content"].split("Content: ", 1)[1] for p in original.values()
+    )
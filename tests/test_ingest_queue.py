@@ -0,0 +1,110 @@
+"""
+Ingest queue: leases, one revision per filename at a time, retries and uploads.
+
+    python -m pytest tests/test_ingest_queue.py -q
+"""
+
+import os
+import pytest
+from src import ingest_queue as ingest_queue_module
+from src.database import get_vector_store
+from src.ingest_queue import IngestQueue
+from src.text_handler.splitter import get_legal_text_splitter
+from tests.benchmark import make_corpus
+
+FILENAME = "Acme_20230115_10-K_EX-10.1_123456_1_License.pdf"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return IngestQueue(str(tmp_path / "queue.sqlite"), str(tmp_path / "uploads"), max_attempts=2)
+
+
+def _age(queue, job_id, seconds):
+    queue._db.execute("UPDATE jobs SET updated_at = updated_at - ? WHERE id = ?", (seconds, job_id))
+
+
+def test_expired_lease_is_requeued_for_another_process(queue):
+    job_id = queue.submit(FILENAME, b"%PDF-1.4", "d1")
+    assert queue.claim()["id"] == job_id
+
+    other = IngestQueue(queue.path, queue.upload_dir, max_attempts=2)
+    assert other.claim() is None  # Still leased
+    _age(queue, job_id, ingest_queue_module.LEASE_SECONDS + 1)
+
+    job = other.claim()
+    assert job["id"] == job_id and job["owner"] == other.owner and job["attempts"] == 2
+
+    # The stale worker's updates no longer land
+    queue.finish(job_id, {"added": 1})
+    assert queue.jobs([job_id])[0]["status"] == "running"
+
+    # Out of attempts, an expired lease fails the job and drops its upload
+    _age(queue, job_id, ingest_queue_module.LEASE_SECONDS + 1)
+    assert queue.claim() is None
+    assert queue.jobs([job_id], active=False)[0]["status"] == "failed"
+    assert not os.path.exists(job["path"])
+
+
+def test_revisions_of_one_file_never_run_together(queue):
+    first = queue.submit(FILENAME, b"revision 1", "d1")
+    second = queue.submit(FILENAME, b"revision 2", "d2")
+    other = queue.submit("Other.pdf", b"other", "d3")
+    assert queue.submit(FILENAME, b"revision 2", "d2") == second  # Same pending job
+
+    assert queue.claim()["id"] == first
+    assert queue.claim()["id"] == other  # The second revision waits
+    assert queue.claim() is None
+
+    queue.finish(first, {})
+    assert queue.claim()["id"] == second
+
+
+def test_failed_job_is_retried_then_its_upload_removed(queue, monkeypatch):
+    job_id = queue.submit(FILENAME, b"%PDF-1.4", "d1")
+    job = queue.claim()
+    queue.fail(job, RuntimeError("qdrant unavailable"))
+
+    requeued = queue.jobs([job_id])[0]
+    assert requeued["status"] == "queued" and requeued["error"] == "qdrant unavailable"
+    assert queue.claim() is None  # Waits out RETRY_SECONDS
+
+    monkeypatch.setattr(ingest_queue_module, "RETRY_SECONDS", 0)
+    _age(queue, job_id, 1)
+    job = queue.claim()
+    assert job["attempts"] == 2
+    queue.fail(job, ValueError())
+
+    failed = queue.jobs([job_id], active=False)[0]
+    assert failed["status"] == "failed" and failed["error"] == "ValueError"
+    assert not os.path.exists(job["path"])
+
+
+def test_shared_upload_is_kept_while_another_job_needs_it(queue):
+    first = queue.submit(FILENAME, b"%PDF-1.4", "d1")
+    job = queue.claim()
+    path = job["path"]
+    os.utime(path, (0, 0))
+    queue.submit(FILENAME, b"ignored", "d1", matter="matter-b")
+
+    assert os.path.getmtime(path) == 0  # The existing copy was not rewritten
+    queue.finish(first, {})
+    queue._remove_upload(job)
+    assert os.path.exists(path)
+
+    queue.finish(queue.claim()["id"], {})
+    queue._remove_upload(job)
+    assert not os.path.exists(path)
+
+
+def test_run_indexes_the_upload(offline, queue):
+    upload = make_corpus(1, 2, seed=3)[0]
+    job_id = queue.submit(upload.name, upload.getvalue(), "d1")
+
+    job = queue.claim()
+    queue.run(job, get_vector_store(create=True), get_legal_text_splitter())
+
+    done = queue.jobs([job_id], active=False)[0]
+    assert done["status"] == "done" and done["pages_total"] == 2
+    assert done["progress"]["added"] > 0
+    assert not os.path.exists(job["path"])
@@ -0,0 +1,46 @@
+"""
+Streamed ingestion gives the same chunks as the one-shot path (no server, no model).
+
+    python -m pytest tests/test_ingestion.py -q
+"""
+
+import pytest
+import src.page_store as page_store
+from src.ingestion import iter_pdf_documents, process_pdf_to_documents
+from src.text_handler.splitter import get_legal_text_splitter, get_recursive_text_splitter
+from tests.benchmark import make_corpus
+
+
+@pytest.fixture(autouse=True)
+def no_page_store(monkeypatch):
+    monkeypatch.setenv("PAGE_STORE_PATH", "")
+    monkeypatch.setattr(page_store, "_page_store_instance", None)
+
+
+def _as_pairs(docs):
+    return [(doc.page_content, doc.metadata) for doc in docs]
+
+
+@pytest.mark.parametrize(
+    "splitter",
+    [get_legal_text_splitter(chunk_size=800, max_overlap=200), get_recursive_text_splitter()],
+    ids=["legal", "recursive"],
+)
+def test_streamed_documents_match_one_shot(splitter):
+    (pdf,) = make_corpus(1, 4, seed=3)
+    expected = _as_pairs(process_pdf_to_documents(pdf, splitter))
+
+    # A small window forces the streaming splitter to carry text across several re-splits
+    batches = list(iter_pdf_documents(pdf, splitter, batch_size=7, max_workers=1, window_chars=1500))
+
+    assert len(expected) > 7
+    assert all(len(batch) <= 7 for batch in batches)
+    assert _as_pairs(doc for batch in batches for doc in batch) == expected
+
+
+def test_invalid_filename_is_rejected():
+    (pdf,) = make_corpus(1, 1)
+    pdf.name = "contract.pdf"
+
+    with pytest.raises(ValueError, match="Invalid filename format"):
+        list(iter_pdf_documents(pdf, get_recursive_text_splitter(), max_workers=1))
@@ -0,0 +1,73 @@
+"""
+Legal splitter: page and section provenance, and overlap only inside a long section.
+
+    python -m pytest tests/test_legal_splitter.py -q
+"""
+
+import pytest
+from src.text_handler.legal_splitter import LegalTextSplitter
+
+LEASE = [
+    "ARTICLE I\n"
+    "Definitions apply throughout this agreement.\n"
+    "Section 1.1 Term. The term is five years.\n",
+    "Section 1.2 Rent. The tenant shall pay rent monthly.\n"
+    "(a) Late fees apply after ten days.\n"
+    "(b) Interest accrues at five percent.\n"
+    "ARTICLE II\n"
+    "The landlord shall maintain the roof as provided in\n"
+    "Section 4.2 of the lease and keep it sound.\n",
+]
+
+
+def _sentences(first, last):
+    return "\n".join(f"Sentence {i} covers indemnity for losses." for i in range(first, last))
+
+
+def test_sections_are_packed_and_cut_at_headings():
+    chunks = list(LegalTextSplitter(chunk_size=120, max_overlap=50).split_pages(LEASE))
+
+    assert [c.metadata for c in chunks] == [
+        {"page_start": 1, "page_end": 1, "section": "ARTICLE I"},
+        {"page_start": 2, "page_end": 2, "section": "Section 1.2"},
+        {"page_start": 2, "page_end": 2, "section": "Section 1.2 (b)"},
+        {"page_start": 2, "page_end": 2, "section": "ARTICLE II"},
+    ]
+    assert chunks[1].text.startswith("Section 1.2 Rent.")
+    assert chunks[2].text == "(b) Interest accrues at five percent."
+    # A wrapped line starting with "Section 4.2" is a reference, not a heading
+    assert chunks[3].text.endswith("as provided in Section 4.2 of the lease and keep it sound.")
+    # Chunks cut at headings share no text
+    assert " ".join(c.text for c in chunks) == " ".join(" ".join(LEASE).split())
+
+
+def test_long_section_overlaps_by_its_trailing_sentence():
+    pages = [
+        "Section 6 Insurance. Coverage is required.\nSection 7 Indemnification.\n" + _sentences(0, 6),
+        _sentences(6, 12) + "\nSection 8 Notices. Notices go in writing.\n",
+    ]
+    splitter = LegalTextSplitter(chunk_size=200, max_overlap=60)
+
+    chunks = list(splitter.split_pages(pages))
+
+    assert chunks[0].metadata == {"page_start": 1, "page_end": 1, "section": "Section 6"}
+    inside = [c for c in chunks if c.metadata["section"] == "Section 7"]
+    assert len(inside) >= 3
+    assert inside[0].text.startswith("Section 7 Indemnification.")
+    assert any(c.metadata["page_start"] == 1 and c.metadata["page_end"] == 2 for c in inside)
+    assert inside[-1].metadata["page_start"] == inside[-1].metadata["page_end"] == 2
+    assert inside[-1].text.endswith("Section 8 Notices. Notices go in writing.")
+
+    for previous, chunk in zip(inside, inside[1:]):
+        repeated = chunk.text.split(". ", 1)[0] + "."
+        # The cut-off part's last sentence opens the next chunk, and only that
+        assert previous.text.endswith(repeated) and len(repeated) <= 60
+        assert chunk.text.startswith("Sentence ")
+    # The section boundary into Section 7 repeats nothing
+    assert "Coverage is required." not in inside[0].text
+    assert all(len(c.text) <= 200 for c in chunks)
+
+
+def test_overlap_must_fit_the_chunk_size():
+    with pytest.raises(ValueError, match="max_overlap"):
+        LegalTextSplitter(chunk_size=200, max_overlap=100)
@@ -0,0 +1,99 @@
+"""
+BM25 lexical index: incremental updates, compaction and shared saves (no server).
+
+    python -m pytest tests/test_lexical_index.py -q
+"""
+
+import multiprocessing
+from src.lexical_index import LexicalIndex, tokenize
+
+
+def test_legal_references_stay_single_tokens():
+    assert tokenize("Under Section 12.3(b), pay $1,000 per the 10-K non-compete") == [
+        "under", "section", "12.3(b)", "pay", "$1,000", "per", "the", "10-k", "non-compete"
+    ]
+
+
+def test_add_replace_and_remove():
+    index = LexicalIndex()
+    index.add(["a", "b", "c"], [
+        "the tenant shall pay rent monthly",
+        "termination upon thirty days notice",
+        "section 12.3(b) governs indemnification",
+    ])
+
+    assert index.search("12.3(b)")[0][0] == "c"
+    assert [point_id for point_id, _ in index.search("rent notice")] in (["a", "b"], ["b", "a"])
+
+    # Re-adding an id replaces its text
+    index.add(["a"], ["confidentiality survives termination"])
+    assert "a" not in {point_id for point_id, _ in index.search("rent")}
+    assert {point_id for point_id, _ in index.search("termination")} == {"a", "b"}
+
+    index.remove(["b", "missing"])
+    assert len(index) == 2 and "b" not in index
+    assert [point_id for point_id, _ in index.search("termination")] == ["a"]
+
+
+def test_compaction_keeps_results():
+    index = LexicalIndex()
+    ids = [str(i) for i in range(1500)]
+    index.add(ids, [f"clause {i} filler text" + (" indemnify" if i % 100 == 0 else "") for i in range(1500)])
+    before = dict(index.search("indemnify", k=100))
+
+    index.remove(ids[1:1400])  # Enough tombstones to trigger a rebuild
+
+    assert index._dead == 0 and len(index._doc_ids) == len(index) == 101
+    after = dict(index.search("indemnify", k=100))
+    assert set(after) == {id_ for id_ in before if int(id_) == 0 or int(id_) >= 1400}
+    assert index.search("clause 1450")[0][0] == "1450"
+
+
+def test_saved_index_reloads(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add(["a", "b"], ["governing law delaware", "insurance coverage"])
+    index.remove(["b"])
+    index.save()
+
+    reopened = LexicalIndex(str(tmp_path))
+    assert len(reopened) == 1 and "a" in reopened
+    assert reopened.search("delaware")[0][0] == "a"
+    assert reopened.search("insurance") == []
+
+
+def test_save_merges_changes_from_another_writer(tmp_path):
+    first = LexicalIndex(str(tmp_path))
+    second = LexicalIndex(str(tmp_path))
+    first.add(["a"], ["alpha clause"])
+    second.add(["b"], ["beta clause"])
+    first.save()
+    second.remove(["a"])  # Not loaded here yet: must still apply over the merged version
+    second.save()
+
+    # The other writer's save is picked up on the next search
+    assert [point_id for point_id, _ in first.search("clause")] == ["b"]
+    assert {point_id for point_id, _ in LexicalIndex(str(tmp_path)).search("clause")} == {"b"}
+
+
+def _write_many(path, prefix, rounds):
+    index = LexicalIndex(path)
+    for i in range(rounds):
+        index.add([f"{prefix}-{i}"], [f"{prefix} clause number {i}"])
+        index.save()
+
+
+def test_concurrent_processes_keep_every_change(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_write_many, args=(str(tmp_path), prefix, 25))
+        for prefix in ("app", "reindex", "ingest")
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    index = LexicalIndex(str(tmp_path))
+    assert len(index) == 75
+    assert len(index.search("reindex", k=100)) == 25
@@ -0,0 +1,161 @@
+"""
+The embedded mmap store answers like Qdrant local mode for the calls the app makes.
+
+    python -m pytest tests/test_mmap_store.py -q
+"""
+
+import uuid
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+from src.mmap_store import MmapVectorClient
+
+COLLECTION = "legal-rag"
+COMPANIES = ["Acme", "Globex", "Initech"]
+TYPES = ["10-K", "10-Q", "8-K"]
+
+
+def _points(count=60, dim=16):
+    rng = np.random.default_rng(0)
+    points = []
+    for i in range(count):
+        metadata = {
+            "company": COMPANIES[i % 3],
+            "filling_type": TYPES[i % 3 if i % 2 else (i + 1) % 3],
+            "date": f"20{15 + i % 10}-0{1 + i % 9}-15T00:00:00",
+            "chunk_index": i,
+        }
+        if i % 7 == 0:
+            del metadata["filling_type"]  # Legacy points without the field
+        points.append(
+            models.PointStruct(
+                id=str(uuid.UUID(int=i + 1)),
+                vector=rng.standard_normal(dim).tolist(),
+                payload={"page_content": f"clause {i}", "metadata": metadata},
+            )
+        )
+    return points
+
+
+@pytest.fixture
+def clients(tmp_path):
+    """The same points in Qdrant local mode and in the mmap store (float16, rescored)."""
+    reference = QdrantClient(location=":memory:")
+    store = MmapVectorClient(str(tmp_path / "vectors"), dtype="float16")
+    for client in (reference, store):
+        client.create_collection(
+            COLLECTION, vectors_config=models.VectorParams(size=16, distance=models.Distance.COSINE)
+        )
+        client.upsert(COLLECTION, _points())
+    yield reference, store
+    store.close()
+
+
+def _field(key, **condition):
+    return models.FieldCondition(key=f"metadata.{key}", **condition)
+
+
+FILTERS = {
+    "match_value": models.Filter(must=[_field("company", match=models.MatchValue(value="Acme"))]),
+    "match_any": models.Filter(
+        must=[_field("filling_type", match=models.MatchAny(any=["10-K", "8-K"]))]
+    ),
+    "datetime_range": models.Filter(
+        must=[
+            _field(
+                "date",
+                range=models.DatetimeRange(gte="2017-01-01T00:00:00", lt="2020-06-01T00:00:00"),
+            )
+        ]
+    ),
+    "must_not": models.Filter(
+        must=[_field("company", match=models.MatchValue(value="Globex"))],
+        must_not=[_field("filling_type", match=models.MatchValue(value="10-Q"))],
+    ),
+    "should": models.Filter(
+        should=[
+            _field("company", match=models.MatchValue(value="Initech")),
+            _field("chunk_index", range=models.Range(lt=5)),
+        ]
+    ),
+}
+
+
+def _ids(records):
+    return sorted(str(record.id) for record in records)
+
+
+def _scroll_all(client, scroll_filter=None, limit=7):
+    records, offset, pages = [], None, 0
+    while True:
+        page, offset = client.scroll(
+            COLLECTION, scroll_filter=scroll_filter, limit=limit, offset=offset
+        )
+        records.extend(page)
+        pages += 1
+        if offset is None:
+            return records, pages
+
+
+@pytest.mark.parametrize("name", FILTERS)
+def test_filters_and_counts_match_qdrant(clients, name):
+    reference, store = clients
+    query_filter = FILTERS[name]
+
+    expected, _ = _scroll_all(reference, query_filter, limit=100)
+    assert expected  # Every case selects something
+    assert store.count(COLLECTION, count_filter=query_filter).count == len(expected)
+    assert reference.count(COLLECTION, count_filter=query_filter).count == len(expected)
+    assert _ids(_scroll_all(store, query_filter, limit=100)[0]) == _ids(expected)
+
+
+def test_scroll_pages_with_an_offset(clients):
+    reference, store = clients
+    query_filter = FILTERS["match_any"]
+
+    records, pages = _scroll_all(store, query_filter, limit=7)
+    ids = [str(record.id) for record in records]
+
+    assert len(ids) == len(set(ids))  # Pages never overlap
+    assert pages == -(-len(ids) // 7)
+    assert sorted(ids) == _ids(_scroll_all(reference, query_filter, limit=7)[0])
+    assert records[0].payload["page_content"].startswith("clause ")
+
+
+def test_search_ranks_like_qdrant(clients):
+    reference, store = clients
+    query = np.random.default_rng(1).standard_normal(16).tolist()
+    query_filter = FILTERS["must_not"]
+
+    expected = reference.query_points(COLLECTION, query=query, query_filter=query_filter, limit=5)
+    actual = store.query_points(COLLECTION, query=query, query_filter=query_filter, limit=5)
+
+    assert [p.id for p in actual.points] == [p.id for p in expected.points]
+    np.testing.assert_allclose(
+        [p.score for p in actual.points], [p.score for p in expected.points], atol=1e-3
+    )
+
+
+def test_deletes_match_qdrant(clients):
+    reference, store = clients
+    for client in (reference, store):
+        client.delete(COLLECTION, models.PointIdsList(points=[str(uuid.UUID(int=2))]))
+        client.delete(COLLECTION, models.FilterSelector(filter=FILTERS["match_value"]))
+
+    assert store.count(COLLECTION).count == reference.count(COLLECTION).count == 39
+    assert _ids(_scroll_all(store)[0]) == _ids(_scroll_all(reference)[0])
+    assert store.retrieve(COLLECTION, [str(uuid.UUID(int=2))]) == []
+
+
+def test_unsupported_constructs_are_named(clients):
+    _, store = clients
+
+    empty_filter = models.Filter(
+        must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="metadata.company"))]
+    )
+    with pytest.raises(ValueError, match="IsEmptyCondition"):
+        store.count(COLLECTION, count_filter=empty_filter)
+
+    operation = models.ClearPayloadOperation(clear_payload=models.PointIdsList(points=[1]))
+    with pytest.raises(TypeError, match="ClearPayloadOperation"):
+        store.batch_update_points(COLLECTION, [operation])
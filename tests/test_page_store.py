@@ -0,0 +1,113 @@
+"""
+Page store and re-chunking from stored pages, without the PDFs.
+
+    python -m pytest tests/test_page_store.py -q
+"""
+
+from types import SimpleNamespace
+import pytest
+from src import page_store as page_store_module
+from src.database import get_qdrant_client, get_vector_store
+from src.indexing import index_file, reindex_stored_file
+from src.lexical_index import get_lexical_index
+from src.page_store import PageStore, get_page_store
+from src.reindex import reindex, select_stored_files
+from src.text_handler.splitter import get_legal_text_splitter
+from src.utils.db_utils import indexed_file_digest, scroll_file_points
+from tests.benchmark import make_corpus
+
+PAGES = [f"Page {i}: the tenant shall pay rent monthly. " * 20 for i in range(1, 6)]
+
+
+def test_pages_round_trip_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_store_module, "READ_BATCH_PAGES", 2)
+    store = PageStore(str(tmp_path / "pages.sqlite"))
+
+    assert list(store.record("d1", iter(PAGES))) == PAGES  # Passed through while stored
+
+    assert "d1" in store and store.page_count("d1") == 5
+    assert list(store.iter_pages("d1")) == PAGES
+    assert store.get_page("d1", 3) == PAGES[2]
+    stats = store.stats()
+    assert stats["documents"] == 1 and stats["pages"] == 5
+    assert stats["chars"] == sum(map(len, PAGES)) > stats["stored_bytes"]
+
+    with pytest.raises(KeyError):
+        store.get_page("d1", 6)
+    with pytest.raises(KeyError):
+        list(store.iter_pages("missing"))
+
+
+def test_interrupted_extraction_is_not_stored(tmp_path):
+    store = PageStore(str(tmp_path / "pages.sqlite"))
+    pages = store.record("d1", iter(PAGES))
+    next(pages)
+    pages.close()  # The extraction stopped after one page
+
+    assert "d1" not in store and store.page_count("d1") is None
+    assert list(store.record("d1", iter(PAGES[:2]))) == PAGES[:2]
+    assert list(PageStore(store.path).iter_pages("d1")) == PAGES[:2]
+
+
+def _stored_chunks(vector_store, filename):
+    points = scroll_file_points(
+        vector_store.client, vector_store.collection_name, source_filename=filename
+    )
+    return {str(point.id): point.payload for point in points}
+
+
+def test_reindex_rebuilds_chunks_from_stored_pages(offline):
+    vector_store = get_vector_store(create=True)
+    upload = make_corpus(1, 3, seed=2)[0]
+    index_file(vector_store, upload, get_legal_text_splitter())
+    before = _stored_chunks(vector_store, upload.name)
+    digest = indexed_file_digest(vector_store.client, vector_store.collection_name, upload.name)
+    assert get_page_store().page_count(digest) == 3
+
+    summary = reindex_stored_file(
+        vector_store, upload.name, digest, get_legal_text_splitter(600, 100)
+    )
+
+    after = _stored_chunks(vector_store, upload.name)
+    assert summary["added"] == len(after) > len(before)
+    assert summary["deleted"] == len(before) and not set(before) & set(after)
+    assert all(payload["metadata"]["file_digest"] == digest for payload in after.values())
+    assert {p["metadata"]["page_end"] for p in after.values()} == {1, 2, 3}
+    # The file still counts as fully indexed, and BM25 follows the new chunks
+    assert indexed_file_digest(vector_store.client, vector_store.collection_name, upload.name)
+    lexical_index = get_lexical_index(vector_store.collection_name)
+    assert len(lexical_index) == len(after) and all(point_id in lexical_index for point_id in after)
+
+    with pytest.raises(KeyError):
+        reindex_stored_file(vector_store, upload.name, "0" * 64, get_legal_text_splitter())
+
+
+def test_reindex_reports_files_without_stored_pages(offline, monkeypatch):
+    vector_store = get_vector_store(create=True)
+    stored, unstored = make_corpus(2, 2, seed=6)
+    index_file(vector_store, stored, get_legal_text_splitter())
+    with monkeypatch.context() as patch:
+        patch.setenv("PAGE_STORE_PATH", "")  # Indexed before the page store existed
+        index_file(vector_store, unstored, get_legal_text_splitter())
+
+    files = select_stored_files(get_qdrant_client())
+    assert sorted(filename for _, filename, _ in files) == sorted([stored.name, unstored.name])
+    stored_file = next(f for f in files if f[1] == stored.name)
+    assert select_stored_files(get_qdrant_client(), filters={"source_filename": stored.name}) == [
+        stored_file
+    ]
+    with pytest.raises(ValueError, match="Unknown matter"):
+        select_stored_files(get_qdrant_client(), ["closed-matter"])
+
+    components = {"vector_store": vector_store, "splitter": get_legal_text_splitter(800, 100)}
+    progress = []
+    summary = reindex(
+        SimpleNamespace(get=components.get),
+        files,
+        progress=lambda *args: progress.append(args[:3]),
+    )
+
+    assert summary["files"] == 1 and summary["failed"] == {}
+    assert summary["missing_pages"] == [unstored.name]
+    assert summary["added"] == len(_stored_chunks(vector_store, stored.name))
+    assert progress == [(1, 1, stored.name)]
@@ -0,0 +1,101 @@
+"""
+Small-to-big retrieval: child passages expand to their parent chunks (offline).
+
+    python -m pytest tests/test_parent_store.py -q
+"""
+
+import os
+from langchain_core.documents import Document
+from src.database import get_vector_store
+from src.indexing import index_file
+from src.parent_store import drop_parent_store, expand_to_parents, get_parent_store
+from src.retriever import get_legal_retriever
+from src.text_handler.splitter import get_legal_text_splitter
+from src.utils.db_utils import scroll_file_points
+from tests.benchmark import make_corpus
+
+
+def _child(parent_id, score, collection=None, text="passage"):
+    metadata = {"parent_id": parent_id, "relevance_score": score}
+    if collection:
+        metadata["_collection_name"] = collection
+    return Document(page_content=f"{text} of {parent_id}", metadata=metadata)
+
+
+def _store_parents(collection, *parent_ids):
+    get_parent_store(collection).put_many(
+        (
+            parent_id,
+            Document(page_content=f"full chunk {parent_id}", metadata={"section": parent_id}),
+        )
+        for parent_id in parent_ids
+    )
+
+
+def test_children_give_way_to_their_parents_once(offline):
+    _store_parents("legal-rag", "a", "b")
+    _store_parents("matter-acme", "a")
+    plain = Document(page_content="chunk without children", metadata={"relevance_score": 0.6})
+    docs = [
+        _child("a", 0.9),
+        _child("a", 0.85, collection="matter-acme"),  # Same ID, another collection
+        _child("b", 0.8),
+        _child("a", 0.7, text="another passage"),
+        plain,
+        _child("gone", 0.5),  # Its parent was never stored
+    ]
+
+    expanded = expand_to_parents(docs, collection_name="legal-rag")
+
+    assert [doc.page_content for doc in expanded] == [
+        "full chunk a",
+        "full chunk a",
+        "full chunk b",
+        "chunk without children",
+        "passage of gone",
+    ]
+    assert [doc.metadata["relevance_score"] for doc in expanded] == [0.9, 0.85, 0.8, 0.6, 0.5]
+    assert expanded[0].metadata == {
+        "section": "a", "_id": "a", "_collection_name": "legal-rag", "relevance_score": 0.9
+    }
+    assert expanded[1].metadata["_collection_name"] == "matter-acme"
+    assert expanded[3] is plain
+
+
+def test_limit_counts_distinct_parents(offline):
+    _store_parents("legal-rag", "a", "b", "c")
+    docs = [_child("a", 0.9), _child("a", 0.8), _child("b", 0.7), _child("c", 0.6)]
+
+    expanded = expand_to_parents(docs, limit=2, collection_name="legal-rag")
+
+    assert [doc.page_content for doc in expanded] == ["full chunk a", "full chunk b"]
+    assert expand_to_parents([], limit=2) == []
+
+
+def test_retriever_returns_parent_chunks(offline, monkeypatch):
+    monkeypatch.setenv("CHILD_CHUNK_SIZE", "300")
+    vector_store = get_vector_store(create=True)
+    upload = make_corpus(1, 2, seed=7)[0]
+    index_file(vector_store, upload, get_legal_text_splitter())
+
+    points = list(
+        scroll_file_points(vector_store.client, "legal-rag", source_filename=upload.name)
+    )
+    parent_ids = {point.payload["metadata"]["parent_id"] for point in points}
+    assert len(points) > len(parent_ids) == len(get_parent_store())
+    parents = get_parent_store().get_many(parent_ids)
+
+    docs = get_legal_retriever().invoke("Who shall indemnify and hold harmless?")
+
+    assert 0 < len(docs) <= 5
+    assert len({doc.metadata["_id"] for doc in docs}) == len(docs)
+    for doc in docs:
+        assert doc.page_content == parents[doc.metadata["_id"]].page_content
+        assert "parent_id" not in doc.metadata and "relevance_score" in doc.metadata
+    scores = [doc.metadata["relevance_score"] for doc in docs]
+    assert scores == sorted(scores, reverse=True)
+
+    # Dropping the matter removes its parents with it
+    path = get_parent_store().path
+    drop_parent_store("legal-rag")
+    assert not os.path.exists(path)
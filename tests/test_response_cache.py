@@ -0,0 +1,103 @@
+"""
+Two-tier answer cache: exact and semantic hits, scoping and eviction (no model).
+
+    python -m pytest tests/test_response_cache.py -q
+"""
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage
+from src.utils.response_cache import ResponseCache
+
+
+class FixedEmbeddings:
+    """Query vectors chosen per question, so cosine similarities are known exactly."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self.vectors[text]
+
+
+def _at_angle(cosine):
+    return [cosine, float(np.sqrt(1 - cosine**2)), 0.0]
+
+
+EMBEDDINGS = {
+    "What is the notice period?": [1.0, 0.0, 0.0],
+    "How long is the notice period": _at_angle(0.97),
+    "Who pays for insurance?": _at_angle(0.90),
+}
+
+
+def test_exact_tier_ignores_case_whitespace_and_punctuation():
+    cache = ResponseCache(embeddings=None)
+    cache.store("What is the notice period?", [], 0, "Thirty days.")
+
+    assert cache.lookup("  what is the   NOTICE period ", [], 0) == "Thirty days."
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_semantic_tier_reuses_answers_above_the_threshold():
+    embeddings = FixedEmbeddings(EMBEDDINGS)
+    cache = ResponseCache(embeddings=embeddings, similarity_threshold=0.95)
+    cache.store("What is the notice period?", [], 0, "Thirty days.")
+
+    assert cache.lookup("How long is the notice period", [], 0) == "Thirty days."
+    assert cache.lookup("Who pays for insurance?", [], 0) is None
+    assert cache.stats == {"exact_hits": 0, "semantic_hits": 1, "misses": 1}
+
+    # With the semantic tier disabled only identical wordings hit
+    exact_only = ResponseCache(embeddings=embeddings, similarity_threshold=None)
+    exact_only.store("What is the notice period?", [], 0, "Thirty days.")
+    assert exact_only.lookup("How long is the notice period", [], 0) is None
+
+
+def test_answers_are_scoped_to_history_and_generation():
+    cache = ResponseCache(embeddings=FixedEmbeddings(EMBEDDINGS))
+    history = [HumanMessage(content="Summarize the lease"), AIMessage(content="It is a lease.")]
+    cache.store("What is the notice period?", history, 3, "Thirty days.")
+
+    # Role/content dicts from the UI fingerprint like the LangChain messages
+    as_dicts = [
+        {"role": "user", "content": "Summarize the lease"},
+        {"role": "assistant", "content": "It is a lease."},
+    ]
+    assert cache.lookup("What is the notice period?", as_dicts, 3) == "Thirty days."
+    assert cache.lookup("What is the notice period?", [], 3) is None
+    assert cache.lookup("How long is the notice period", history, 4) is None
+    assert cache.lookup("What is the notice period?", history, 3, history_summary="Earlier") is None
+
+
+def test_entries_expire_and_are_evicted_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(embeddings=None, max_entries=2, ttl_seconds=60)
+    cache.store("first", [], 0, "1")
+    cache.store("second", [], 0, "2")
+    cache.lookup("first", [], 0)
+    cache.store("third", [], 0, "3")
+
+    assert [cache.lookup(q, [], 0) for q in ("first", "second", "third")] == ["1", None, "3"]
+
+    now[0] += 61
+    assert cache.lookup("first", [], 0) is None
+
+
+def test_stream_stores_the_answer_and_replays_it():
+    class Chain:
+        calls = 0
+
+        def stream(self, inputs):
+            Chain.calls += 1
+            yield AIMessage(content="Thirty ")
+            yield AIMessage(content="days.")
+
+    cache = ResponseCache(embeddings=None)
+    first = "".join(cache.stream(Chain(), "What is the notice period?", [], 0))
+    second = "".join(cache.stream(Chain(), "what is the notice period", [], 0))
+
+    assert first == second == "Thirty days."
+    assert Chain.calls == 1
@@ -0,0 +1,90 @@
+"""
+Hybrid retrieval and reranking against an in-memory Qdrant (offline).
+
+    python -m pytest tests/test_retriever.py -q
+"""
+
+import asyncio
+from types import SimpleNamespace
+from langchain_core.documents import Document
+from src.async_rag import aanswer
+from src.database import get_vector_store
+from src.indexing import index_file
+from src.prompts.legal_templates import get_rag_chain
+from src.retriever import RerankScoreCache, get_legal_retriever
+from src.text_handler.splitter import get_legal_text_splitter
+from tests.benchmark import OverlapRanker, make_corpus
+
+
+class CountingRanker(OverlapRanker):
+    def __init__(self):
+        self.passages = 0
+
+    def rerank(self, request):
+        self.passages += len(request.passages)
+        return super().rerank(request)
+
+
+def test_rerank_scores_are_reused_until_the_text_changes(offline):
+    get_vector_store(create=True)
+    retriever = get_legal_retriever()
+    ranker = CountingRanker()
+    retriever = retriever.model_copy(
+        update={
+            "reranker": SimpleNamespace(client=ranker, top_n=5),
+            "score_cache": RerankScoreCache(),
+        }
+    )
+    docs = [
+        Document(page_content="the tenant shall pay rent", metadata={"_id": "a"}),
+        Document(page_content="governing law is delaware", metadata={"_id": "b"}),
+    ]
+
+    first = retriever.rerank("who pays rent", docs)
+    assert ranker.passages == 2
+    assert retriever.rerank("who pays rent", docs) == first
+    assert ranker.passages == 2
+
+    # Re-indexing rewrote point "a" in place: its old score must not be served
+    rewritten = [Document(page_content="notices go to the landlord", metadata={"_id": "a"}), docs[1]]
+    ranked = retriever.rerank("who pays rent", rewritten)
+    assert ranker.passages == 3
+    assert first[0].metadata["relevance_score"] > 0
+    assert [doc.metadata["relevance_score"] for doc in ranked] == [0, 0]
+
+
+def _index_corpus(num_docs=4):
+    vector_store = get_vector_store(create=True)
+    files = make_corpus(num_docs, 2, seed=5)
+    for f in files:
+        index_file(vector_store, f, get_legal_text_splitter())
+    return files
+
+
+def test_request_filters_narrow_the_search(offline):
+    files = _index_corpus()
+    target = files[1].name
+    chain = get_rag_chain(get_legal_retriever())
+    question = "Who must indemnify and hold harmless?"
+
+    unfiltered = chain.invoke({"question": question, "chat_history": []})
+    filtered = chain.invoke(
+        {"question": question, "chat_history": [], "filters": {"source_filename": target}}
+    )
+
+    assert {d.metadata["source_filename"] for d in unfiltered["retrieved_docs"]} != {target}
+    assert filtered["retrieved_docs"]
+    assert {d.metadata["source_filename"] for d in filtered["retrieved_docs"]} == {target}
+    assert target in filtered["answer"]
+
+
+def test_cached_answers_are_kept_apart_per_filter(offline):
+    files = _index_corpus()
+    question = "Who must indemnify and hold harmless?"
+
+    answers = [
+        asyncio.run(aanswer(question, filters={"source_filename": f.name})) for f in files[:2]
+    ]
+
+    assert files[0].name in answers[0] and files[1].name in answers[1]
+    assert asyncio.run(aanswer(question, filters={"source_filename": files[0].name})) == answers[0]